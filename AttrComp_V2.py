@@ -39,9 +39,289 @@ __date__ = '2011-08-03'
 __version__ = '0.1.0'
 __rights__ = 'Copyright (c) 2011 Paul Ross.'
 
+import collections
+import collections.abc
+import functools
+import sys
 import Commitar.RepCode as RepCode
-import datetime
+import Commitar.Trace as Trace
+
+_TP_READ = Trace.point('AttrComp.read', Trace.TRACE)
+
+
+class ExceptionAttrComp(Exception):
+    pass
+
+
+# Component roles, the top three bits of a component descriptor, RP66v1 Sect. 3.2.2.1
+ROLE_ABSATR = 0
+ROLE_ATTRIB = 1
+ROLE_INVATR = 2
+ROLE_OBJECT = 3
+ROLE_RESERVED = 4
+ROLE_RDSET = 5
+ROLE_RSET = 6
+ROLE_SET = 7
+
+# The role and format bits of a component descriptor, DESCRIPTORS has one for
+# each of the 256 bytes so a descriptor is decoded by a single lookup.
+# role - one of ROLE_*.
+# flags - the format bits, the bottom five bits.
+# isAttribute - True for the roles that are read with the template, ABSATR,
+# ATTRIB and INVATR.
+# isSet - True for SET, RSET and RDSET.
+# hasLabel, hasCount, hasRepCode, hasUnits, hasValue - the characteristics
+# present in an attribute component. For an object hasLabel is the name, for
+# a set hasLabel is the type and hasCount the name.
+Descriptor = collections.namedtuple(
+    'Descriptor', 'role flags isAttribute isSet hasLabel hasCount hasRepCode hasUnits hasValue'
+)
+
+DESCRIPTORS = tuple(
+    Descriptor(
+        d >> 5,
+        d & 0x1F,
+        d >> 5 in (ROLE_ABSATR, ROLE_ATTRIB, ROLE_INVATR),
+        d >> 5 in (ROLE_RDSET, ROLE_RSET, ROLE_SET),
+        bool(d & 0x10),
+        bool(d & 0x8),
+        bool(d & 0x4),
+        bool(d & 0x2),
+        bool(d & 0x1),
+    ) for d in range(256)
+)
+
+# The roles as the strings of their bits, as Attribute.role.
+ROLE_BITS = tuple('{:03b}'.format(r) for r in range(8))
+
+
+def valueToString(a):
+    """Returns the string of a decoded value as it appears in a table."""
+    if not isinstance(a, (RepCode.OBJREFBase, RepCode.OBNAMEBase, RepCode.DTIMEBase)):
+        st = str(a)
+        if (len(st) > 1 and st[0] == "b" and st[len(st) - 1] == "'"):
+            return(st[2:-1])
+        else:
+            return(st)
+    elif isinstance(a, RepCode.DTIMEBase):
+        return a.toString()
+    else:
+        s = (a.identifier).payload
+        return(s.decode("utf-8"))
+
+
+def _unitsString(theUnits, theCache):
+    """valueToString(theUnits).strip(), units repeat, and are usually interned,
+    so their strings are cached in theCache."""
+    try:
+        return theCache[theUnits]
+    except KeyError:
+        s = theCache[theUnits] = valueToString(theUnits).strip()
+        return s
+
+
+class _Absent(object):
+    """The value of an absent or invariant attribute in a table row, shown
+    as 0 in the table as it always has been but distinct from a value 0."""
+    __slots__ = ()
 
+    def __str__(self):
+        return '0'
+
+    def __repr__(self):
+        return 'ABSENT'
+
+    def __reduce__(self):
+        return 'ABSENT'
+
+
+ABSENT = _Absent()
+
+
+# The cells of a table row are kept as decoded until the table is used, so
+# string values are only validated, see RepCode.setValidation(), when they are.
+# A single value without units is kept as it is, ABSENT if the attribute is
+# absent, otherwise it is one of these whose toString() gives what the table
+# shows.
+# origin, copy - integers.
+# identifier - the RepCode.IDENTBase.
+class RawName(collections.namedtuple('RawName', 'origin copy identifier')):
+    __slots__ = ()
+
+    def toString(self, theCache):
+        return str(self.origin) + "&" + str(self.copy) + "&" + str(self.identifier.sigPayload)[2:-1]
+
+
+# value - the decoded value, a list (or array) of them if isList.
+# units - RepCode.UNITSBase or 0.
+# isList - True if the attribute has more than one value.
+class RawValue(collections.namedtuple('RawValue', 'value units isList')):
+    __slots__ = ()
+
+    def _valueString(self, v, theCache):
+        if self.units:
+            return valueToString(v).strip() + " " + _unitsString(self.units, theCache)
+        return valueToString(v).strip()
+
+    def toString(self, theCache):
+        if self.isList:
+            return [self._valueString(v, theCache) for v in self.value]
+        return self._valueString(self.value, theCache)
+
+
+# An object name as a native value.
+# origin, copy - integers.
+# identifier - str.
+ObjectName = collections.namedtuple('ObjectName', 'origin copy identifier')
+
+
+def _text(theBytes, theCache):
+    """The str of theBytes, the significant bytes of a string value, interned
+    in theCache if it is a dict."""
+    if theCache is None:
+        return theBytes.decode('latin-1')
+    try:
+        return theCache[theBytes]
+    except KeyError:
+        s = theCache[theBytes] = sys.intern(theBytes.decode('latin-1'))
+        return s
+
+
+def nativeValue(v, theCache=None):
+    """Returns the native Python value of a decoded value: a str for IDENT,
+    ASCII and UNITS, an ObjectName for OBNAME, a datetime.datetime for DTIME,
+    None if the attribute is absent or has no value, otherwise the value as
+    decoded, an int, a float or a RepCode value. theCache is an optional dict
+    that the strings are interned in."""
+    if v is None or v is ABSENT:
+        return None
+    if isinstance(v, bytes):
+        return _text(v, theCache)
+    if isinstance(v, RepCode.PascalLikeBase):
+        return _text(v.sigPayload, theCache)
+    if isinstance(v, RepCode.OBNAMEBase):
+        return ObjectName(v.origin, v.copy, _text(v.identifier.sigPayload, theCache))
+    if isinstance(v, RepCode.DTIMEBase):
+        return v.dateTime
+    return v
+
+
+def cellValue(theCell, theCache=None):
+    """The native value of a raw cell, see nativeValue(). A list of them if the
+    attribute has several values and an ObjectName for the object name."""
+    if isinstance(theCell, RawValue):
+        if theCell.isList:
+            return [nativeValue(v, theCache) for v in theCell.value]
+        return nativeValue(theCell.value, theCache)
+    if isinstance(theCell, RawName):
+        return ObjectName(theCell.origin, theCell.copy, _text(theCell.identifier.sigPayload, theCache))
+    return nativeValue(theCell, theCache)
+
+
+def cellUnits(theCell, theCache=None):
+    """The units of a raw cell as a str or None if it has none."""
+    if isinstance(theCell, RawValue) and theCell.units:
+        return _text(theCell.units.sigPayload, theCache).strip()
+    return None
+
+
+def _validateValue(v):
+    if isinstance(v, RepCode.PascalLikeBase):
+        v.validate()
+    elif isinstance(v, (RepCode.OBNAMEBase, RepCode.OBJREFBase)):
+        v.identifier.validate()
+
+
+def _validateCell(theCell):
+    """Validates the string values of a raw cell, see EFLRTable.validate()."""
+    if isinstance(theCell, RawValue):
+        for v in (theCell.value if theCell.isList else (theCell.value,)):
+            _validateValue(v)
+        if theCell.units:
+            theCell.units.validate()
+    elif isinstance(theCell, RawName):
+        theCell.identifier.validate()
+    else:
+        _validateValue(theCell)
+
+
+def cellToString(theCell, theCache):
+    """The string, or list of strings, a table shows for a raw cell."""
+    if isinstance(theCell, (RawName, RawValue)):
+        return theCell.toString(theCache)
+    return valueToString(theCell).strip()
+
+
+class EFLRTable(collections.abc.Mapping):
+    """The table of an EFLR set, a mapping {"header": [str, ...], "data":
+    [[str, ...], ...]} with a row per object. The rows are kept as the decoded
+    values, which hold their raw bytes, and are only turned into strings when
+    "data" is first looked up, that is then cached. Tables that are never read
+    are never converted. The decoded rows are kept for typed access, see
+    EFLRColumns.
+    Compares equal to the plain dict and pickles as one."""
+    KEYS = ('header', 'data')
+
+    def __init__(self, theHeader, theRows, theRepCodes=None):
+        self._header = theHeader
+        # [[RawName, value, RawValue or ABSENT, ...], ...]
+        self._rows = theRows
+        # [int, ...] the rep code of each attribute of the template or None
+        self._repCodes = theRepCodes
+        self._data = None
+
+    @property
+    def rows(self):
+        """The rows as decoded, a cell is as described for RawName."""
+        return self._rows
+
+    @property
+    def repCodes(self):
+        """The rep code of each attribute in the template, in the order of the
+        header after the object name, or None if not known. An object may
+        give an attribute another rep code."""
+        return self._repCodes
+
+    def nativeRows(self):
+        """Returns the rows as native values, see cellValue(), the first of a
+        row is the ObjectName of the object. The units are in unitsRows()."""
+        cache = {}
+        return [[cellValue(c, cache) for c in row] for row in self._rows]
+
+    def unitsRows(self):
+        """Returns the units of each value of nativeRows(), a str or None."""
+        cache = {}
+        return [[cellUnits(c, cache) for c in row] for row in self._rows]
+
+    def validate(self):
+        """Checks the characters of every string value and units of the rows
+        whatever the validation policy, this may raise. This is the separate
+        validation pass of RepCode.VALIDATE_DEFERRED."""
+        for row in self._rows:
+            for c in row:
+                _validateCell(c)
+
+    def __getitem__(self, k):
+        if k == 'header':
+            return self._header
+        if k == 'data':
+            if self._data is None:
+                cache = {}
+                self._data = [[cellToString(c, cache) for c in row] for row in self._rows]
+            return self._data
+        raise KeyError(k)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def __reduce__(self):
+        return dict, (dict(self),)
 
 
 class Attribute(object):
@@ -112,8 +392,8 @@ class AttrCompBase(object):
     units = None
     # Single value or list of values if count > 1
     value = None
-
-    attributeList = []
+    # What decodes labels, units and values, RepCode or a RepCode.InternPool
+    decoder = RepCode
 
     def __str__(self):
 
@@ -131,20 +411,18 @@ class AttrCompBase(object):
         if formatBits & 0x10:
 
             self.lable = RepCode.IDENTStream(theStream)
-            print(self.lable)
         if formatBits & 0x8:
             self.count = RepCode.readUVARI(theStream)
-            print(self.count)
         if formatBits & 0x4:
             self.repCode = RepCode.readUSHORT(theStream)
-            print(self.repCode)
         if formatBits & 0x2:
             self.units = RepCode.UNITSStream(theStream)
-            print(self.units)
+        if _TP_READ.on:
+            _TP_READ.emit('label={!s} count={!s} rc={!s} units={!s}', self.lable, self.count, self.repCode, self.units)
         if formatBits & 0x1:
 
             if self.count > 1:
-                self.value = [RepCode.readIndirectRepCode(self.repCode, theStream) for i in range(self.count)]
+                self.value = RepCode.readIndirectRepCodeArray(self.repCode, self.count, theStream)
             else:
                 self.value = RepCode.readIndirectRepCode(self.repCode, theStream)
 
@@ -152,6 +430,27 @@ class AttrCompBase(object):
 
 
 
+    def decode(self, formatBits, theBuffer, theOffset):
+        """As read() but from theBuffer at theOffset, returns the new offset."""
+        if formatBits & 0x10:
+            self.lable, theOffset = self.decoder.decodeIDENT(theBuffer, theOffset)
+        if formatBits & 0x8:
+            self.count, theOffset = RepCode.decodeUVARI(theBuffer, theOffset)
+        if formatBits & 0x4:
+            self.repCode = theBuffer[theOffset]
+            theOffset += 1
+        if formatBits & 0x2:
+            self.units, theOffset = self.decoder.decodeUNITS(theBuffer, theOffset)
+        if _TP_READ.on:
+            _TP_READ.emit('label={!s} count={!s} rc={!s} units={!s}', self.lable, self.count, self.repCode, self.units)
+        if formatBits & 0x1:
+
+            if self.count > 1:
+                self.value, theOffset = self.decoder.decodeIndirectRepCodeArray(self.repCode, self.count, theBuffer, theOffset)
+            else:
+                self.value, theOffset = self.decoder.decodeIndirectRepCode(self.repCode, theBuffer, theOffset)
+        return theOffset
+
     def readAsTemplate(self, formatBits, theStream):
         """Treats self as a template and reads from a stream.
         Returns a new AttrCompBase with the merged attributes."""
@@ -171,24 +470,17 @@ class AttrCompStream(AttrCompBase):
         for i in range(len(self.attributeList)):
             print(self.attributeList[i].lable._payload.decode("utf-8"))
 
-        for i in range(len(self.dataList)):
-            print(self.dataList[i])
+        for row in self.getFrame()["data"]:
+            print(row)
 
     def getFrame(self):
-        head = []
-        data = []
-        ret = {}
-        head.append("")
-        for i in range(len(self.attributeList)):
-            head.append(self.attributeList[i].lable._payload.decode("utf-8").strip())
-
-        for i in range(len(self.dataList)):
-            data.append(self.dataList[i])
-
-        ret["header"] = head
-        ret["data"] = data
-
-        return ret
+        """Returns the EFLRTable of the set, values are converted to strings
+        when its "data" is first used."""
+        return EFLRTable(
+            templateHeader(self.attributeList),
+            list(self.dataList),
+            [a.repCode for a in self.attributeList],
+        )
 
     def getObjName(self):
         j=1
@@ -199,7 +491,7 @@ class AttrCompStream(AttrCompBase):
             #print(header[j])
             if "ID" == header[j]:
                 #obj = self.dataList[0][0]+self.dataList[0][j]
-                obj = self.dataList[0][j]
+                obj = cellToString(self.dataList[0][j], {})
                 #self.attributeList = []
                 #self.dataList = []
                 return (obj)
@@ -221,179 +513,249 @@ class AttrCompStream(AttrCompBase):
                 f.write(header[i]+ ", ")
             f.write("\n")
 
-            for i in range(len(self.dataList)):
-                for j in self.dataList[i]:
+            for row in self.getFrame()["data"]:
+                for j in row:
                     f.write(str(j)+", ")
 
                 f.write("\n")
             f.write("\n\n")
 
 
-    def __init__(self, formatBits, theStream):
+    def __init__(self, formatBits, theBuffer, theOffset=0, thePool=None):
         """Constructed with a bit mask whose 5 bits determine which field to
-        read from the stream."""
+        read and the buffer (bytes, bytearray or memoryview) and offset to
+        read from, readAll() expects the set component there. thePool is an
+        optional RepCode.InternPool, usually one per
+        logical file, that labels, units and object names are interned in."""
         super().__init__()
-        self.theStream = theStream
+        self.buffer = theBuffer
+        self.offset = theOffset
+        if thePool is not None:
+            self.decoder = thePool
+        self.attributeList = []
         self.dataList = []
 
 
     def read(self):
 
-        attr = self.theStream.read(1)[0]
-        attr = self.getBits(3,8,attr)
+        attr = self.buffer[self.offset]
+        self.offset += 1
 
-        super().read(int(attr,2),self.theStream)
+        self.offset = super().decode(DESCRIPTORS[attr].flags, self.buffer, self.offset)
 
 
 
     def readAll(self):
-        self.clearAttributeList()
-        self.size = 0
-        self.ok = 0
-
-        attr = self.theStream.read(1)[0]
-        #print(attr)
-
-        while(int(attr) != 52 and int(attr) != 60 and int(attr) != 56):
-            #print(attr)
-            attr = self.theStream.read(1)[0]
-        self.ok = 1
-
-
-        while True:
-
-            if self.ok == 1:
-                self.ok = 0
-            else:
-                attr = self.theStream.read(1)[0]
-            attr2 = self.getBits(3, 8, attr)
-
-            bits1_3 = self.getBits(0, 3, attr)
-
-            if bits1_3 == "000":
-                continue
-
-
-            if ( bits1_3 != '001' and bits1_3 != '010'):
-                break
-
-            self.size = self.size + 1
-
-            super().read(int(attr2, 2), self.theStream)
-            self.role = self.getBits(0,3,self.repCode)
-            attribute = Attribute(self.lable, self.count, self.repCode, self.units, self.value, self.role)
-            self.attributeList.append(attribute)
-
-
-        #self.print()
-        while self.getBits(0, 3, attr) == '011':
-            attr2 = self.getBits(3, 8, attr)
-            self.l = []
-            if int(attr2,2) & 0x10:
-
-                id1 = self.theStream.read(1)[0]
-                id2 = self.theStream.read(1)[0]
-                name = RepCode.IDENTStream(self.theStream)
-
-                self.l.append(str(id1)+"&"+str(id2)+"&"+str(name)[2:-1])
-
-
-            attr = self.theStream.read(1)[0]
-
-            attr = self.readWithTemplate(0,attr)
-
-            try:
-                bits1_3 = self.getBits(0, 3, attr)
-            except:
-                return
-
-
-    def getBits(self,start,end,attr):
-        return ("{0:08b}".format(attr))[start:end]
+        self.attributeList, self.dataList, self.offset = readSet(self.buffer, self.offset, self.decoder)
 
     def repcodeToString(self,a):
-
-        if type(a) != RepCode.OBJREFStream and type(a) != RepCode.OBNAMEStream and type(a) != RepCode.DTIMEStream:
-            st = str(a)
-            if (len(st) > 1 and st[0] == "b" and st[len(st) - 1] == "'"):
-                return(st[2:-1])
-            else:
-                return(st)
-        elif type(a) == RepCode.DTIMEStream:
-            s = a.mktime()
-
-            return datetime.datetime.fromtimestamp(
-                int(s)
-            ).strftime('%d-%m-%Y %H:%M:%S')
+        return valueToString(a)
+
+
+def readSetComponent(theBuffer, theOffset, theDecoder=RepCode):
+    """Reads the set component of an EFLR from theBuffer at theOffset.
+    Returns (type, name or None, offset after it), the type and name are
+    IDENT values. Raises ExceptionAttrComp if it is not a set component."""
+    desc = DESCRIPTORS[theBuffer[theOffset]]
+    if not desc.isSet:
+        raise ExceptionAttrComp(
+            'Expected a set component not descriptor 0x{:02x} at {:d}'.format(theBuffer[theOffset], theOffset))
+    off = theOffset + 1
+    setType = setName = None
+    if desc.hasLabel:
+        setType, off = theDecoder.decodeIDENT(theBuffer, off)
+    if desc.hasCount:
+        setName, off = theDecoder.decodeIDENT(theBuffer, off)
+    return setType, setName, off
+
+
+def readTemplate(theBuffer, theOffset, theDecoder=RepCode):
+    """Reads the template of a set from theBuffer at theOffset, that of the
+    first component after the set component. Characteristics missing from an
+    attribute take the global defaults. Returns (list of Attribute, the
+    component descriptor after the template, offset after it).
+    theDecoder is RepCode or a RepCode.InternPool."""
+    buf = theBuffer
+    off = theOffset
+    attr = buf[off]
+    off += 1
+    label = None
+    template = []
+    while True:
+        desc = DESCRIPTORS[attr]
+        if desc.role != ROLE_ABSATR:
+            if not desc.isAttribute:
+                break
+            count = AttrCompBase.DEFAULT_COUNT
+            repCode = AttrCompBase.DEFAULT_REP_CODE
+            units = None
+            value = None
+            if desc.hasLabel:
+                label, off = theDecoder.decodeIDENT(buf, off)
+            if desc.hasCount:
+                count, off = RepCode.decodeUVARI(buf, off)
+            if desc.hasRepCode:
+                repCode = buf[off]
+                off += 1
+            if desc.hasUnits:
+                units, off = theDecoder.decodeUNITS(buf, off)
+            if _TP_READ.on:
+                _TP_READ.emit('label={!s} count={!s} rc={!s} units={!s}', label, count, repCode, units)
+            if desc.hasValue:
+                if count > 1:
+                    value, off = theDecoder.decodeIndirectRepCodeArray(repCode, count, buf, off)
+                else:
+                    value, off = theDecoder.decodeIndirectRepCode(repCode, buf, off)
+            template.append(Attribute(label, count, repCode, units, value, ROLE_BITS[repCode >> 5]))
+        if off >= len(buf):
+            # A set without objects
+            return template, None, off
+        attr = buf[off]
+        off += 1
+    return template, attr, off
+
+
+# An attribute of a compiled template, the defaults of an object's attribute.
+# repCode, count - of the template attribute.
+# units - RepCode.UNITSBase or 0.
+# value - the default value, None if the template has none.
+# decode - function (buffer, offset) -> (value, new offset) that decodes count
+# values of repCode, a list of them if count > 1.
+PlanEntry = collections.namedtuple('PlanEntry', 'repCode count units value decode')
+
+
+def compileTemplate(theTemplate, theDecoder=RepCode):
+    """Compiles a set template, a list of Attribute, into the decode plan that
+    readObject() follows for every object, a PlanEntry per attribute."""
+    plan = []
+    for a in theTemplate:
+        if a.count > 1:
+            decode = functools.partial(theDecoder.decodeIndirectRepCodeArray, a.repCode, a.count)
         else:
-            s = (a.identifier).payload
-            return(s.decode("utf-8"))
-
-
-    def readWithTemplate(self, ind, attr):
-
-        bits1_3 = self.getBits(0, 3, attr)
-
-
-        while ind < len(self.attributeList) and (bits1_3 == '000' or bits1_3 == '001' or bits1_3 == '010'):
-            bits1_3 = self.getBits(0, 3, attr)
-            a = None
-
-            count = 1
-            if bits1_3 == "001":
-                repCode = self.attributeList[ind].repCode
-                self.units = 0
-
-                if attr & 0x10:
-                    self.lable = RepCode.readIDENT(self.theStream)
-                if attr & 0x8:
-                    count = RepCode.readUVARI(self.theStream)
-                if attr & 0x4:
-                    repCode = RepCode.readUSHORT(self.theStream)
-                if attr & 0x2:
-                    self.units = RepCode.readUNITS(self.theStream)
-                if attr & 0x1:
-                    if count > 1:
-                        a = [RepCode.readIndirectRepCode(repCode, self.theStream) for i in range(count)]
-                    else:
-                        a = RepCode.readIndirectRepCode(repCode, self.theStream)
-
-                ind = ind + 1
-
-            else:
-
-                a = 0
-                ind = ind + 1
-
-            if count > 1 and attr & 0x1:
-                lst = []
-                for i in a:
-                    if(self.units):
-                        lst.append(self.repcodeToString(i).strip()  + " " + self.repcodeToString(self.units).strip())
+            decode = theDecoder.indirectDecoder(a.repCode)
+        plan.append(PlanEntry(a.repCode, a.count, a.units or 0, a.value, decode))
+    return plan
+
+
+def _cell(theValue, theCount, theUnits):
+    """The cell of a row for an attribute value, see RawValue."""
+    if theCount > 1 and theValue is not None and theValue is not ABSENT:
+        return RawValue(theValue, theUnits, True)
+    if theUnits:
+        return RawValue(theValue, theUnits, False)
+    return theValue
+
+
+def readObject(thePlan, theBuffer, theOffset, theAttr, theRow, theDecoder=RepCode):
+    """Reads the attributes of an object following thePlan from theBuffer at
+    theOffset starting with the component descriptor theAttr. The count, rep
+    code, units and value of the template apply unless the descriptor of an
+    attribute says otherwise. An object may end before the template does,
+    the attributes it lacks take the template defaults. A cell per attribute
+    of the template is appended to theRow.
+    Returns (the descriptor that follows or None at the end of the set, the
+    offset after it)."""
+    plan = thePlan
+    n = len(plan)
+    buf = theBuffer
+    off = theOffset
+    attr = theAttr
+    row = theRow
+    ind = 0
+    while ind < n:
+        repCode, count, units, a, decode = plan[ind]
+        if attr == 0x21:
+            # Only a value, by far the most common
+            a, off = decode(buf, off)
+        else:
+            desc = DESCRIPTORS[attr]
+            if desc.role == ROLE_ATTRIB:
+                if desc.hasLabel:
+                    _label, off = theDecoder.decodeIDENT(buf, off)
+                if desc.hasCount:
+                    count, off = RepCode.decodeUVARI(buf, off)
+                    decode = None
+                if desc.hasRepCode:
+                    repCode = buf[off]
+                    off += 1
+                    decode = None
+                if desc.hasUnits:
+                    units, off = theDecoder.decodeUNITS(buf, off)
+                if desc.hasValue:
+                    if decode is not None:
+                        a, off = decode(buf, off)
+                    elif count > 1:
+                        a, off = theDecoder.decodeIndirectRepCodeArray(repCode, count, buf, off)
                     else:
-                        lst.append(self.repcodeToString(i).strip())
-                self.l.append(lst)
+                        a, off = theDecoder.decodeIndirectRepCode(repCode, buf, off)
+            elif desc.isAttribute:
+                # Absent or invariant attribute
+                a = ABSENT
+                units = 0
             else:
-
-                if self.units:
-                    self.l.append(self.repcodeToString(a).strip() + " " + self.repcodeToString(self.units).strip())
-                else:
-                    self.l.append(self.repcodeToString(a).strip())
-
-            self.units = 0
-
-
-
-            if (ind == len(self.attributeList) - 1):
-                self.dataList.append(self.l)
-
-            try:
-                attr = self.theStream.read(1)[0]
-            except:
-                return
-            bits1_3 = self.getBits(0, 3, attr)
-
-        return attr
-
-
-
+                # The next object or set
+                break
+        ind += 1
+        # Converted to a string only when the table is used
+        row.append(_cell(a, count, units))
+        try:
+            attr = buf[off]
+        except IndexError:
+            attr = None
+            break
+        off += 1
+    for _repCode, count, units, a, _decode in plan[ind:]:
+        row.append(_cell(a, count, units))
+    return attr, off
+
+
+def readSet(theBuffer, theOffset=0, theDecoder=RepCode):
+    """Reads a set, its template and objects, from theBuffer at theOffset.
+    theOffset is that of the set component. Returns (list of Attribute, list
+    of rows, offset after the set), a row is as described for EFLRTable."""
+    _type, _name, off = readSetComponent(theBuffer, theOffset, theDecoder)
+    template, attr, off = readTemplate(theBuffer, off, theDecoder)
+    plan = compileTemplate(template, theDecoder)
+    rows = []
+    buf = theBuffer
+    while attr is not None and DESCRIPTORS[attr].role == ROLE_OBJECT:
+        row = []
+        rows.append(row)
+        if DESCRIPTORS[attr].hasLabel:
+            # The origin is a UVARI, it may take several bytes. Through an
+            # InternPool the identifier is shared with references to the object
+            name, off = theDecoder.decodeOBNAME(buf, off)
+            row.append(RawName(name.origin, name.copy, name.identifier))
+        if off >= len(buf):
+            # The last object has no attributes
+            row.extend(_cell(e.value, e.count, e.units) for e in plan)
+            break
+        attr = buf[off]
+        off += 1
+        attr, off = readObject(plan, buf, off, attr, row, theDecoder)
+    return template, rows, off
+
+
+def templateHeader(theTemplate):
+    """The header of the table of a set, "" for the object name then the
+    label of each attribute of theTemplate."""
+    return [""] + [a.lable._payload.decode("utf-8").strip() for a in theTemplate]
+
+
+def parseSet(theData, thePool=None):
+    """Parses a set, theData is an EFLR body which starts with the set
+    component, and returns its EFLRTable. All of the parser state is local so this may be
+    called from several threads at once. thePool is an optional
+    RepCode.InternPool, it may be shared by concurrent calls since interning
+    an equal value twice is harmless."""
+    template, rows, _off = readSet(theData, 0, RepCode if thePool is None else thePool)
+    return EFLRTable(templateHeader(template), rows, [a.repCode for a in template])
+
+
+def setId(theTable):
+    """The ID attribute of the first object of a table as a string, this is
+    how a FILE-HEADER identifies a logical file. 0 if there is no ID."""
+    header = theTable['header']
+    if "ID" in header:
+        return cellToString(theTable.rows[0][header.index("ID")], {})
+    return 0
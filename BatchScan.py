@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# Part of TotalDepth: Petrophysical data processing and presentation
+# Copyright (C) 1999-2012 Paul Ross
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Paul Ross: apaulross@gmail.com
+"""Scans many DLIS files with ScanV1EFLR over a pool of processes.
+
+Files are submitted in chunks with a bounded number of chunks in flight so
+tens of thousands of files do not all become pending tasks at once. Each file
+is scanned with its own timeout and any failure, including a worker process
+dying, is reported against that file rather than stopping the batch. Results
+are yielded as they complete.
+
+Usage:
+    python BatchScan.py [-j JOBS] [--chunk N] [--timeout S] [--sidecar] PATH_OR_GLOB...
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import glob
+import os
+import signal
+import sys
+import time
+import traceback
+
+import Commitar.ScanV1EFLR as ScanV1EFLR
+
+DLIS_EXTENSIONS = ('.dlis',)
+# Times a file is tried when worker processes die under it.
+MAX_ATTEMPTS = 2
+
+# path - the file scanned.
+# objects - the return value of the scan function, for scanFile() this is
+# ScanV1EFLR.objects, None on error.
+# error - None or a string describing the failure.
+# seconds - wall clock time of the scan.
+BatchResult = collections.namedtuple('BatchResult', 'path objects error seconds')
+
+
+class ExceptionBatchScanTimeout(Exception):
+    pass
+
+
+def findFiles(pattern):
+    """Returns a sorted list of paths. pattern is either a directory, which
+    is searched recursively for DLIS files, or a glob that may use **."""
+    if os.path.isdir(pattern):
+        ret = []
+        for root, _dirs, files in os.walk(pattern):
+            for f in files:
+                if os.path.splitext(f)[1].lower() in DLIS_EXTENSIONS:
+                    ret.append(os.path.join(root, f))
+        return sorted(ret)
+    return sorted(p for p in glob.glob(pattern, recursive=True) if os.path.isfile(p))
+
+
+def scanFile(path, useSidecar=False):
+    """The default scan function, returns ScanV1EFLR.objects for path."""
+    return ScanV1EFLR.ScanV1EFLR(path, useSidecar).objects
+
+
+def _onAlarm(signum, frame):
+    raise ExceptionBatchScanTimeout('Timed out')
+
+
+def _runOne(theFunction, path, useSidecar, timeout):
+    """Runs theFunction on a single file in a worker, never raises."""
+    useAlarm = timeout is not None and hasattr(signal, 'setitimer')
+    t = time.time()
+    try:
+        if useAlarm:
+            signal.signal(signal.SIGALRM, _onAlarm)
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        try:
+            return BatchResult(path, theFunction(path, useSidecar), None, time.time() - t)
+        finally:
+            if useAlarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+    except ExceptionBatchScanTimeout:
+        return BatchResult(path, None, 'Timed out after {:.1f} (s)'.format(timeout), time.time() - t)
+    except Exception:
+        return BatchResult(path, None, traceback.format_exc(), time.time() - t)
+
+
+def _runChunk(theFunction, paths, useSidecar, timeout):
+    return [_runOne(theFunction, p, useSidecar, timeout) for p in paths]
+
+
+def batchScan(paths, jobs=None, chunkSize=1, timeout=None, useSidecar=False, theFunction=scanFile, maxPending=None):
+    """Generator that scans paths over a pool of jobs processes (default the
+    number of CPUs) and yields a BatchResult for every file as it completes.
+    chunkSize files are sent to a worker in one task and at most maxPending
+    tasks (default 2 * jobs) are in flight at once. timeout is the per-file
+    limit in seconds, this uses SIGALRM so is only enforced on POSIX.
+    theFunction(path, useSidecar) must be picklable, i.e. a module level function.
+
+    If a worker process dies every task in flight is lost, those files are
+    retried one at a time on a fresh pool up to MAX_ATTEMPTS times in all."""
+    jobs = jobs or os.cpu_count() or 1
+    maxPending = maxPending or 2 * jobs
+    # (list of paths, attempt number)
+    chunks = collections.deque((paths[i:i + chunkSize], 1) for i in range(0, len(paths), chunkSize))
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+    pending = {}
+    try:
+        while chunks or pending:
+            while chunks and len(pending) < maxPending:
+                # A retry runs on its own so it can not be killed by another file
+                if chunks[0][1] > 1 and pending:
+                    break
+                chunk, attempt = chunks.popleft()
+                pending[executor.submit(_runChunk, theFunction, chunk, useSidecar, timeout)] = (chunk, attempt)
+                if attempt > 1:
+                    break
+            done, _notDone = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            lost = []
+            for future in done:
+                chunk, attempt = pending.pop(future)
+                try:
+                    results = future.result()
+                except concurrent.futures.BrokenExecutor:
+                    lost.append((chunk, attempt))
+                    continue
+                for result in results:
+                    yield result
+            if lost:
+                lost.extend(pending.values())
+                pending = {}
+                executor.shutdown(wait=False)
+                executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+                for chunk, attempt in lost:
+                    for p in chunk:
+                        if attempt < MAX_ATTEMPTS:
+                            chunks.appendleft(([p], attempt + 1))
+                        else:
+                            yield BatchResult(p, None, 'Worker process died', 0.0)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scans DLIS files in parallel.')
+    parser.add_argument('paths', nargs='+', help='Directories or globs of DLIS files.')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Number of processes, default the number of CPUs.')
+    parser.add_argument('--chunk', type=int, default=1, help='Files per task, default 1.')
+    parser.add_argument('--timeout', type=float, default=None, help='Per file timeout in seconds.')
+    parser.add_argument('--sidecar', action='store_true', help='Use and write sidecar indexes.')
+    args = parser.parse_args()
+
+    paths = []
+    for p in args.paths:
+        paths.extend(findFiles(p))
+    timStart = time.time()
+    failed = 0
+    for result in batchScan(paths, args.jobs, args.chunk, args.timeout, args.sidecar):
+        if result.error is None:
+            print('{:8.3f} (S) OK    {:s} logical files: {:d}'.format(result.seconds, result.path, len(result.objects)))
+        else:
+            failed += 1
+            print('{:8.3f} (S) ERROR {:s} {:s}'.format(result.seconds, result.path, result.error.strip().splitlines()[-1]))
+    print('Files: {:d} failed: {:d} Exec. time = {:8.3f} (S)'.format(len(paths), failed, time.time() - timStart))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
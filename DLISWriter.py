@@ -0,0 +1,403 @@
+#!/usr/bin/env python
+# Part of TotalDepth: Petrophysical data processing and presentation
+# Copyright (C) 1999-2012 Paul Ross
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Paul Ross: apaulross@gmail.com
+"""Writes DLIS files: the Storage Unit Label, Visible Records, Logical Record
+Segments, EFLR sets and frame data IFLRs.
+
+DLISWriter packs Logical Records into segments of at most segMax bytes and the
+segments into Visible Records of at most vrMax bytes. A Visible Record is
+written when the next segment does not fit in it. Output is collected in a
+buffer of bufferSize bytes so the file sees a few large writes.
+
+EFLR bodies are built with SetWriter which uses the RepCode write* functions.
+
+Frame data is written from a NumPy structured array, one field per channel in
+the order of the FRAME CHANNELS attribute, and the rep code of each channel.
+FSHORT, ISINGL and VSINGL channels are given as floats and encoded to their
+raw bits in bulk by RepCodeArray. writeFrames() lays out whole Visible
+Records of IFLRs as a structured array so the values are packed in the byte
+order on disk by NumPy rather than one at a time:
+
+    values = np.empty(len(depth), dtype=[('DEPT', 'f8'), ('GR', 'f8')])
+    values['DEPT'] = depth
+    ...
+    with DLISWriter.DLISWriter('out.dlis') as w:
+        w.writeEFLR(DLISWriter.EFLR_FRAME, frameSet.getvalue())
+        w.writeFrames(b'MAIN', values, repCodes=[RepCode.nameToCode('FDOUBL'), RepCode.nameToCode('FSHORT')])
+
+Alternatively the values can be given with the dtype on disk, see
+FrameData.frameDtype(), with the raw bits of FSHORT, ISINGL and VSINGL
+channels as RepCodeArray.RC_DTYPE, and written with dtype=.
+"""
+
+import io
+
+import numpy as np
+
+import Commitar.LogicalRecord as LogicalRecord
+import Commitar.RepCode as RepCode
+import Commitar.RepCodeArray as RepCodeArray
+
+# Maximum Visible Record length.
+VR_MAX = 8192
+# Minimum Logical Record Segment length, RP66v1 Sect. 2.2.2.1
+MIN_SEGMENT = 16
+# Output is written to the file in chunks of at least this many bytes.
+BUFFER_SIZE = 2**20
+# Frames are packed in blocks of about this many bytes.
+FRAME_BLOCK_SIZE = 2**24
+
+# Component descriptors, RP66v1 Sect. 3.2.2.1
+DESC_SET = 0xF8
+DESC_ATTRIB = 0x34
+DESC_OBJECT = 0x70
+DESC_VALUE = 0x21
+DESC_COUNT_VALUE = 0x29
+DESC_UNITS_VALUE = 0x23
+DESC_ABSENT = 0x00
+
+# EFLR type codes, RP66v1 Appendix A.
+EFLR_FHLR = 0
+EFLR_OLR = 1
+EFLR_AXIS = 2
+EFLR_CHANNL = 3
+EFLR_FRAME = 4
+EFLR_STATIC = 5
+
+# IFLR type code of frame data, RP66v1 Appendix A.
+IFLR_FDATA = 0
+
+# Largest value of a UVARI, RP66v1 Appendix B.
+UVARI_MAX = 2**30 - 1
+
+
+class ExceptionDLISWriter(Exception):
+    pass
+
+
+def storageUnitLabel(theSetId='Default Storage Set', theSequence=1, theVrMax=VR_MAX):
+    """Returns the 80 bytes of a Storage Unit Label, RP66v1 Sect. 2.3.2"""
+    ret = '{:4d}V1.00RECORD{:5d}{:60s}'.format(theSequence, theVrMax, theSetId).encode('ascii')
+    if len(ret) != LogicalRecord.LEN_SUL:
+        raise ExceptionDLISWriter('Can not write a Storage Unit Label from {!r}'.format(theSetId))
+    return ret
+
+
+def obname(theName, origin=1, copy=0):
+    """Returns the OBNAME value of theName, an IDENT as bytes."""
+    return RepCode.OBNAMEInternal(None, origin, copy, RepCode.IDENTString(theName), None)
+
+
+def padLength(n):
+    """The number of pad bytes that make a segment of n bytes, including the
+    header, at least MIN_SEGMENT bytes and of even length."""
+    if n % 2 or n < MIN_SEGMENT:
+        p = max(MIN_SEGMENT - n, n % 2)
+        if (n + p) % 2:
+            p += 1
+        return p
+    return 0
+
+
+def _padBytes(p):
+    """The pad bytes, the last of which is the pad count, RP66v1 Sect. 2.2.2.4"""
+    return bytes(p - 1) + bytes((p,))
+
+
+def _bigEndian(theDtype):
+    """The packed dtype of theDtype with every field big-endian, as most rep
+    codes are but not the inverted order ones."""
+    return np.dtype({
+        'names': list(theDtype.names),
+        'formats': [theDtype.fields[n][0].newbyteorder('>') for n in theDtype.names],
+    })
+
+
+def _encode(theValues, theRepCodes):
+    """theValues with the fields of FSHORT, ISINGL and VSINGL channels,
+    floats, replaced by their raw bits."""
+    encoded = [(n, c) for n, c in zip(theValues.dtype.names, theRepCodes) if c in RepCodeArray.RC_ENCODE]
+    if not encoded:
+        return theValues
+    codes = dict(encoded)
+    ret = np.empty(theValues.shape, dtype=[
+        (n, RepCodeArray.dtypeForRepCode(codes[n]) if n in codes else t, theValues.dtype[n].shape)
+        for n, t in ((n, theValues.dtype[n].base) for n in theValues.dtype.names)
+    ])
+    for n in theValues.dtype.names:
+        ret[n] = RepCodeArray.encode(codes[n], theValues[n]) if n in codes else theValues[n]
+    return ret
+
+
+def _uvariLength(theNumbers):
+    """The length of the UVARI of each of theNumbers, 1, 2 or 4."""
+    return np.where(theNumbers < 0x80, 1, np.where(theNumbers < 0x4000, 2, 4))
+
+
+# {UVARI length : (dtype, marker bits), ...}
+UVARI_DTYPE = {
+    1: (np.dtype('>u1'), 0),
+    2: (np.dtype('>u2'), 0x8000),
+    4: (np.dtype('>u4'), 0xC0000000),
+}
+
+
+class DLISWriter(object):
+    """Writes Logical Records to theFile, a path or a binary file object, as
+    segments packed into Visible Records. Records longer than segMax bytes
+    are split. If theFile is a path the file is closed by close()."""
+
+    def __init__(self, theFile, segMax=4000, vrMax=VR_MAX, bufferSize=BUFFER_SIZE, theSetId='Default Storage Set'):
+        if vrMax < MIN_SEGMENT + LogicalRecord.LEN_VR_HEADER or vrMax > 0xFFFF or vrMax % 2:
+            raise ExceptionDLISWriter('Illegal Visible Record length {:d}'.format(vrMax))
+        if segMax < 1 or segMax + LogicalRecord.LEN_LRSH + 1 > vrMax - LogicalRecord.LEN_VR_HEADER:
+            raise ExceptionDLISWriter('Segment length {:d} does not fit a Visible Record of {:d}'.format(segMax, vrMax))
+        if isinstance(theFile, str):
+            self._f = open(theFile, 'wb')
+            self._owner = True
+        else:
+            self._f = theFile
+            self._owner = False
+        self.segMax = segMax
+        self.vrMax = vrMax
+        self.bufferSize = bufferSize
+        # The body of the current Visible Record
+        self._vr = bytearray()
+        # Bytes waiting to be written to the file
+        self._out = bytearray()
+        self._write(storageUnitLabel(theSetId, 1, vrMax))
+
+    def _write(self, b):
+        if len(b) >= self.bufferSize:
+            self._flushOutput()
+            self._f.write(b)
+        else:
+            self._out += b
+            if len(self._out) >= self.bufferSize:
+                self._flushOutput()
+
+    def _flushOutput(self):
+        if self._out:
+            self._f.write(self._out)
+            self._out = bytearray()
+
+    def _flush(self):
+        """Writes the current Visible Record."""
+        if self._vr:
+            self._write(LogicalRecord.STRUCT_VR_HEADER.pack(
+                len(self._vr) + LogicalRecord.LEN_VR_HEADER, LogicalRecord.VR_FORMAT, LogicalRecord.VR_VERSION))
+            self._write(self._vr)
+            self._vr = bytearray()
+
+    def _segment(self, attr, typ, body):
+        n = LogicalRecord.LEN_LRSH + len(body)
+        p = padLength(n)
+        if p:
+            attr |= LogicalRecord.LRSH_ATTR_PADDING
+        if len(self._vr) + n + p + LogicalRecord.LEN_VR_HEADER > self.vrMax:
+            self._flush()
+        self._vr += LogicalRecord.STRUCT_LRSH.pack(n + p, attr, typ)
+        self._vr += body
+        if p:
+            self._vr += _padBytes(p)
+
+    def record(self, isEFLR, typ, body):
+        """Writes a Logical Record of type typ with body as one or more segments."""
+        chunks = [body[i:i + self.segMax] for i in range(0, len(body), self.segMax)] or [b'']
+        for i, c in enumerate(chunks):
+            attr = LogicalRecord.LRSH_ATTR_EFLR if isEFLR else 0
+            if i > 0:
+                attr |= LogicalRecord.LRSH_ATTR_PREDECESSOR
+            if i < len(chunks) - 1:
+                attr |= LogicalRecord.LRSH_ATTR_SUCCESSOR
+            self._segment(attr, typ, c)
+
+    def writeEFLR(self, typ, body):
+        self.record(True, typ, body)
+
+    def writeIFLR(self, typ, body):
+        self.record(False, typ, body)
+
+    def writeFrames(self, theName, theValues, frameNumbers=None, origin=1, copy=0, dtype=None, repCodes=None):
+        """Writes an FDATA IFLR for each row of theValues, a structured array
+        of the channel values, of the frame type theName, an IDENT as bytes.
+        frameNumbers defaults to 1, 2, 3 and so on.
+        repCodes is the rep code of each channel. With it FSHORT, ISINGL and
+        VSINGL channels are given as floats and encoded in bulk by
+        RepCodeArray.encode(), and dtype defaults to the dtype on disk.
+        dtype is the dtype on disk, FrameData.frameDtype() of the channels,
+        theValues are cast to it field by field as it is. Without dtype or
+        repCodes every field is written big-endian which is wrong for the
+        inverted order codes ISNORM to IRLONG. Their little-endian dtype can
+        not be told from a native one on a little-endian machine so they need
+        dtype or repCodes."""
+        values = np.asarray(theValues)
+        if values.dtype.names is None:
+            raise ExceptionDLISWriter('Frame values must be a structured array not {!r}'.format(values.dtype))
+        if repCodes is not None:
+            if len(repCodes) != len(values.dtype.names):
+                raise ExceptionDLISWriter(
+                    'Got {:d} rep codes for {:d} channels'.format(len(repCodes), len(values.dtype.names)))
+            values = _encode(values, repCodes)
+            if dtype is None:
+                dtype = np.dtype([
+                    (n, RepCodeArray.dtypeForRepCode(c), values.dtype[n].shape)
+                    for n, c in zip(values.dtype.names, repCodes)
+                ])
+        if dtype is None:
+            dtype = _bigEndian(values.dtype)
+        elif dtype.names is None or len(dtype.names) != len(values.dtype.names):
+            raise ExceptionDLISWriter('dtype {!r} does not match the frame values {!r}'.format(dtype, values.dtype))
+        values = values.astype(dtype, copy=False)
+        if frameNumbers is None:
+            numbers = np.arange(1, len(values) + 1, dtype=np.int64)
+        else:
+            numbers = np.asarray(frameNumbers, dtype=np.int64)
+            if numbers.shape != (len(values),):
+                raise ExceptionDLISWriter(
+                    'Got {:d} frame numbers for {:d} frames'.format(numbers.size, len(values)))
+        if len(numbers) and (numbers.min() < 0 or numbers.max() > UVARI_MAX):
+            raise ExceptionDLISWriter('Frame numbers must be in the range 0 to {:d}'.format(UVARI_MAX))
+        s = io.BytesIO()
+        RepCode.writeOBNAME(obname(theName, origin, copy), s)
+        head = s.getvalue()
+        # Runs of frames whose frame numbers are encoded in the same length
+        lengths = _uvariLength(numbers)
+        bounds = [0] + list(np.flatnonzero(np.diff(lengths)) + 1) + [len(numbers)]
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            if start < stop:
+                self._writeRun(head, int(lengths[start]), numbers[start:stop], values[start:stop])
+
+    def _writeRun(self, head, uvariLength, numbers, values):
+        """Writes IFLRs whose frame numbers all have a UVARI of uvariLength bytes."""
+        n = LogicalRecord.LEN_LRSH + len(head) + uvariLength + values.dtype.itemsize
+        p = padLength(n)
+        size = n + p
+        if n - LogicalRecord.LEN_LRSH > self.segMax:
+            # Multi-segment records are rare, write them one at a time
+            for number, v in zip(numbers, values):
+                s = io.BytesIO()
+                s.write(head)
+                RepCode.writeUVARI(int(number), s)
+                s.write(v.tobytes())
+                self.record(False, IFLR_FDATA, s.getvalue())
+            return
+        fields = [
+            ('length', '>u2'),
+            ('attributes', 'u1'),
+            ('type', 'u1'),
+            ('head', 'u1', (len(head),)),
+            ('number', UVARI_DTYPE[uvariLength][0]),
+            ('values', values.dtype),
+        ]
+        if p:
+            fields.append(('pad', 'u1', (p,)))
+        recDtype = np.dtype(fields)
+        # Segments per Visible Record
+        k = (self.vrMax - LogicalRecord.LEN_VR_HEADER) // size
+        vrDtype = np.dtype([
+            ('length', '>u2'),
+            ('format', 'u1'),
+            ('version', 'u1'),
+            ('records', recDtype, (k,)),
+        ])
+        block = max(1, FRAME_BLOCK_SIZE // vrDtype.itemsize) * k
+        for b in range(0, len(values), block):
+            recs = np.empty(min(block, len(values) - b), dtype=recDtype)
+            recs['length'] = size
+            recs['attributes'] = LogicalRecord.LRSH_ATTR_PADDING if p else 0
+            recs['type'] = IFLR_FDATA
+            recs['head'] = np.frombuffer(head, dtype='u1')
+            recs['number'] = numbers[b:b + len(recs)] | UVARI_DTYPE[uvariLength][1]
+            recs['values'] = values[b:b + len(recs)]
+            if p:
+                recs['pad'] = np.frombuffer(_padBytes(p), dtype='u1')
+            i = 0
+            # Top up the current Visible Record
+            if self._vr:
+                i = min(len(recs), (self.vrMax - LogicalRecord.LEN_VR_HEADER - len(self._vr)) // size)
+                self._vr += recs[:i].tobytes()
+                if i == len(recs):
+                    continue
+                self._flush()
+            # Whole Visible Records
+            m = (len(recs) - i) // k
+            if m:
+                vrs = np.empty(m, dtype=vrDtype)
+                vrs['length'] = vrDtype.itemsize
+                vrs['format'] = LogicalRecord.VR_FORMAT
+                vrs['version'] = LogicalRecord.VR_VERSION
+                vrs['records'] = recs[i:i + m * k].reshape(m, k)
+                self._write(memoryview(vrs.view(np.uint8)))
+                i += m * k
+            # The rest start the next Visible Record
+            self._vr += recs[i:].tobytes()
+
+    def close(self):
+        self._flush()
+        self._flushOutput()
+        if self._owner:
+            self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+class SetWriter(object):
+    """Builds the body of an EFLR with the RepCode write* functions. theName
+    is the set name, an IDENT as bytes."""
+
+    def __init__(self, theType, theName):
+        self._s = io.BytesIO()
+        RepCode.writeUSHORT(DESC_SET, self._s)
+        RepCode.writeIDENT(RepCode.IDENTString(theType), self._s)
+        RepCode.writeIDENT(RepCode.IDENTString(theName), self._s)
+
+    def template(self, label, repCode):
+        RepCode.writeUSHORT(DESC_ATTRIB, self._s)
+        RepCode.writeIDENT(RepCode.IDENTString(label), self._s)
+        RepCode.writeUSHORT(repCode, self._s)
+
+    def object(self, name, origin=1, copy=0):
+        RepCode.writeUSHORT(DESC_OBJECT, self._s)
+        RepCode.writeOBNAME(obname(name, origin, copy), self._s)
+
+    def value(self, repCode, v, units=None):
+        if units is not None:
+            RepCode.writeUSHORT(DESC_UNITS_VALUE, self._s)
+            RepCode.writeUNITS(RepCode.UNITSString(units), self._s)
+        else:
+            RepCode.writeUSHORT(DESC_VALUE, self._s)
+        RepCode.writeIndirectRepCode(repCode, v, self._s)
+
+    def values(self, repCode, vs):
+        RepCode.writeUSHORT(DESC_COUNT_VALUE, self._s)
+        RepCode.writeUVARI(len(vs), self._s)
+        for v in vs:
+            RepCode.writeIndirectRepCode(repCode, v, self._s)
+
+    def absent(self):
+        RepCode.writeUSHORT(DESC_ABSENT, self._s)
+
+    def getvalue(self):
+        return self._s.getvalue()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# Part of TotalDepth: Petrophysical data processing and presentation
+# Copyright (C) 1999-2012 Paul Ross
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Paul Ross: apaulross@gmail.com
+"""Columnar view of an EFLR set, one NumPy array per attribute.
+
+ScanV1EFLR.objects holds a table, AttrComp.EFLRTable, for every set with a
+row per object. fromTable() turns the decoded rows of a table into an
+EFLRColumns which maps each attribute label to a Column of typed values. The
+type of a column is that of the rep code of its attribute in the template:
+
+* Integer codes are int64 arrays, floating point codes are float64 arrays
+  and DTIME is a datetime64[ms] array. Missing values are 0, NaN and NaT
+  respectively, Column.present tells them apart.
+* If any object has several values of a numeric attribute, DIMENSION,
+  VALUES or COEFFICIENTS for example, the array is 2-D with a row per object
+  that is padded to the longest one as above. Column.counts has the number
+  of values of each object and Column.first the first value of each.
+* IDENT, ASCII and UNITS values are interned str in an object array, so equal
+  strings are shared.
+* OBNAME values are ObjectName tuples.
+* Other values, and those of tables without rep codes or of attributes
+  whose objects give values that do not fit the rep code, are typed from the
+  values themselves in the same way, or are as given by AttrComp.cellValue()
+  in an object array with multiple values as a tuple.
+
+Units are kept separate from the values in Column.units. Filters and
+aggregations are then NumPy operations, for example:
+
+    cols = EFLRColumns.fromTable(scan.objects[fileId]['PARAMETER'])
+    values = cols['VALUES']
+    deep = cols.where(values.present & (values.first > 1000.0))
+    print(deep.names)
+    # The sum of the values of each object, values is 2-D if any has several
+    sums = np.nansum(values.values.reshape(cols.objectCount, -1), axis=1)
+
+This needs NumPy.
+"""
+
+import collections
+import collections.abc
+import datetime
+
+import numpy as np
+
+import Commitar.AttrComp_V2 as AttrComp
+import Commitar.RepCodeArray as RepCodeArray
+
+
+class ExceptionEFLRColumns(Exception):
+    pass
+
+
+# An object name, the OBNAME of an object or the value of an OBNAME attribute.
+ObjectName = AttrComp.ObjectName
+
+# label - the attribute label as a str.
+# values - NumPy array with a value per object, int64, float64,
+# datetime64[ms] or object. A 2-D array with a row per object if it is numeric
+# and any object has several values.
+# present - bool array, False where the attribute is absent or has no value.
+# counts - int64 array, the number of values of each object.
+# units - object array of the units of each value as str, None where there
+# are none, or None if no value has units.
+class Column(collections.namedtuple('Column', 'label values present counts units')):
+    __slots__ = ()
+
+    @property
+    def first(self):
+        """The first value of each object, values if that is 1-D."""
+        if self.values.ndim == 2:
+            return self.values[:, 0]
+        return self.values
+
+
+INT64 = np.dtype(np.int64)
+FLOAT64 = np.dtype(np.float64)
+DATETIME64 = np.dtype('datetime64[ms]')
+
+# {dtype : (Python types of the values that fit it, value of a missing one), ...}
+# in the order the values are tried when there is no rep code.
+_DTYPE_VALUES = collections.OrderedDict((
+    (INT64, ({int}, 0)),
+    (FLOAT64, ({int, float}, np.nan)),
+    (DATETIME64, ({datetime.datetime}, np.datetime64('NaT'))),
+))
+
+# Variable length integer codes, UVARI and ORIGIN, that RepCodeArray has no dtype for.
+_INT_REP_CODES = (18, 22)
+
+
+def _objectArray(theValues):
+    """An object array of theValues, elements that are tuples stay elements."""
+    ret = np.empty(len(theValues), dtype=object)
+    for i, v in enumerate(theValues):
+        ret[i] = v
+    return ret
+
+
+def repCodeDtype(theRepCode):
+    """The dtype of a column of rep code theRepCode, INT64, FLOAT64 or
+    DATETIME64, None if the values are not numbers or times."""
+    if theRepCode in _INT_REP_CODES:
+        return INT64
+    try:
+        dt = RepCodeArray.valueDtype(theRepCode)
+    except RepCodeArray.ExceptionRepCodeArray:
+        return None
+    if dt.names is None:
+        if dt.kind in 'iu':
+            return INT64
+        if dt.kind == 'f':
+            return FLOAT64
+        if dt.kind == 'M':
+            return DATETIME64
+    return None
+
+
+def _columnDtype(theRepCode, theKinds):
+    """The dtype of a column of rep code theRepCode, or None if not known,
+    with values of the Python types theKinds. None for an object column."""
+    dt = None if theRepCode is None else repCodeDtype(theRepCode)
+    if dt is not None and theKinds <= _DTYPE_VALUES[dt][0]:
+        return dt
+    if theKinds:
+        for dt, (kinds, _missing) in _DTYPE_VALUES.items():
+            if theKinds <= kinds:
+                return dt
+    return None
+
+
+def _column(theLabel, theCells, theRepCode, theCache):
+    """Makes a Column from the raw cells of one attribute, theRepCode is that
+    of the template or None."""
+    values = []
+    units = []
+    for c in theCells:
+        v = AttrComp.cellValue(c, theCache)
+        if v is None:
+            values.append(())
+        elif isinstance(v, list):
+            values.append(tuple(v))
+        else:
+            values.append((v,))
+        units.append(AttrComp.cellUnits(c, theCache))
+    counts = np.array([len(v) for v in values], dtype=np.int64)
+    present = counts > 0
+    dt = _columnDtype(theRepCode, set(type(x) for v in values for x in v))
+    if dt is None:
+        arr = _objectArray([None if not v else v[0] if len(v) == 1 else v for v in values])
+    else:
+        missing = _DTYPE_VALUES[dt][1]
+        width = int(counts.max()) if len(counts) else 0
+        if width > 1:
+            arr = np.full((len(values), width), missing, dtype=dt)
+            for i, v in enumerate(values):
+                arr[i, :len(v)] = v
+        else:
+            arr = np.array([v[0] if v else missing for v in values], dtype=dt)
+    if any(u is not None for u in units):
+        unitsArray = _objectArray(units)
+    else:
+        unitsArray = None
+    return Column(theLabel, arr, present, counts, unitsArray)
+
+
+class EFLRColumns(collections.abc.Mapping):
+    """The objects of an EFLR set as a mapping {label : Column, ...} in
+    template order. names, origins and copies give the object names."""
+
+    def __init__(self, theNames, theOrigins, theCopies, theColumns):
+        # object array of str
+        self.names = theNames
+        # int64 arrays
+        self.origins = theOrigins
+        self.copies = theCopies
+        # {label : Column, ...}
+        self._columns = theColumns
+
+    def __getitem__(self, k):
+        return self._columns[k]
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __len__(self):
+        return len(self._columns)
+
+    @property
+    def objectCount(self):
+        return len(self.names)
+
+    def objectNames(self):
+        """Returns the list of ObjectName of the objects."""
+        return [ObjectName(int(o), int(c), n) for o, c, n in zip(self.origins, self.copies, self.names)]
+
+    def where(self, theSelection):
+        """Returns a new EFLRColumns of the objects selected by theSelection, a
+        bool array or an array of indices."""
+        return EFLRColumns(
+            self.names[theSelection],
+            self.origins[theSelection],
+            self.copies[theSelection],
+            collections.OrderedDict(
+                (k, Column(
+                    c.label,
+                    c.values[theSelection],
+                    c.present[theSelection],
+                    c.counts[theSelection],
+                    None if c.units is None else c.units[theSelection],
+                )) for k, c in self._columns.items()
+            ),
+        )
+
+    def __repr__(self):
+        return 'EFLRColumns({:d} objects, {!r})'.format(self.objectCount, list(self._columns))
+
+
+def fromTable(theTable):
+    """Returns an EFLRColumns from an AttrComp.EFLRTable. Tables read back
+    from a sidecar index only have strings and raise ExceptionEFLRColumns."""
+    rows = getattr(theTable, 'rows', None)
+    if rows is None:
+        raise ExceptionEFLRColumns('The table has no decoded values.')
+    labels = theTable['header'][1:]
+    cache = {}
+    names = []
+    origins = []
+    copies = []
+    for row in rows:
+        name = AttrComp.cellValue(row[0], cache) if row else None
+        if isinstance(name, ObjectName):
+            names.append(name.identifier)
+            origins.append(name.origin)
+            copies.append(name.copy)
+        else:
+            names.append(None)
+            origins.append(0)
+            copies.append(0)
+    repCodes = getattr(theTable, 'repCodes', None)
+    columns = collections.OrderedDict()
+    for i, label in enumerate(labels):
+        # Short rows lack their last attributes
+        cells = [row[i + 1] if i + 1 < len(row) else None for row in rows]
+        columns[label] = _column(label, cells, None if repCodes is None else repCodes[i], cache)
+    return EFLRColumns(
+        _objectArray(names),
+        np.array(origins, dtype=np.int64),
+        np.array(copies, dtype=np.int64),
+        columns,
+    )
@@ -0,0 +1,441 @@
+#!/usr/bin/env python
+# Part of TotalDepth: Petrophysical data processing and presentation
+# Copyright (C) 1999-2012 Paul Ross
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Paul Ross: apaulross@gmail.com
+"""Bulk decoding of frame data (IFLRs) into NumPy structured arrays.
+
+The FRAME and CHANNEL tables gathered by ScanV1EFLR.parseFrame/parseChannel
+give, for each frame type, the ordered list of channels and each channel's
+REPRESENTATION-CODE and DIMENSION. From those a structured dtype is built for
+the frame and the bodies of all the IFLRs of that frame type are concatenated
+and decoded with a single np.frombuffer().
+
+For very large files FrameDecoder.decodeParallel() splits the IFLRs into
+contiguous ranges that are decoded by worker processes, each of which maps the
+file itself, and the results are concatenated in frame number order.
+
+See RP66v1 Sect. 5.6.1, an FDATA IFLR is:
+Frame name      OBNAME
+Frame number    UVARI
+Channel values  In the order of the FRAME CHANNELS attribute.
+"""
+
+import collections
+import concurrent.futures
+import os
+
+import numpy as np
+
+import Commitar.AttrComp_V2 as AttrComp
+import Commitar.LogicalRecord as LogicalRecord
+import Commitar.MmapBuffer as MmapBuffer
+import Commitar.RepCodeArray as RepCodeArray
+import Commitar.Trace as Trace
+
+# IFLR type code of frame data, RP66v1 Appendix A.
+IFLR_TYPE_FDATA = 0
+
+# name - channel identifier as a str.
+# repCode - integer representation code.
+# dimension - tuple of integers.
+# units - units as a str, may be empty.
+ChannelInfo = collections.namedtuple('ChannelInfo', 'name repCode dimension units')
+
+# frameNumbers - 1D array of frame numbers.
+# values - structured array, one field per channel.
+FrameArray = collections.namedtuple('FrameArray', 'frameNumbers values')
+
+# frameNumbers - 1D array of frame numbers.
+# starts - 1D array of the file position of the first channel value of each
+# frame or None if any IFLR of the frame type has more than one segment.
+FrameLayout = collections.namedtuple('FrameLayout', 'frameNumbers starts')
+
+# Channels of at most this many bytes per frame are gathered from the file a
+# byte column at a time, larger ones a frame at a time.
+MAX_GATHER_BYTES = 16
+
+# decodeParallel() gives each worker about this many ranges of IFLRs so that
+# the load balances when some ranges are slower than others.
+RANGES_PER_JOB = 4
+
+
+class ExceptionFrameData(Exception):
+    pass
+
+
+def _tables(theTables, prefix):
+    """Yields the tables whose key is prefix or prefix_N, for example CHANNEL, CHANNEL_1."""
+    for k, v in theTables.items():
+        if k == prefix or k.startswith(prefix + '_'):
+            yield v
+
+
+def _rows(table):
+    """The rows of a table with the object name of each as an
+    AttrComp.ObjectName and native values, see EFLRTable.nativeRows(). Tables
+    read back from a sidecar index are plain dicts of strings, their object
+    names are split from 'origin&copy&identifier' and the values are strings."""
+    if isinstance(table, AttrComp.EFLRTable):
+        return table.nativeRows()
+    ret = []
+    for row in table['data']:
+        origin, copy, identifier = row[0].split('&', 2)
+        ret.append([AttrComp.ObjectName(int(origin), int(copy), identifier)] + row[1:])
+    return ret
+
+
+def _column(table, label):
+    try:
+        return table['header'].index(label)
+    except ValueError:
+        return None
+
+
+def _asList(v):
+    if v is None:
+        return []
+    return v if isinstance(v, list) else [v]
+
+
+def _identifier(v):
+    """The identifier of an OBNAME value, it is a string in a sidecar table."""
+    return v.identifier if isinstance(v, AttrComp.ObjectName) else v
+
+
+def channelsFromTables(theTables):
+    """Returns {channel name : ChannelInfo, ...} from the CHANNEL tables of a
+    logical file as held in ScanV1EFLR.objects."""
+    ret = {}
+    for table in _tables(theTables, 'CHANNEL'):
+        iRc = _column(table, 'REPRESENTATION-CODE')
+        iDim = _column(table, 'DIMENSION')
+        iUnits = _column(table, 'UNITS')
+        if iRc is None:
+            continue
+        for row in _rows(table):
+            name = row[0].identifier
+            dims = [int(d) for d in _asList(row[iDim])] if iDim is not None else [1]
+            # An absent DIMENSION, recorded as 0 in a sidecar, means a single value
+            dims = tuple(d for d in dims if d > 0) or (1,)
+            units = row[iUnits] if iUnits is not None else None
+            # A sidecar records absent UNITS as '0'
+            units = '' if units is None or units == '0' else units.strip()
+            ret[name] = ChannelInfo(name, int(row[iRc] or 0), dims, units)
+    return ret
+
+
+def framesFromTables(theTables):
+    """Returns {frame name : [channel name, ...], ...} from the FRAME tables of
+    a logical file as held in ScanV1EFLR.objects."""
+    ret = {}
+    for table in _tables(theTables, 'FRAME'):
+        iChannels = _column(table, 'CHANNELS')
+        if iChannels is None:
+            continue
+        for row in _rows(table):
+            ret[row[0].identifier] = [_identifier(c) for c in _asList(row[iChannels])]
+    return ret
+
+
+def frameDtype(theChannels, converted=False):
+    """Returns a structured dtype given a list of ChannelInfo in frame order.
+    This is the layout on disk unless converted is True in which case FSHORT,
+    ISINGL and VSINGL fields are floats and DTIME fields are datetime64[ms],
+    see RepCodeArray.convert()."""
+    fields = []
+    seen = collections.Counter()
+    for ch in theChannels:
+        if converted:
+            dt = RepCodeArray.valueDtype(ch.repCode)
+        else:
+            dt = RepCodeArray.dtypeForRepCode(ch.repCode)
+        name = ch.name if seen[ch.name] == 0 else '{:s}_{:d}'.format(ch.name, seen[ch.name])
+        seen[ch.name] += 1
+        if ch.dimension == (1,):
+            fields.append((name, dt))
+        else:
+            fields.append((name, dt, ch.dimension))
+    return np.dtype(fields)
+
+
+def _uvari(theView, pos):
+    """Returns (value, new position) of a UVARI in theView at pos."""
+    b = theView[pos]
+    if b & 0x80 == 0:
+        return b, pos + 1
+    if b & 0x40 == 0:
+        return ((b & 0x3F) << 8) | theView[pos + 1], pos + 2
+    return int.from_bytes(theView[pos:pos + 4], 'big') & 0x3FFFFFFF, pos + 4
+
+
+def _frameHeader(theView):
+    """Returns (frame name, frame number, position of the first channel value)
+    of an FDATA body."""
+    _origin, pos = _uvari(theView, 0)
+    # Copy number USHORT
+    pos += 1
+    l = theView[pos]
+    name = bytes(theView[pos + 1:pos + 1 + l]).decode('ascii')
+    frameNumber, pos = _uvari(theView, pos + 1 + l)
+    return name, frameNumber, pos
+
+
+def _frameBytes(theIndex, thePositions, frameName, itemsize):
+    """Returns (array of frame numbers, bytes of the channel values) of the
+    IFLRs of frameName among thePositions, those of other frames are skipped."""
+    frameNumbers = []
+    parts = []
+    for position in thePositions:
+        body = theIndex.logicalRecordBody(position)
+        name, frameNumber, pos = _frameHeader(body)
+        if name != frameName:
+            continue
+        if len(body) - pos != itemsize:
+            raise ExceptionFrameData('Frame {:s} number {:d} has {:d} bytes of data, expected {:d}'.format(
+                frameName, frameNumber, len(body) - pos, itemsize))
+        frameNumbers.append(frameNumber)
+        parts.append(body[pos:])
+    if Trace.counting:
+        Trace.count('records.IFLR', len(frameNumbers))
+        Trace.count('bytes.IFLR', len(frameNumbers) * itemsize)
+    return np.array(frameNumbers, dtype=np.uint32), b''.join(parts)
+
+
+def _convertFrames(theData, theDtype, theRepCodes, theValuesDtype):
+    """Decodes the bytes of frames whose dtype on disk is theDtype and
+    converts the channels of theRepCodes that are held as raw bits, the
+    result has theValuesDtype if any are."""
+    raw = np.frombuffer(theData, dtype=theDtype)
+    if not any(RepCodeArray.needsConversion(c) for c in theRepCodes):
+        return raw
+    ret = np.empty(len(raw), dtype=theValuesDtype)
+    for name, c in zip(theDtype.names, theRepCodes):
+        ret[name] = RepCodeArray.convert(c, raw[name])
+    return ret
+
+
+def _decodeRange(path, theSegments, thePositions, frameName, theDtype, theRepCodes, theValuesDtype):
+    """Worker process side of FrameDecoder.decodeParallel(). Maps the file at
+    path and returns (array of frame numbers, converted values) of the frames
+    of frameName in a range of IFLRs, see _frameBytes() and _convertFrames().
+    theSegments - list of (offset, length, attributes) of the segments spanned by the range.
+    thePositions - list of (first, last) indexes into theSegments, one per IFLR."""
+    with MmapBuffer.MmapBuffer(path) as fb:
+        index = LogicalRecord.LRSHIndex(fb, [
+            LogicalRecord.LRSHIndexEntry(o, l, a, IFLR_TYPE_FDATA, False) for o, l, a in theSegments
+        ])
+        positions = [
+            LogicalRecord.LogicalRecordPosition(f, l, IFLR_TYPE_FDATA, False) for f, l in thePositions
+        ]
+        frameNumbers, data = _frameBytes(index, positions, frameName, theDtype.itemsize)
+    return frameNumbers, _convertFrames(data, theDtype, theRepCodes, theValuesDtype)
+
+
+class FrameDecoder(object):
+    """Decodes the frame data of one logical file.
+    theIndex - LogicalRecord.LRSHIndex of the file.
+    thePositions - list of LogicalRecord.LogicalRecordPosition of this logical file.
+    theTables - the FRAME and CHANNEL tables of this logical file as held in
+    ScanV1EFLR.objects[file header ID].
+    thePath - the path of the file, needed by decodeParallel() only."""
+
+    def __init__(self, theIndex, thePositions, theTables, thePath=None):
+        self._index = theIndex
+        self._positions = thePositions
+        self.path = thePath
+        self.channels = channelsFromTables(theTables)
+        self.frames = framesFromTables(theTables)
+        # {frame name : [LogicalRecordPosition, ...], ...} built on first use
+        self._iflrs = None
+        # {frame name : FrameLayout, ...} built on first use
+        self._layouts = {}
+
+    def frameChannels(self, frameName):
+        """Returns the list of ChannelInfo of a frame in frame order."""
+        try:
+            return [self.channels[c] for c in self.frames[frameName]]
+        except KeyError as err:
+            raise ExceptionFrameData('Frame {!r} or one of its channels is not known: {:s}'.format(frameName, str(err)))
+
+    def frameDtype(self, frameName):
+        """The dtype of the channel values of a frame as on disk."""
+        return frameDtype(self.frameChannels(frameName))
+
+    def valuesDtype(self, frameName):
+        """The dtype of FrameArray.values, as frameDtype() but FSHORT, ISINGL
+        and VSINGL channels are floats and DTIME channels datetime64[ms]."""
+        return frameDtype(self.frameChannels(frameName), converted=True)
+
+    def _values(self, frameName, data):
+        """Decodes the bytes of frames of frameName and converts the channels
+        that are held as raw bits."""
+        return _convertFrames(
+            data,
+            self.frameDtype(frameName),
+            [ch.repCode for ch in self.frameChannels(frameName)],
+            self.valuesDtype(frameName),
+        )
+
+    def _groupIFLRs(self):
+        self._iflrs = collections.defaultdict(list)
+        for position in self._positions:
+            if not position.isEFLR and position.recordType == IFLR_TYPE_FDATA:
+                name, _frameNumber, _pos = _frameHeader(self._index.logicalRecordBody(position))
+                self._iflrs[name].append(position)
+
+    def iflrs(self, frameName):
+        """Returns the list of LogicalRecordPosition of the IFLRs of a frame."""
+        if self._iflrs is None:
+            self._groupIFLRs()
+        return self._iflrs.get(frameName, [])
+
+    def decode(self, frameName):
+        """Decodes every frame of frameName, returns a FrameArray."""
+        dt = self.frameDtype(frameName)
+        frameNumbers, data = _frameBytes(self._index, self.iflrs(frameName), frameName, dt.itemsize)
+        return FrameArray(frameNumbers, self._values(frameName, data))
+
+    def decodeParallel(self, frameName, jobs=None):
+        """As decode() but the FDATA IFLRs of this logical file are split into
+        contiguous ranges that are decoded by a pool of jobs processes (default
+        the number of CPUs). Each worker maps the file itself so only the
+        segment positions are sent to it, it decodes and converts its frames
+        and returns their values which are copied into the result in order.
+        The IFLRs are not grouped by frame in this process, the workers skip
+        those of other frames."""
+        if self.path is None:
+            raise ExceptionFrameData('decodeParallel() needs the path of the file.')
+        dt = self.frameDtype(frameName)
+        repCodes = [ch.repCode for ch in self.frameChannels(frameName)]
+        valuesDt = self.valuesDtype(frameName)
+        positions = [p for p in self._positions if not p.isEFLR and p.recordType == IFLR_TYPE_FDATA]
+        jobs = jobs or os.cpu_count() or 1
+        rangeSize = max(1, -(-len(positions) // (jobs * RANGES_PER_JOB)))
+        # There are at most as many frames as IFLRs, pages past the frames of
+        # this frame type are never touched
+        frameNumbers = np.empty(len(positions), dtype=np.uint32)
+        values = np.empty(len(positions), dtype=self._values(frameName, b'').dtype)
+        n = 0
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = []
+            for i in range(0, len(positions), rangeSize):
+                chunk = positions[i:i + rangeSize]
+                base = chunk[0].first
+                segments = [(e.offset, e.length, e.attributes) for e in self._index[base:chunk[-1].last + 1]]
+                futures.append(executor.submit(
+                    _decodeRange, self.path, segments,
+                    [(p.first - base, p.last - base) for p in chunk], frameName, dt, repCodes, valuesDt,
+                ))
+            # In file order, which is the range order. Each range is copied as
+            # it is done and released so the values are not held twice.
+            for i in range(len(futures)):
+                rangeNumbers, rangeValues = futures[i].result()
+                futures[i] = None
+                frameNumbers[n:n + len(rangeNumbers)] = rangeNumbers
+                values[n:n + len(rangeValues)] = rangeValues
+                n += len(rangeNumbers)
+                del rangeNumbers, rangeValues
+        frameNumbers = frameNumbers[:n]
+        values = values[:n]
+        if np.any(frameNumbers[1:] < frameNumbers[:-1]):
+            order = np.argsort(frameNumbers, kind='stable')
+            frameNumbers = frameNumbers[order]
+            values = values[order]
+        return FrameArray(frameNumbers, values)
+
+    def frameLayout(self, frameName):
+        """Returns the FrameLayout of a frame type, this reads the header of
+        each IFLR once and is then cached."""
+        if frameName not in self._layouts:
+            itemsize = self.frameDtype(frameName).itemsize
+            positions = self.iflrs(frameName)
+            frameNumbers = np.empty(len(positions), dtype=np.uint32)
+            starts = np.empty(len(positions), dtype=np.int64)
+            for i, position in enumerate(positions):
+                body = self._index.logicalRecordBody(position)
+                _name, frameNumbers[i], pos = _frameHeader(body)
+                if len(body) - pos != itemsize:
+                    raise ExceptionFrameData('Frame {:s} number {:d} has {:d} bytes of data, expected {:d}'.format(
+                        frameName, int(frameNumbers[i]), len(body) - pos, itemsize))
+                if starts is not None:
+                    if position.first == position.last:
+                        starts[i] = self._index.bodyRange(self._index[position.first])[0] + pos
+                    else:
+                        starts = None
+            self._layouts[frameName] = FrameLayout(frameNumbers, starts)
+        return self._layouts[frameName]
+
+    def decodeChannel(self, frameName, channelName):
+        """Decodes the values of a single channel of a frame type without
+        decoding the other channels. Returns an array of shape
+        (number of frames,) + dimension, or (number of frames,) for a scalar
+        channel."""
+        frameDt = self.frameDtype(frameName)
+        if channelName not in frameDt.names:
+            raise ExceptionFrameData('Channel {!r} is not in frame {!r}'.format(channelName, frameName))
+        chDt, offset = frameDt.fields[channelName][:2]
+        layout = self.frameLayout(frameName)
+        n = len(layout.frameNumbers)
+        if layout.starts is not None and chDt.itemsize <= MAX_GATHER_BYTES:
+            raw = np.frombuffer(self._index.buffer[:], dtype=np.uint8)
+            cols = np.empty((n, chDt.itemsize), dtype=np.uint8)
+            base = layout.starts + offset
+            for k in range(chDt.itemsize):
+                cols[:, k] = raw[base + k]
+            data = cols
+        else:
+            parts = []
+            for position in self.iflrs(frameName):
+                body = self._index.logicalRecordBody(position)
+                pos = _frameHeader(body)[2] + offset
+                parts.append(body[pos:pos + chDt.itemsize])
+            data = b''.join(parts)
+        repCode = dict(zip(frameDt.names, self.frameChannels(frameName)))[channelName].repCode
+        if chDt.subdtype is None:
+            return RepCodeArray.convert(repCode, np.frombuffer(data, dtype=chDt))
+        base, shape = chDt.subdtype
+        return RepCodeArray.convert(repCode, np.frombuffer(data, dtype=base).reshape((n,) + shape))
+
+
+def logicalFilePositions(theScan):
+    """Splits the logical records of a ScanV1EFLR at each FILE-HEADER.
+    Returns a list of lists of LogicalRecordPosition, one per logical file."""
+    ret = []
+    for position, setType in zip(theScan.logicalRecords, theScan.setTypes):
+        if setType == b'FILE-HEADER':
+            ret.append([])
+        if ret:
+            ret[-1].append(position)
+    return ret
+
+
+def fromScan(theScan, objectName=None):
+    """Returns a FrameDecoder for a logical file of a ScanV1EFLR identified by
+    its file header ID, by default the first logical file."""
+    names = list(theScan.templates.keys())
+    if not names:
+        raise ExceptionFrameData('No logical file found.')
+    if objectName is None:
+        objectName = names[0]
+    try:
+        i = names.index(objectName)
+    except ValueError:
+        raise ExceptionFrameData('No logical file {!r}'.format(objectName))
+    return FrameDecoder(
+        theScan.index, logicalFilePositions(theScan)[i], theScan.templates[objectName], theScan.path
+    )
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# Part of TotalDepth: Petrophysical data processing and presentation
+# Copyright (C) 1999-2012 Paul Ross
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Paul Ross: apaulross@gmail.com
+"""Lazy access to the channels of a DLIS logical file.
+
+Opening a file only indexes it and reads its EFLRs (the metadata). The values
+of a channel are decoded from the frame data the first time they are asked for
+and then cached, other channels are never touched. For example:
+
+    for lf in LogicalFile.openLogicalFiles('file.dlis'):
+        gr = lf.channel('GR').values
+"""
+
+import Commitar.FrameData as FrameData
+import Commitar.ScanV1EFLR as ScanV1EFLR
+
+
+class ExceptionLogicalFile(Exception):
+    pass
+
+
+class Channel(object):
+    """A channel of a frame. The metadata is available immediately, values and
+    frameNumbers are decoded on first access."""
+
+    def __init__(self, theDecoder, theInfo, theFrameName):
+        self._decoder = theDecoder
+        self.info = theInfo
+        self.frameName = theFrameName
+        self._values = None
+
+    @property
+    def name(self):
+        return self.info.name
+
+    @property
+    def units(self):
+        return self.info.units
+
+    @property
+    def repCode(self):
+        return self.info.repCode
+
+    @property
+    def dimension(self):
+        return self.info.dimension
+
+    @property
+    def values(self):
+        """NumPy array of the channel values, one row per frame."""
+        if self._values is None:
+            self._values = self._decoder.decodeChannel(self.frameName, self.name)
+        return self._values
+
+    @property
+    def frameNumbers(self):
+        """NumPy array of the frame numbers corresponding to values."""
+        return self._decoder.frameLayout(self.frameName).frameNumbers
+
+    def release(self):
+        """Drops the cached values, they will be decoded again if needed."""
+        self._values = None
+
+
+class LogicalFile(object):
+    """A logical file of theScan, a ScanV1EFLR. objects is the {set name :
+    table, ...} for this logical file as held in ScanV1EFLR.objects, it is
+    only looked up when first used so a file opened from a sidecar index
+    does not have its EFLRs parsed until then."""
+
+    def __init__(self, theName, theDecoder, theScan):
+        self.name = theName
+        self._scan = theScan
+        self._objects = None
+        self._decoder = theDecoder
+        # {(frame name, channel name) : Channel, ...}
+        self._channels = {}
+
+    @property
+    def objects(self):
+        if self._objects is None:
+            self._objects = self._scan.objects.get(self.name, {})
+        return self._objects
+
+    def frameNames(self):
+        return list(self._decoder.frames.keys())
+
+    def channelNames(self, frameName=None):
+        """The channel names of a frame or, by default, of all frames in frame order."""
+        if frameName is not None:
+            return list(self._decoder.frames[frameName])
+        ret = []
+        for channels in self._decoder.frames.values():
+            ret.extend(c for c in channels if c not in ret)
+        return ret
+
+    def _frameOf(self, channelName):
+        for frameName, channels in self._decoder.frames.items():
+            if channelName in channels:
+                return frameName
+        raise ExceptionLogicalFile('Channel {!r} is not recorded in any frame'.format(channelName))
+
+    def channel(self, channelName, frameName=None):
+        """Returns the Channel. If frameName is None the first frame that
+        records the channel is used."""
+        if frameName is None:
+            frameName = self._frameOf(channelName)
+        key = (frameName, channelName)
+        if key not in self._channels:
+            if channelName not in self._decoder.channels:
+                raise ExceptionLogicalFile('No CHANNEL object {!r}'.format(channelName))
+            self._channels[key] = Channel(self._decoder, self._decoder.channels[channelName], frameName)
+        return self._channels[key]
+
+
+def openLogicalFiles(theF, useSidecar=False):
+    """Indexes a DLIS file and reads its EFLRs, returns a list of LogicalFile.
+    theF is a path or a file opened in binary mode. If useSidecar is True and
+    the file has a valid sidecar index only the FRAME and CHANNEL tables of
+    the sidecar are used and the EFLRs are parsed when objects is first used."""
+    scan = ScanV1EFLR.ScanV1EFLR(theF, useSidecar)
+    return [
+        LogicalFile(name, FrameData.fromScan(scan, name), scan)
+        for name in scan.templates.keys()
+    ]
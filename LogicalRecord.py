@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+# Part of TotalDepth: Petrophysical data processing and presentation
+# Copyright (C) 1999-2012 Paul Ross
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Paul Ross: apaulross@gmail.com
+"""Structural walker for the physical layout of a DLIS file.
+
+Reads the Storage Unit Label and the Visible Record headers then jumps from
+one Logical Record Segment Header (LRSH) to the next using their lengths.
+The result is an index of every Logical Record Segment in the file so scanning
+costs time proportional to the number of records, not the number of bytes.
+
+iterLogicalRecords() does the same walk lazily and yields assembled Logical
+Records one at a time without building an index, so memory use is constant.
+
+See RP66v1 Sect. 2.3:
+
+Visible Record Header:
+Length    UNORM    Length of the Visible Record including this header.
+Format    USHORT   0xFF
+Version   USHORT   0x01
+
+Logical Record Segment Header:
+Length         UNORM     Length of the segment including header and trailer.
+Attributes     USHORT    See LRSH_ATTR_* below.
+Record type    USHORT    EFLR or IFLR type code.
+"""
+
+import collections
+import struct
+
+import Commitar.MmapBuffer as MmapBuffer
+
+
+class ExceptionLogicalRecord(Exception):
+    pass
+
+
+class ExceptionStorageUnitLabel(ExceptionLogicalRecord):
+    """Raised when no Storage Unit Label or Visible Record can be found at the start of the file."""
+    pass
+
+
+class ExceptionVisibleRecord(ExceptionLogicalRecord):
+    """Raised when a Visible Record header is malformed."""
+    pass
+
+
+class ExceptionLRSH(ExceptionLogicalRecord):
+    """Raised when a Logical Record Segment Header is malformed."""
+    pass
+
+
+LEN_SUL = 80
+LEN_VR_HEADER = 4
+LEN_LRSH = 4
+VR_FORMAT = 0xFF
+VR_VERSION = 0x01
+
+# Length UNORM, format USHORT, version USHORT
+STRUCT_VR_HEADER = struct.Struct('>HBB')
+# Length UNORM, attributes USHORT, record type USHORT
+STRUCT_LRSH = struct.Struct('>HBB')
+
+# LRSH attribute bits, most significant first.
+LRSH_ATTR_EFLR = 0x80
+LRSH_ATTR_PREDECESSOR = 0x40
+LRSH_ATTR_SUCCESSOR = 0x20
+LRSH_ATTR_ENCRYPTION = 0x10
+LRSH_ATTR_ENCRYPTION_PACKET = 0x08
+LRSH_ATTR_CHECKSUM = 0x04
+LRSH_ATTR_TRAILING_LENGTH = 0x02
+LRSH_ATTR_PADDING = 0x01
+
+# offset - file position of the LRSH.
+# length - segment length from the LRSH i.e. including header and trailer.
+# attributes - LRSH attribute byte.
+# recordType - EFLR or IFLR type code.
+# isEFLR - True if this segment belongs to an EFLR.
+LRSHIndexEntry = collections.namedtuple('LRSHIndexEntry', 'offset length attributes recordType isEFLR')
+
+# first - index in the LRSHIndex of the first segment of the Logical Record.
+# last - index in the LRSHIndex of the last segment of the Logical Record.
+# recordType - EFLR or IFLR type code.
+# isEFLR - True if this is an EFLR.
+LogicalRecordPosition = collections.namedtuple('LogicalRecordPosition', 'first last recordType isEFLR')
+
+# offset - file position of the LRSH of the first segment.
+# attributes - LRSH attribute byte of the first segment.
+# recordType - EFLR or IFLR type code.
+# isEFLR - True if this is an EFLR.
+# body - the Logical Record body, a view on the buffer for a single segment
+# record, bytes for a multi-segment record.
+LogicalRecordBody = collections.namedtuple('LogicalRecordBody', 'offset attributes recordType isEFLR body')
+
+# Set component descriptor, see RP66v1 Sect. 3.2.2.1
+# Role is in the top three bits: 111 SET, 110 RSET (redundant), 101 RDSET (replacement)
+SET_ROLES = (0xE0, 0xC0, 0xA0)
+SET_ROLE_MASK = 0xE0
+SET_FLAG_TYPE = 0x10
+
+
+class LRSHIndex(object):
+    """Index of every Logical Record Segment in a file.
+    Constructed with a buffer such as MmapBuffer.MmapBuffer that supports len()
+    and slicing, this walks the Visible Records once."""
+
+    def __init__(self, theBuffer, theEntries=None, theStorageUnitLabel=None):
+        """If theEntries is given (for example from a sidecar index) the walk is skipped."""
+        self._buf = theBuffer
+        self.fileSize = len(theBuffer)
+        self.storageUnitLabel = theStorageUnitLabel
+        if theEntries is None:
+            self.entries = []
+            self._walk()
+        else:
+            self.entries = theEntries
+
+    @property
+    def buffer(self):
+        """The buffer this index is over."""
+        return self._buf
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, i):
+        return self.entries[i]
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def _walk(self):
+        pos, sul = _firstVisibleRecord(self._buf)
+        if sul is not None:
+            self.storageUnitLabel = sul
+        self.entries.extend(iterSegments(self._buf, pos))
+
+    def bodyRange(self, entry):
+        """Returns (start, stop) file positions of the segment body, that is
+        excluding the LRSH, any trailer and any padding."""
+        return _bodyRange(self._buf, entry)
+
+    def logicalRecordBody(self, position):
+        """Returns the body of a Logical Record given its LogicalRecordPosition.
+        This is a view on the buffer for a single segment record, the segment
+        bodies are joined into bytes for a multi-segment record."""
+        if position.first == position.last:
+            start, stop = self.bodyRange(self.entries[position.first])
+            return self._buf[start:stop]
+        parts = []
+        for entry in self.entries[position.first:position.last + 1]:
+            start, stop = self.bodyRange(entry)
+            parts.append(self._buf[start:stop])
+        return b''.join(parts)
+
+    def logicalRecords(self):
+        """Assembles segments into Logical Records using the predecessor and
+        successor attributes. Returns a list of LogicalRecordPosition.
+        A trailing Logical Record with a missing final segment is omitted."""
+        ret = []
+        first = None
+        for i, entry in enumerate(self.entries):
+            if first is None or entry.attributes & LRSH_ATTR_PREDECESSOR == 0:
+                first = i
+            if entry.attributes & LRSH_ATTR_SUCCESSOR == 0:
+                head = self.entries[first]
+                ret.append(LogicalRecordPosition(first, i, head.recordType, head.isEFLR))
+                first = None
+        return ret
+
+    def setType(self, position):
+        """Returns the set type of an EFLR as bytes, for example b'CHANNEL', or
+        None if the first segment does not start with a typed set component."""
+        if not position.isEFLR:
+            return None
+        start, stop = self.bodyRange(self.entries[position.first])
+        return bodySetType(self._buf[start:stop])
+
+    def iterRecords(self, thePositions=None):
+        """Yields a LogicalRecordBody for each LogicalRecordPosition in
+        thePositions, by default all of them."""
+        if thePositions is None:
+            thePositions = self.logicalRecords()
+        for position in thePositions:
+            head = self.entries[position.first]
+            yield LogicalRecordBody(
+                head.offset, head.attributes, position.recordType, position.isEFLR, self.logicalRecordBody(position)
+            )
+
+
+def _readAt(theBuffer, offset, n):
+    return theBuffer[offset:offset + n]
+
+
+def _isVisibleRecordHeader(theBuffer, offset):
+    b = _readAt(theBuffer, offset, LEN_VR_HEADER)
+    return len(b) == LEN_VR_HEADER and b[2] == VR_FORMAT and b[3] == VR_VERSION
+
+
+def _firstVisibleRecord(theBuffer):
+    """Returns (offset of the first Visible Record, Storage Unit Label as bytes or None)."""
+    if _isVisibleRecordHeader(theBuffer, LEN_SUL):
+        return LEN_SUL, bytes(_readAt(theBuffer, 0, LEN_SUL))
+    if _isVisibleRecordHeader(theBuffer, 0):
+        return 0, None
+    raise ExceptionStorageUnitLabel('No Visible Record found at offset 0 or {:d}'.format(LEN_SUL))
+
+
+def _bodyRange(theBuffer, entry):
+    start = entry.offset + LEN_LRSH
+    stop = entry.offset + entry.length
+    if entry.attributes & LRSH_ATTR_TRAILING_LENGTH:
+        stop -= 2
+    if entry.attributes & LRSH_ATTR_CHECKSUM:
+        stop -= 2
+    if entry.attributes & LRSH_ATTR_PADDING and stop > start:
+        stop -= theBuffer[stop - 1]
+    if stop < start:
+        raise ExceptionLRSH('Segment at 0x{:x} has negative body length'.format(entry.offset))
+    return start, stop
+
+
+def iterSegments(theBuffer, pos):
+    """Yields a LRSHIndexEntry for every Logical Record Segment in theBuffer
+    walking the Visible Records from pos."""
+    fileSize = len(theBuffer)
+    while pos + LEN_VR_HEADER <= fileSize:
+        vrLen, vrFormat, vrVersion = STRUCT_VR_HEADER.unpack(_readAt(theBuffer, pos, LEN_VR_HEADER))
+        if vrFormat != VR_FORMAT or vrVersion != VR_VERSION:
+            raise ExceptionVisibleRecord(
+                'Bad Visible Record header 0x{:02x} 0x{:02x} at 0x{:x}'.format(vrFormat, vrVersion, pos))
+        vrEnd = pos + vrLen
+        if vrLen < LEN_VR_HEADER or vrEnd > fileSize:
+            raise ExceptionVisibleRecord('Visible Record length {:d} at 0x{:x} is out of range'.format(vrLen, pos))
+        lrs = pos + LEN_VR_HEADER
+        while lrs < vrEnd:
+            lrsLen, attr, typ = STRUCT_LRSH.unpack(_readAt(theBuffer, lrs, LEN_LRSH))
+            if lrsLen < LEN_LRSH or lrs + lrsLen > vrEnd:
+                raise ExceptionLRSH('LRSH length {:d} at 0x{:x} is out of range'.format(lrsLen, lrs))
+            yield LRSHIndexEntry(lrs, lrsLen, attr, typ, attr & LRSH_ATTR_EFLR != 0)
+            lrs += lrsLen
+        pos = vrEnd
+
+
+def bodySetType(theBody):
+    """Returns the set type of an EFLR body as bytes, for example b'CHANNEL',
+    or None if it does not start with a typed set component."""
+    if len(theBody) < 2:
+        return None
+    desc = theBody[0]
+    if desc & SET_ROLE_MASK not in SET_ROLES or desc & SET_FLAG_TYPE == 0:
+        return None
+    l = theBody[1]
+    return bytes(theBody[2:2 + l])
+
+
+def iterLogicalRecords(theF):
+    """Generator of the Logical Records of a DLIS file in file order, each is a
+    LogicalRecordBody. theF is a path, a file opened in binary mode or a buffer
+    such as MmapBuffer.MmapBuffer. Only the segments of the current record are
+    held so memory use does not grow with the file size. A trailing Logical
+    Record with a missing final segment is omitted.
+
+    For example, the set types of all the EFLRs:
+        [bodySetType(r.body) for r in iterLogicalRecords('file.dlis') if r.isEFLR]
+    """
+    if isinstance(theF, str) or hasattr(theF, 'fileno'):
+        theF = MmapBuffer.MmapBuffer(theF)
+    pos, _sul = _firstVisibleRecord(theF)
+    head = None
+    parts = []
+    for entry in iterSegments(theF, pos):
+        if head is None or entry.attributes & LRSH_ATTR_PREDECESSOR == 0:
+            head = entry
+            parts = []
+        start, stop = _bodyRange(theF, entry)
+        parts.append(theF[start:stop])
+        if entry.attributes & LRSH_ATTR_SUCCESSOR == 0:
+            body = parts[0] if len(parts) == 1 else b''.join(parts)
+            yield LogicalRecordBody(head.offset, head.attributes, head.recordType, head.isEFLR, body)
+            head = None
+            parts = []
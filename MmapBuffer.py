@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# Part of TotalDepth: Petrophysical data processing and presentation
+# Copyright (C) 1999-2012 Paul Ross
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Paul Ross: apaulross@gmail.com
+"""Memory mapped, zero-copy access to a DLIS file.
+
+MmapBuffer replaces TotalDepth.util.FileBuffer: indexing returns an integer
+and slicing returns a memoryview on the mapped file so nothing is copied until
+a value is actually decoded. ViewStream wraps such a memoryview with the
+read(n) interface expected by RepCode and AttrComp_V2.
+"""
+
+import io
+import mmap
+
+
+class ExceptionMmapBuffer(Exception):
+    pass
+
+
+class MmapBuffer(object):
+    """Read only memory map of a file. Constructed with a path or a file
+    object opened in binary mode."""
+
+    def __init__(self, theF):
+        if isinstance(theF, str):
+            with open(theF, 'rb') as f:
+                self._mm = self._map(f)
+        else:
+            self._mm = self._map(theF)
+        self._view = memoryview(self._mm)
+
+    @staticmethod
+    def _map(theF):
+        try:
+            return mmap.mmap(theF.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError) as err:
+            # ValueError is raised for an empty file
+            raise ExceptionMmapBuffer('Can not map file: {:s}'.format(str(err)))
+
+    def __len__(self):
+        return len(self._view)
+
+    def __getitem__(self, k):
+        """An integer for an index, a memoryview for a slice."""
+        return self._view[k]
+
+    def view(self, start, stop):
+        """Returns a memoryview of bytes [start, stop)."""
+        return self._view[start:stop]
+
+    def close(self):
+        """Releases the map, any memoryview obtained from this must have been released."""
+        self._view.release()
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+
+class ViewStream(object):
+    """A read only file-like object over a bytes-like object. read(n) returns
+    memoryview slices of the underlying buffer rather than copies."""
+
+    def __init__(self, theBuffer, thePos=0):
+        self._view = memoryview(theBuffer)
+        self._pos = thePos
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            stop = len(self._view)
+        else:
+            stop = min(self._pos + n, len(self._view))
+        r = self._view[self._pos:stop]
+        self._pos = stop
+        return r
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(0, offset)
+        return self._pos
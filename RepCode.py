@@ -27,11 +27,20 @@ Created on Aug 3, 2011
 """
 
 # import logging
+import array
 import collections
 import struct
 import string
+import sys
 import time
 import datetime
+import math
+import re
+
+import Commitar.Trace as Trace
+
+_TP_IDENT = Trace.point('RepCode.IDENT', Trace.TRACE)
+_TP_ASCII = Trace.point('RepCode.ASCII', Trace.TRACE)
 
 
 class ExceptionRepCode(Exception):
@@ -82,6 +91,11 @@ class ExceptionRepCodeBINARY(ExceptionRepCode):
     pass
 
 
+class ExceptionRepCodeFloatRange(ExceptionRepCode):
+    """Raised when a float can not be represented in FSHORT, ISINGL or VSINGL."""
+    pass
+
+
 #######################################################
 # Section: Struct for unpacking byte() arrays to words.
 # Note: For floats these pull out signed integer words.
@@ -157,14 +171,14 @@ assert (len(STRUCT_RC_INT_4.unpack(b' ' * STRUCT_RC_INT_4.size)) == 1)
 # Section: Fixed length representation codes.
 # ============================================
 # 1    FSHORT    Low precision floating point    NUMBER    S    2
-STRUCT_RC_FSHORT = STRUCT_RC_INT_2  # Needs further interpretation
+STRUCT_RC_FSHORT = STRUCT_RC_UINT_2  # Raw bits, see fshortToFloat()
 # 2    FSINGL    IEEE single precision floating point    NUMBER    S    4
 STRUCT_RC_FSINGL = struct.Struct('>f')
 
 # 5    ISINGL    IBM single precision floating point    NUMBER    S    4
-STRUCT_RC_ISINGL = STRUCT_RC_INT_4  # Needs further interpretation
+STRUCT_RC_ISINGL = STRUCT_RC_UINT_4  # Raw bits, see isinglToFloat()
 # 6    VSINGL    VAX single precision floating point    NUMBER    S    4
-STRUCT_RC_VSINGL = STRUCT_RC_INT_4  # Needs further interpretation
+STRUCT_RC_VSINGL = STRUCT_RC_UINT_4  # Raw bits, see vsinglToFloat()
 # 7    FDOUBL    IEEE double precision floating point    NUMBER    S    8
 STRUCT_RC_FDOUBL = struct.Struct('>d')
 
@@ -244,15 +258,119 @@ def _writeStruct(theVal, theStream, theStruct):
 # Section: Specific Read/Write methods.
 # ======================================
 
+# Conversion of the non-IEEE floating point formats to and from their raw bits.
+# See RP66v1 Appendix B.
+
+def fshortToFloat(v):
+    """Converts the 16 raw bits of an FSHORT to a float.
+    Bits are a 12 bit two's complement fraction (sign and 11 bits) then a 4 bit
+    unsigned exponent, value = fraction * 2**exponent."""
+    frac = v >> 4
+    if frac & 0x800:
+        frac -= 0x1000
+    return math.ldexp(frac, (v & 0xF) - 11)
+
+
+def floatToFSHORT(f):
+    """Converts a float to the 16 raw bits of an FSHORT, the fraction is
+    rounded. May raise ExceptionRepCodeFloatRange."""
+    if not math.isfinite(f):
+        raise ExceptionRepCodeFloatRange('Value {!r} out of range for FSHORT'.format(f))
+    if f == 0.0:
+        return 0
+    _m, x = math.frexp(f)
+    # Smallest exponent that gives a fraction in [-1, 1)
+    e = max(0, x)
+    frac = int(round(math.ldexp(f, 11 - e)))
+    if frac == 0x800:
+        frac >>= 1
+        e += 1
+    elif e > 0 and int(round(math.ldexp(f, 12 - e))) == -0x800:
+        # -2**n is a fraction of -1 at the exponent below, -32768.0 needs it
+        frac = -0x800
+        e -= 1
+    if e > 15 or frac < -0x800:
+        raise ExceptionRepCodeFloatRange('Value {!r} out of range for FSHORT'.format(f))
+    return ((frac & 0xFFF) << 4) | e
+
+
+def isinglToFloat(v):
+    """Converts the 32 raw bits of an IBM single precision float (ISINGL) to a
+    float. Bits are sign, 7 bit base 16 exponent excess 64 and a 24 bit
+    fraction, value = 0.fraction * 16**(exponent - 64)."""
+    r = math.ldexp(v & 0xFFFFFF, 4 * (((v >> 24) & 0x7F) - 64) - 24)
+    return -r if v & 0x80000000 else r
+
+
+def floatToISINGL(f):
+    """Converts a float to the 32 raw bits of an ISINGL, the fraction is
+    rounded. May raise ExceptionRepCodeFloatRange."""
+    if not math.isfinite(f):
+        raise ExceptionRepCodeFloatRange('Value {!r} out of range for ISINGL'.format(f))
+    if f == 0.0:
+        return 0
+    sign = 0x80000000 if f < 0 else 0
+    m, x = math.frexp(abs(f))
+    # abs(f) = fraction * 16**e with fraction in [1/16, 1)
+    e = -(-x // 4)
+    frac = int(round(math.ldexp(m, 24 + x - 4 * e)))
+    if frac == 0x1000000:
+        frac >>= 4
+        e += 1
+    if e + 64 > 0x7F:
+        raise ExceptionRepCodeFloatRange('Value {!r} out of range for ISINGL'.format(f))
+    if e + 64 < 0:
+        return sign
+    return sign | ((e + 64) << 24) | frac
+
+
+def _vaxWordSwap(v):
+    """VAX floats are stored as two little endian 16 bit words, this swaps
+    the bytes of each word of the big endian 32 bit value v."""
+    return ((v & 0x00FF00FF) << 8) | ((v >> 8) & 0x00FF00FF)
+
+
+def vsinglToFloat(v):
+    """Converts the 32 raw bits, read big endian, of a VAX F float (VSINGL) to
+    a float. After the word swap the bits are sign, 8 bit exponent excess 128
+    and a 23 bit fraction with a hidden bit, value = 0.1fraction * 2**(exponent - 128).
+    A zero exponent is 0.0 or, with the sign set, a reserved operand returned as NaN."""
+    v = _vaxWordSwap(v)
+    e = (v >> 23) & 0xFF
+    if e == 0:
+        return float('nan') if v & 0x80000000 else 0.0
+    r = math.ldexp((v & 0x7FFFFF) | 0x800000, e - 128 - 24)
+    return -r if v & 0x80000000 else r
+
+
+def floatToVSINGL(f):
+    """Converts a float to the 32 raw bits, to be written big endian, of a
+    VSINGL, the fraction is rounded. May raise ExceptionRepCodeFloatRange."""
+    if not math.isfinite(f):
+        raise ExceptionRepCodeFloatRange('Value {!r} out of range for VSINGL'.format(f))
+    if f == 0.0:
+        return 0
+    sign = 0x80000000 if f < 0 else 0
+    m, x = math.frexp(abs(f))
+    e = x + 128
+    frac = int(round(math.ldexp(m, 24)))
+    if frac == 0x1000000:
+        frac >>= 1
+        e += 1
+    if e > 0xFF:
+        raise ExceptionRepCodeFloatRange('Value {!r} out of range for VSINGL'.format(f))
+    if e < 1:
+        return 0
+    return _vaxWordSwap(sign | (e << 23) | (frac & 0x7FFFFF))
+
+
 # 1    FSHORT    Low precision floating point    NUMBER    S    2
 def readFSHORT(theS):
-    b = _readStruct(theS, STRUCT_RC_FSHORT)
-    # TODO: munge the bytes
+    return fshortToFloat(_readStruct(theS, STRUCT_RC_FSHORT)[0])
 
 
 def writeFSHORT(theV, theS):
-    # TODO: munge the bytes
-    return _writeStruct(theV, theS, STRUCT_RC_FSHORT)
+    return _writeStruct(floatToFSHORT(theV), theS, STRUCT_RC_FSHORT)
 
 
 # 2    FSINGL    IEEE single precision floating point    NUMBER    S    4
@@ -266,24 +384,20 @@ def writeFSINGL(theV, theS):
 
 # 5    ISINGL    IBM single precision floating point    NUMBER    S    4
 def readISINGL(theS):
-    b = _readStruct(theS, STRUCT_RC_ISINGL)
-    # TODO: munge the bytes
+    return isinglToFloat(_readStruct(theS, STRUCT_RC_ISINGL)[0])
 
 
 def writeISINGL(theV, theS):
-    # TODO: munge the bytes
-    return _writeStruct(theV, theS, STRUCT_RC_ISINGL)
+    return _writeStruct(floatToISINGL(theV), theS, STRUCT_RC_ISINGL)
 
 
 # 6    VSINGL    VAX single precision floating point    NUMBER    S    4
 def readVSINGL(theS):
-    b = _readStruct(theS, STRUCT_RC_VSINGL)
-    # TODO: munge the bytes
+    return vsinglToFloat(_readStruct(theS, STRUCT_RC_VSINGL)[0])
 
 
 def writeVSINGL(theV, theS):
-    # TODO: munge the bytes
-    return _writeStruct(theV, theS, STRUCT_RC_VSINGL)
+    return _writeStruct(floatToVSINGL(theV), theS, STRUCT_RC_VSINGL)
 
 
 # 7    FDOUBL    IEEE double precision floating point    NUMBER    S    8
@@ -508,6 +622,15 @@ def lenFixedCode(c):
     raise ExceptionRepCodeFixedLength('lenFixedCode(): code {:d} is variable length'.format(c))
 
 
+def lenFixedCodeOrNone(c):
+    """As lenFixedCode() but returns None for a variable length rep code."""
+    _checkRepCodeInRange(c)
+    l = RC_TABLE[c].Size
+    if isinstance(l, int) and l > 0:
+        return l
+    return None
+
+
 def lenFixedName(name):
     return lenFixedCode(nameToCode(name))
 
@@ -526,22 +649,24 @@ def lenFixedName(name):
 # 27    UNITS    Units expression    UNIT    S    V
 # 40    BINARY   Binary    BINARY    S    V
 
+# The length of a UVARI indexed by its first byte, the top two bits give 1, 2 or 4.
+UVARI_LENGTH = bytes(1 if b < 0x80 else (2 if b < 0xC0 else 4) for b in range(256))
+# The mask to apply to the big-endian integer of a UVARI, indexed by its length.
+UVARI_MASK = (None, 0x7F, 0x7FFF, None, 0x3FFFFFFF)
+
+
 def readUVARI(theS):
     """Reads a UVARI from theS which must have read(n) implemented that returns bytes."""
-    b = theS.read(1)[0]
-    bn = "{0:08b}".format(b)
-    #print("readUVARI: {0:08b}".format(b))
-    if bn[0] == "1":
-        if bn[1] == "1":
-            b &= 0x3F
-            for i in range(3):
-                b <<= 8
-                b |= theS.read(1)[0]
-        else:
-            b &= 0x7F
-            b <<= 8
-            b |= theS.read(1)[0]
-    return b
+    b = theS.read(1)
+    if len(b) != 1:
+        raise ExceptionRepCodeEndOfStream('EOF: Got 0 bytes but expected 1 bytes.')
+    l = UVARI_LENGTH[b[0]]
+    if l == 1:
+        return b[0]
+    r = theS.read(l - 1)
+    if len(r) != l - 1:
+        raise ExceptionRepCodeEndOfStream('EOF: Got {:d} bytes but expected {:d} bytes.'.format(len(r) + 1, l))
+    return int.from_bytes(b + r, 'big') & UVARI_MASK[l]
 
 
 def writeUVARI(v, theS):
@@ -599,9 +724,79 @@ def lenORIGIN(v):
     return lenUVARI(v)
 
 
-class PascalLikeBase(object):
+def _slotNames(theClass):
+    """Returns the names of all the __slots__ of theClass and its bases."""
+    ret = []
+    for c in theClass.__mro__:
+        ret.extend(n for n in c.__dict__.get('__slots__', ()) if n not in ret)
+    return ret
+
+
+# Character validation policy of IDENT, ASCII and UNITS values, see setValidation().
+# Values are checked when constructed.
+VALIDATE_STRICT = 'strict'
+# Values are checked when their payload is first used or when validate() is called.
+VALIDATE_DEFERRED = 'deferred'
+# Values are only checked if validate() is called.
+VALIDATE_OFF = 'off'
+VALIDATE_POLICIES = (VALIDATE_STRICT, VALIDATE_DEFERRED, VALIDATE_OFF)
+_validation = VALIDATE_STRICT
+
+
+def setValidation(thePolicy):
+    """Sets the character validation policy, one of VALIDATE_POLICIES. This
+    affects values constructed afterwards."""
+    global _validation
+    if thePolicy not in VALIDATE_POLICIES:
+        raise ExceptionRepCode('Unknown validation policy {!r}, must be one of {!r}'.format(thePolicy, VALIDATE_POLICIES))
+    _validation = thePolicy
+
+
+def getValidation():
+    return _validation
+
+
+class ValueBase(object):
+    """Base of the string and compound rep code values. These have __slots__
+    rather than a __dict__ as a file may have hundreds of thousands of them.
+    Values are treated as immutable once constructed so they can be hashed, the
+    hash is cached in _hash. That is not pickled since str and bytes hashes
+    differ between processes."""
+    __slots__ = ('_hash',)
+
+    def _key(self):
+        """The tuple that equality and the hash are based on."""
+        raise NotImplementedError('ValueBase._key(): not implemented.')
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, ValueBase):
+            return NotImplemented
+        return self.CODE == other.CODE and self._key() == other._key()
+
+    def __hash__(self):
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = hash((self.CODE, self._key()))
+            return self._hash
+
+    def __getstate__(self):
+        return {n: getattr(self, n) for n in _slotNames(type(self)) if n != '_hash' and hasattr(self, n)}
+
+    def __setstate__(self, theState):
+        for k, v in theState.items():
+            object.__setattr__(self, k, v)
+
+
+class PascalLikeBase(ValueBase):
     """Represents a variable length rep code that has a length and a payload
-    with an optional padding number."""
+    with an optional padding number. Two values are equal if their significant
+    payloads are equal, whatever the rep code.
+    The characters are validated according to the policy set by
+    setValidation(), _valid is True once that is done."""
+    __slots__ = ('_len', '_payload', '_pad', '_valid')
 
     #    CODE = 0
     def __init__(self, theLen, theBytes, thePad=0):
@@ -610,7 +805,17 @@ class PascalLikeBase(object):
         self._payload = theBytes
         # Number of bits of padding
         self._pad = thePad
+        if _validation == VALIDATE_STRICT:
+            self._checkValidChars()
+            self._valid = True
+        else:
+            self._valid = _validation == VALIDATE_OFF
+
+    def validate(self):
+        """Checks the characters whatever the validation policy, this may
+        raise. Can be used for a separate validation pass."""
         self._checkValidChars()
+        self._valid = True
 
     def __str__(self):
         return str(self.sigPayload)
@@ -635,6 +840,8 @@ class PascalLikeBase(object):
 
     @property
     def payload(self):
+        if not self._valid:
+            self.validate()
         if self._len > len(self._payload):
             return self._payload + self._nullValue() * (self._len - len(self._payload))
         return self._payload
@@ -643,6 +850,8 @@ class PascalLikeBase(object):
     def sigPayload(self):
         """Returns the significant bytes i.e. those preceding \x00."""
         #        print('TRACE: sigPayload():', self._payload, type(self._payload), 'done')
+        if not self._valid:
+            self.validate()
         f = self._payload.find(self._nullValue())
         if f != -1:
             return self._payload[:f]
@@ -651,8 +860,19 @@ class PascalLikeBase(object):
     def __eq__(self, other):
         #        print('TRACE: PascalLikeBase.__eq__():', self, other)
         #        print('TRACE: PascalLikeBase.__eq__():', self.sigPayload, other.sigPayload)
+        if self is other:
+            return True
+        if not isinstance(other, PascalLikeBase):
+            return NotImplemented
         return self.sigPayload == other.sigPayload
 
+    def __hash__(self):
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = hash(self.sigPayload)
+            return self._hash
+
     def __len__(self):
         raise NotImplementedError('PascalLikeBase.__len__(): not implemented.')
 
@@ -669,20 +889,31 @@ class IDENTBase(PascalLikeBase):
     characters and the corresponding characters match.
     If a null character (0) is present, then only those characters that precede
     the first null are considered to be part of the actual string value."""
+    __slots__ = ()
     CODE = 19
+    # The characters accepted, this is wider than the standard and includes
+    # space and the lower-case alphabet.
+    IDENT_BYTES = bytes(range(32, 127))
+    # Matches any other character, a single regex search is the fastest check
+    # of the short strings that IDENTs are.
+    IDENT_INVALID = re.compile(b'[^\\x20-\\x7e]')
 
     def _checkValidChars(self):
-        print(self.payload)
-        for i, b in enumerate(self._payload):
-            #            o = ord(c)
-
-            if b == 0:
-                break
-            if b < 32 \
-                    or b > 126:
-                #break
-                #                logging.warning('Illegal character ord: {:d} in position {:d}'.format(b, i))
-                raise ExceptionRepCodeIDENT('Illegal character ord: {:d} in position {:d}'.format(b, i))
+        if _TP_IDENT.on:
+            _TP_IDENT.emit('{!r}', self._payload)
+        payload = self._payload
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        if self.IDENT_INVALID.search(payload) is None:
+            return
+        # Invalid characters or a null, only those before the null count
+        sig = bytes(payload).split(b'\x00', 1)[0]
+        if sig.translate(None, self.IDENT_BYTES):
+            # Only look for the position once we know there is an error
+            for i, b in enumerate(sig):
+                if b < 32 \
+                        or b > 126:
+                    raise ExceptionRepCodeIDENT('Illegal character ord: {:d} in position {:d}'.format(b, i))
 
     def write(self, theS):
         # Single byte for length
@@ -694,14 +925,19 @@ class IDENTBase(PascalLikeBase):
 
 
 class IDENTString(IDENTBase):
+    __slots__ = ()
+
     def __init__(self, theStr):
         super().__init__(len(theStr), theStr)
 
 
 class IDENTStream(IDENTBase):
+    __slots__ = ()
+
     def __init__(self, theStream):
         l = theStream.read(1)[0]
-        b = theStream.read(l)
+        # The stream may hand back a memoryview, the payload must own its bytes
+        b = bytes(theStream.read(l))
         super().__init__(l, b)
 
 
@@ -720,19 +956,29 @@ class ASCIIBase(PascalLikeBase):
     as a UVARI. If a null character (0) is present, then only those characters
     that precede the first null are considered to be part of the actual string
     value."""
+    __slots__ = ()
     ASCII_CHARS = set(string.ascii_letters + string.digits + string.punctuation + string.whitespace)
+    # Accented characters that occur in Portuguese files, bytes are read as ISO 8859-1.
+    ACCENTED_CHARS = set("ãâÃÂõôÕÔáéíóúÁÉÍÓÚ")
+    # bytes.translate() deletion table of the valid bytes.
+    ASCII_BYTES = ''.join(sorted(ASCII_CHARS | ACCENTED_CHARS)).encode('latin-1')
+    # Matches the first invalid character of a str payload.
+    ASCII_INVALID = re.compile('[^' + re.escape(''.join(sorted(ASCII_CHARS | ACCENTED_CHARS))) + ']')
     CODE = 19
 
 
     def _checkValidChars(self):
-        print(self._payload)
-        for i, c in enumerate(self._payload):
-            if isinstance(c, int):
-                c = chr(c)
-            if c not in self.ASCII_CHARS:
-                #print(c, type(c))
-                if c not in ["ã","â","Ã","Â","õ","ô","Õ","Ô","á","é","í","ó","ú","Á","É","Í","Ó","Ú"]:
-                    raise ExceptionRepCodeASCII('Illegal character ord: {:c} in position {:d}'.format(c, i))
+        if _TP_ASCII.on:
+            _TP_ASCII.emit('{!r}', self._payload)
+        payload = self._payload
+        if isinstance(payload, str):
+            m = self.ASCII_INVALID.search(payload)
+            if m is not None:
+                raise ExceptionRepCodeASCII('Illegal character {!r} in position {:d}'.format(m.group(), m.start()))
+        elif bytes(payload).translate(None, self.ASCII_BYTES):
+            for i, b in enumerate(payload):
+                if b not in self.ASCII_BYTES:
+                    raise ExceptionRepCodeASCII('Illegal character {!r} in position {:d}'.format(chr(b), i))
 
     def write(self, theS):
         # Single byte for length
@@ -744,14 +990,18 @@ class ASCIIBase(PascalLikeBase):
 
 
 class ASCIIString(ASCIIBase):
+    __slots__ = ()
+
     def __init__(self, theStr):
         super().__init__(len(theStr), theStr)
 
 
 class ASCIIStream(ASCIIBase):
+    __slots__ = ()
+
     def __init__(self, theStream):
         l = readUVARI(theStream)
-        b = theStream.read(l)
+        b = bytes(theStream.read(l))
         #print('ASCIIStream.__init__():', 'b:', b, 'b.decode():', b.decode())
         super().__init__(l, b)
 
@@ -765,12 +1015,14 @@ def writeASCII(v, theS):
 
 
 class UNITSString(ASCIIString):
+    __slots__ = ()
     CODE = 27
     """Identical to ASCII."""
     pass
 
 
 class UNITSStream(ASCIIStream):
+    __slots__ = ()
     CODE = 27
     """Identical to ASCII."""
     pass
@@ -798,6 +1050,7 @@ bits in the bit string is:
 #bits = 8 * (N - 1) - P, when N > 1.
 
 Since P < 8, a bit string is written in the minimum number of bytes."""
+    __slots__ = ()
     CODE = 40
 
     # TODO: implement write()
@@ -818,19 +1071,23 @@ Since P < 8, a bit string is written in the minimum number of bytes."""
 
 
 class BINARYString(BINARYBase):
+    __slots__ = ()
+
     def __init__(self, theStr):
         """Constructor from a bytes, it is assumed that this is already padded."""
         super().__init__(len(theStr), theStr)
 
 
 class BINARYStream(BINARYBase):
+    __slots__ = ()
+
     def __init__(self, theStream):
         """Constructor from a stream."""
         l = readUVARI(theStream)
-        p = theStream.read(1)
+        p = theStream.read(1)[0]
         if p >= 8:
             raise ExceptionRepCodeBINARY('BINARY padding {:d} >= 8'.format(p))
-        b = theStream.read(l)
+        b = bytes(theStream.read(l))
         super().__init__(l, b, p)
 
 
@@ -853,7 +1110,10 @@ def writeBINARY(v, theS):
 #########################################
 # Section: Compound Representation Codes.
 #########################################
-class CompoundBase(object):
+class CompoundBase(ValueBase):
+    """Compound values are equal if they have the same rep code and the same
+    fields, see _key()."""
+    __slots__ = ()
 
     def write(self, theStream):
         """Writes the object to the stream."""
@@ -871,11 +1131,7 @@ class ATTREFBase(CompoundBase):
     be present."""
     CODE = 25
     NAME = 'ATTREF'
-    type = None
-    origin = None
-    copy = None
-    identifier = None
-    label = None
+    __slots__ = ('type', 'origin', 'copy', 'identifier', 'label')
 
     def write(self, theStream):
         writeIDENT(self.type, theStream)
@@ -891,11 +1147,16 @@ class ATTREFBase(CompoundBase):
         self.identifier = IDENTStream(theStream)
         self.label = IDENTStream(theStream)
 
+    def _key(self):
+        return self.type, self.origin, self.copy, self.identifier, self.label
+
     def __len__(self):
-        return len(self.type) + len(self.origin) + lenUVARI(self.copy) + len(self.identifier) + len(self.label)
+        return len(self.type) + lenORIGIN(self.origin) + lenUVARI(self.copy) + len(self.identifier) + len(self.label)
 
 
 class ATTREFInternal(ATTREFBase):
+    __slots__ = ()
+
     def __init__(self, theType, theOrigin, theCopy, theId, theLabel):
         """Constructor from internal data."""
         super().__init__()
@@ -907,6 +1168,8 @@ class ATTREFInternal(ATTREFBase):
 
 
 class ATTREFStream(ATTREFBase):
+    __slots__ = ()
+
     def __init__(self, theStream):
         """Constructor from a stream."""
         self.read(theStream)
@@ -926,10 +1189,9 @@ class FSING1Base(CompoundBase):
     is delegated to the producer."""
     CODE = 3
     NAME = 'FSING1'
-    # FSINGL, Nominal value V of interval [V - B, V + B].
-    value = None
-    # FSINGL, Interval bound, B (>= 0).
-    bound = None
+    # value - FSINGL, Nominal value V of interval [V - B, V + B].
+    # bound - FSINGL, Interval bound, B (>= 0).
+    __slots__ = ('value', 'bound')
     STRUCT_RC_FSINGL1 = struct.Struct('>ff')
 
     def write(self, theStream):
@@ -939,14 +1201,16 @@ class FSING1Base(CompoundBase):
     def read(self, theStream):
         self.value, self.bound = self.STRUCT_RC_FSINGL1.unpack(theStream.read(self.STRUCT_RC_FSINGL1.size))
 
-    def __eq__(self, other):
-        return self.value == other.value and self.bound == other.bound
+    def _key(self):
+        return self.value, self.bound
 
     def __len__(self):
         return self.STRUCT_RC_FSINGL1.size
 
 
 class FSING1Internal(FSING1Base):
+    __slots__ = ()
+
     def __init__(self, theValue, theBound):
         """Constructor from internal data."""
         super().__init__()
@@ -955,6 +1219,8 @@ class FSING1Internal(FSING1Base):
 
 
 class FSING1Stream(FSING1Base):
+    __slots__ = ()
+
     def __init__(self, theStream):
         """Constructor from a stream."""
         self.read(theStream)
@@ -974,12 +1240,10 @@ class FSING2Base(CompoundBase):
     is delegated to the producer."""
     CODE = 4
     NAME = 'FSING2'
-    # FSINGL, Nominal value V of interval [V - A, V + B].
-    value = None
-    # FSINGL, Interval lower bound, A (>= 0)).
-    lower = None
-    # FSINGL, Interval upper bound, B (>= 0).
-    upper = None
+    # value - FSINGL, Nominal value V of interval [V - A, V + B].
+    # lower - FSINGL, Interval lower bound, A (>= 0)).
+    # upper - FSINGL, Interval upper bound, B (>= 0).
+    __slots__ = ('value', 'lower', 'upper')
     STRUCT_RC_FSINGL2 = struct.Struct('>fff')
 
     def write(self, theStream):
@@ -988,16 +1252,16 @@ class FSING2Base(CompoundBase):
     def read(self, theStream):
         self.value, self.lower, self.upper = self.STRUCT_RC_FSINGL2.unpack(theStream.read(self.STRUCT_RC_FSINGL2.size))
 
-    def __eq__(self, other):
-        return self.value == other.value \
-               and self.lower == other.lower \
-               and self.upper == other.upper
+    def _key(self):
+        return self.value, self.lower, self.upper
 
     def __len__(self):
         return self.STRUCT_RC_FSINGL2.size
 
 
 class FSING2Internal(FSING2Base):
+    __slots__ = ()
+
     def __init__(self, theValue, theLower, theUpper):
         """Constructor from internal data."""
         super().__init__()
@@ -1007,6 +1271,8 @@ class FSING2Internal(FSING2Base):
 
 
 class FSING2Stream(FSING2Base):
+    __slots__ = ()
+
     def __init__(self, theStream):
         """Constructor from a stream."""
         self.read(theStream)
@@ -1026,10 +1292,9 @@ class FDOUB1Base(CompoundBase):
     is delegated to the producer."""
     CODE = 8
     NAME = 'FDOUB1'
-    # FDOUBL, Nominal value V of interval [V - B, V + B].
-    value = None
-    # FDOUBL, Interval bound, B (>= 0).
-    bound = None
+    # value - FDOUBL, Nominal value V of interval [V - B, V + B].
+    # bound - FDOUBL, Interval bound, B (>= 0).
+    __slots__ = ('value', 'bound')
     STRUCT_RC_FDOUBL1 = struct.Struct('>dd')
 
     def write(self, theStream):
@@ -1038,14 +1303,16 @@ class FDOUB1Base(CompoundBase):
     def read(self, theStream):
         self.value, self.bound = self.STRUCT_RC_FDOUBL1.unpack(theStream.read(self.STRUCT_RC_FDOUBL1.size))
 
-    def __eq__(self, other):
-        return self.value == other.value and self.bound == other.bound
+    def _key(self):
+        return self.value, self.bound
 
     def __len__(self):
         return self.STRUCT_RC_FDOUBL1.size
 
 
 class FDOUB1Internal(FDOUB1Base):
+    __slots__ = ()
+
     def __init__(self, theValue, theBound):
         """Constructor from internal data."""
         super().__init__()
@@ -1054,6 +1321,8 @@ class FDOUB1Internal(FDOUB1Base):
 
 
 class FDOUB1Stream(FDOUB1Base):
+    __slots__ = ()
+
     def __init__(self, theStream):
         """Constructor from a stream."""
         self.read(theStream)
@@ -1073,12 +1342,10 @@ class FDOUB2Base(CompoundBase):
     is delegated to the producer."""
     CODE = 9
     NAME = 'FDOUB2'
-    # FDOUBL, Nominal value V of interval [V - A, V + B].
-    value = None
-    # FDOUBL, Interval lower bound, A (>= 0)).
-    lower = None
-    # FDOUBL, Interval upper bound, B (>= 0).
-    upper = None
+    # value - FDOUBL, Nominal value V of interval [V - A, V + B].
+    # lower - FDOUBL, Interval lower bound, A (>= 0)).
+    # upper - FDOUBL, Interval upper bound, B (>= 0).
+    __slots__ = ('value', 'lower', 'upper')
     STRUCT_RC_FDOUBL2 = struct.Struct('>ddd')
 
     def write(self, theStream):
@@ -1087,16 +1354,16 @@ class FDOUB2Base(CompoundBase):
     def read(self, theStream):
         self.value, self.lower, self.upper = self.STRUCT_RC_FDOUBL2.unpack(theStream.read(self.STRUCT_RC_FDOUBL2.size))
 
-    def __eq__(self, other):
-        return self.value == other.value \
-               and self.lower == other.lower \
-               and self.upper == other.upper
+    def _key(self):
+        return self.value, self.lower, self.upper
 
     def __len__(self):
         return self.STRUCT_RC_FDOUBL2.size
 
 
 class FDOUB2Internal(FDOUB2Base):
+    __slots__ = ()
+
     def __init__(self, theValue, theLower, theUpper):
         """Constructor from internal data."""
         super().__init__()
@@ -1106,6 +1373,8 @@ class FDOUB2Internal(FDOUB2Base):
 
 
 class FDOUB2Stream(FDOUB2Base):
+    __slots__ = ()
+
     def __init__(self, theStream):
         """Constructor from a stream."""
         self.read(theStream)
@@ -1125,21 +1394,26 @@ class CSINGLBase(CompoundBase):
     is delegated to the producer."""
     CODE = 10
     NAME = 'CSINGL'
-    # A complex() builtin that has real, imag properties
-    value = None
+    # value - A complex() builtin that has real, imag properties
+    __slots__ = ('value',)
     STRUCT_RC_CSINGL = struct.Struct('>ff')
 
     def write(self, theStream):
         theStream.write(self.STRUCT_RC_CSINGL.pack(self.value.real, self.value.imag))
 
     def read(self, theStream):
-        self.value = complex(self.STRUCT_RC_CSINGL.unpack(theStream.read(self.STRUCT_RC_CSINGL.size)))
+        self.value = complex(*self.STRUCT_RC_CSINGL.unpack(theStream.read(self.STRUCT_RC_CSINGL.size)))
+
+    def _key(self):
+        return self.value,
 
     def __len__(self):
         return self.STRUCT_RC_CSINGL.size
 
 
 class CSINGLInternal(CSINGLBase):
+    __slots__ = ()
+
     def __init__(self, theValue):
         """Constructor from and internal complex() type."""
         super().__init__()
@@ -1147,6 +1421,8 @@ class CSINGLInternal(CSINGLBase):
 
 
 class CSINGLStream(CSINGLBase):
+    __slots__ = ()
+
     def __init__(self, theStream):
         """Constructor from a stream."""
         self.read(theStream)
@@ -1166,21 +1442,26 @@ class CDOUBLBase(CompoundBase):
     is delegated to the producer."""
     CODE = 11
     NAME = 'CDOUBL'
-    # A complex() builtin that has properties: real, imag
-    value = None
+    # value - A complex() builtin that has properties: real, imag
+    __slots__ = ('value',)
     STRUCT_RC_CDOUBL = struct.Struct('>dd')
 
     def write(self, theStream):
         theStream.write(self.STRUCT_RC_CDOUBL.pack(self.value.real, self.value.imag))
 
     def read(self, theStream):
-        self.value = complex(self.STRUCT_RC_CDOUBL.unpack(theStream.read(self.STRUCT_RC_CDOUBL.size)))
+        self.value = complex(*self.STRUCT_RC_CDOUBL.unpack(theStream.read(self.STRUCT_RC_CDOUBL.size)))
+
+    def _key(self):
+        return self.value,
 
     def __len__(self):
         return self.STRUCT_RC_CDOUBL.size
 
 
 class CDOUBLInternal(CDOUBLBase):
+    __slots__ = ()
+
     def __init__(self, theValue):
         """Constructor from and internal complex() type."""
         super().__init__()
@@ -1188,6 +1469,8 @@ class CDOUBLInternal(CDOUBLBase):
 
 
 class CDOUBLStream(CDOUBLBase):
+    __slots__ = ()
+
     def __init__(self, theStream):
         """Constructor from a stream."""
         self.read(theStream)
@@ -1201,7 +1484,7 @@ def writeCDOUBL(v, theS):
     v.write(theS)
 
 
-class DTIMEBase(object):
+class DTIMEBase(ValueBase):
     """Represents date and time.
 Fields are:
 1    year    USHORT    Years since 1900.
@@ -1217,15 +1500,27 @@ Internally this is represented as a struct_time object plus integer milliseconds
 """
     CODE = 21
     NAME = 'DTIME'
-    # A datetime.datetime object
-    _time = None
-    # 0 = local standard time, 1 = local daylight savings time, 2 = Universal Coordinated Time (Greenwich Mean Time).
-    _tzone = None
+    # _time - A datetime.datetime object
+    # _tzone - 0 = local standard time, 1 = local daylight savings time, 2 = Universal Coordinated Time (Greenwich Mean Time).
+    __slots__ = ('_time', '_tzone')
     # B is USHORT, H is UNORM
     STRUCT_RC_DTIME = struct.Struct('>BBBBBBH')
     # RP66 uses an epoch of 1900, sigh.
     YEAR_OFFSET = 1900
 
+    def _key(self):
+        return self._time, self._tzone
+
+    @property
+    def dateTime(self):
+        """The date and time as a datetime.datetime without a time zone."""
+        return self._time
+
+    @property
+    def timeZone(self):
+        """0 = local standard time, 1 = local daylight savings time, 2 = Universal Coordinated Time."""
+        return self._tzone
+
     def __len__(self):
         return self.STRUCT_RC_DTIME.size
 
@@ -1277,8 +1572,16 @@ Internally this is represented as a struct_time object plus integer milliseconds
         secs += self._time.microsecond / 1000000.0
         return secs
 
+    def toString(self):
+        """Returns the date and time as 'dd-mm-YYYY HH:MM:SS' as recorded,
+        without going through mktime(). The time zone is not shown."""
+        t = self._time
+        return '{:02d}-{:02d}-{:04d} {:02d}:{:02d}:{:02d}'.format(t.day, t.month, t.year, t.hour, t.minute, t.second)
+
 
 class DTIMEInternal(DTIMEBase):
+    __slots__ = ()
+
     def __init__(self, theDateTime, theTimeZone=0):
         """Constructor from a datetime.datetime object and an integer representing
         the time zone, 0 = local standard time, 1 = local daylight savings time,
@@ -1290,6 +1593,8 @@ class DTIMEInternal(DTIMEBase):
 
 
 class DTIMEStream(DTIMEBase):
+    __slots__ = ()
+
     def __init__(self, theStream):
         """Constructor from a stream."""
         self.read(theStream)
@@ -1309,9 +1614,7 @@ class OBNAMEBase(CompoundBase):
     origin subfield must be present."""
     CODE = 23
     NAME = 'OBNAME'
-    origin = None
-    copy = None
-    identifier = None
+    __slots__ = ('origin', 'copy', 'identifier')
 
     def write(self, theStream):
         writeORIGIN(self.origin, theStream)
@@ -1324,11 +1627,16 @@ class OBNAMEBase(CompoundBase):
         self.identifier = IDENTStream(theStream)
 
 
+    def _key(self):
+        return self.origin, self.copy, self.identifier
+
     def __len__(self):
         return lenORIGIN(self.origin) + lenUVARI(self.copy) + len(self.identifier)
 
 
 class OBNAMEInternal(OBNAMEBase):
+    __slots__ = ()
+
     def __init__(self, theType, theOrigin, theCopy, theId, theLabel):
         """Constructor from internal data."""
         super().__init__()
@@ -1338,6 +1646,8 @@ class OBNAMEInternal(OBNAMEBase):
 
 
 class OBNAMEStream(OBNAMEBase):
+    __slots__ = ()
+
     def __init__(self, theStream):
         """Constructor from a stream."""
         self.read(theStream)
@@ -1357,10 +1667,7 @@ class OBJREFBase(CompoundBase):
     ORIGIN objects referenced by the origin subfield must be present."""
     CODE = 24
     NAME = 'OBJREF'
-    type = None
-    origin = None
-    copy = None
-    identifier = None
+    __slots__ = ('type', 'origin', 'copy', 'identifier')
 
     def write(self, theStream):
         writeIDENT(self.type, theStream)
@@ -1374,13 +1681,18 @@ class OBJREFBase(CompoundBase):
         self.copy = readUVARI(theStream)
         self.identifier = IDENTStream(theStream)
 
+    def _key(self):
+        return self.type, self.origin, self.copy, self.identifier
+
     def __len__(self):
-        return len(self.type) + len(self.origin) + lenUVARI(self.copy) + len(self.identifier)
+        return len(self.type) + lenORIGIN(self.origin) + lenUVARI(self.copy) + len(self.identifier)
 
 
 
 
 class OBJREFInternal(OBJREFBase):
+    __slots__ = ()
+
     def __init__(self, theType, theOrigin, theCopy, theId, theLabel):
         """Constructor from internal data."""
         super().__init__()
@@ -1391,6 +1703,8 @@ class OBJREFInternal(OBJREFBase):
 
 
 class OBJREFStream(OBJREFBase):
+    __slots__ = ()
+
     def __init__(self, theStream):
         """Constructor from a stream."""
         self.read(theStream)
@@ -1410,15 +1724,17 @@ class RNORMBase(CompoundBase):
     precision numerator and denominator."""
     CODE = 28
     NAME = 'RNORM'
-    # Numerator of ratio.
+    # numerator - Numerator of ratio.
     # SNORM i.e. signed two byte integer
-    numerator = None
-    # Denominator of ratio (> 0).
+    # denominator - Denominator of ratio (> 0).
     # UNORM i.e. unsigned two byte integer
-    denominator = None
+    __slots__ = ('numerator', 'denominator')
 
     # TODO: Refactor this to use struct as above rather than two calls to read/write?
 
+    def _key(self):
+        return self.numerator, self.denominator
+
     def __len__(self):
         return 4
 
@@ -1432,6 +1748,8 @@ class RNORMBase(CompoundBase):
 
 
 class RNORMInternal(RNORMBase):
+    __slots__ = ()
+
     def __init__(self, theNum, theDenom):
         """Constructor from internal data."""
         super().__init__()
@@ -1440,6 +1758,8 @@ class RNORMInternal(RNORMBase):
 
 
 class RNORMStream(RNORMBase):
+    __slots__ = ()
+
     def __init__(self, theStream):
         """Constructor from a stream."""
         self.read(theStream)
@@ -1458,12 +1778,14 @@ class RLONGBase(CompoundBase):
     precision numerator and denominator."""
     CODE = 29
     NAME = 'RLONG'
-    # Numerator of ratio.
+    # numerator - Numerator of ratio.
     # SLONG i.e. signed four byte integer
-    numerator = None
-    # Denominator of ratio (> 0).
+    # denominator - Denominator of ratio (> 0).
     # ULONG i.e. unsigned four byte integer
-    denominator = None
+    __slots__ = ('numerator', 'denominator')
+
+    def _key(self):
+        return self.numerator, self.denominator
 
     def __len__(self):
         return 8
@@ -1478,6 +1800,8 @@ class RLONGBase(CompoundBase):
 
 
 class RLONGInternal(RLONGBase):
+    __slots__ = ()
+
     def __init__(self, theNum, theDenom):
         """Constructor from internal data."""
         super().__init__()
@@ -1486,6 +1810,8 @@ class RLONGInternal(RLONGBase):
 
 
 class RLONGStream(RLONGBase):
+    __slots__ = ()
+
     def __init__(self, theStream):
         """Constructor from a stream."""
         self.read(theStream)
@@ -1504,12 +1830,14 @@ class IRNORMBase(CompoundBase):
     precision numerator and denominator, in inverted byte order."""
     CODE = 34
     NAME = 'IRNORM'
-    # Numerator of ratio.
+    # numerator - Numerator of ratio.
     # ISNORM i.e. signed two byte integer in inverted order
-    numerator = None
-    # Denominator of ratio (> 0).
+    # denominator - Denominator of ratio (> 0).
     # IUNORM i.e. unsigned two byte integer in inverted order
-    denominator = None
+    __slots__ = ('numerator', 'denominator')
+
+    def _key(self):
+        return self.numerator, self.denominator
 
     def __len__(self):
         return 4
@@ -1524,6 +1852,8 @@ class IRNORMBase(CompoundBase):
 
 
 class IRNORMInternal(IRNORMBase):
+    __slots__ = ()
+
     def __init__(self, theNum, theDenom):
         """Constructor from internal data."""
         super().__init__()
@@ -1532,6 +1862,8 @@ class IRNORMInternal(IRNORMBase):
 
 
 class IRNORMStream(IRNORMBase):
+    __slots__ = ()
+
     def __init__(self, theStream):
         """Constructor from a stream."""
         self.read(theStream)
@@ -1550,12 +1882,14 @@ class IRLONGBase(CompoundBase):
     precision numerator and denominator, in inverted byte order."""
     CODE = 35
     NAME = 'IRLONG'
-    # Numerator of ratio.
+    # numerator - Numerator of ratio.
     # SLONG i.e. signed four byte integer
-    numerator = None
-    # Denominator of ratio (> 0).
+    # denominator - Denominator of ratio (> 0).
     # ULONG i.e. unsigned four byte integer
-    denominator = None
+    __slots__ = ('numerator', 'denominator')
+
+    def _key(self):
+        return self.numerator, self.denominator
 
     def __len__(self):
         return 8
@@ -1570,6 +1904,8 @@ class IRLONGBase(CompoundBase):
 
 
 class IRLONGInternal(IRLONGBase):
+    __slots__ = ()
+
     def __init__(self, theNum, theDenom):
         """Constructor from internal data."""
         super().__init__()
@@ -1578,6 +1914,8 @@ class IRLONGInternal(IRLONGBase):
 
 
 class IRLONGStream(IRLONGBase):
+    __slots__ = ()
+
     def __init__(self, theStream):
         """Constructor from a stream."""
         self.read(theStream)
@@ -1599,10 +1937,12 @@ class TIDENTBase(CompoundBase):
     when the entity (e.g., object type, attribute, etc.) is defined."""
     CODE = 36
     NAME = 'TIDENT'
-    # ORIGIN i.e. UVARI
-    tag = None
-    # IDENT
-    identifier = None
+    # tag - ORIGIN i.e. UVARI
+    # identifier - IDENT
+    __slots__ = ('tag', 'identifier')
+
+    def _key(self):
+        return self.tag, self.identifier
 
     def __len__(self):
         return lenORIGIN(self.tag) + len(self.identifier)
@@ -1617,6 +1957,8 @@ class TIDENTBase(CompoundBase):
 
 
 class TIDENTInternal(TIDENTBase):
+    __slots__ = ()
+
     def __init__(self, theTag, theIdentifier):
         """Constructor from internal data."""
         super().__init__()
@@ -1625,6 +1967,8 @@ class TIDENTInternal(TIDENTBase):
 
 
 class TIDENTStream(TIDENTBase):
+    __slots__ = ()
+
     def __init__(self, theStream):
         """Constructor from a stream."""
         self.read(theStream)
@@ -1644,10 +1988,12 @@ class TUNORMBase(CompoundBase):
     when the entity is defined."""
     CODE = 37
     NAME = 'TUNORM'
-    # ORIGIN i.e. UVARI
-    tag = None
-    # UNORM
-    value = None
+    # tag - ORIGIN i.e. UVARI
+    # value - UNORM
+    __slots__ = ('tag', 'value')
+
+    def _key(self):
+        return self.tag, self.value
 
     def __len__(self):
         return lenORIGIN(self.tag) + 2
@@ -1662,6 +2008,8 @@ class TUNORMBase(CompoundBase):
 
 
 class TUNORMInternal(TUNORMBase):
+    __slots__ = ()
+
     def __init__(self, theTag, theValue):
         """Constructor from internal data."""
         super().__init__()
@@ -1670,6 +2018,8 @@ class TUNORMInternal(TUNORMBase):
 
 
 class TUNORMStream(TUNORMBase):
+    __slots__ = ()
+
     def __init__(self, theStream):
         """Constructor from a stream."""
         self.read(theStream)
@@ -1689,13 +2039,15 @@ class TASCIIBase(CompoundBase):
     when the entity is defined."""
     CODE = 38
     NAME = 'TASCII'
-    # ORIGIN i.e. UVARI
-    tag = None
-    # ASCII
-    string = None
+    # tag - ORIGIN i.e. UVARI
+    # string - ASCII
+    __slots__ = ('tag', 'string')
+
+    def _key(self):
+        return self.tag, self.string
 
     def __len__(self):
-        return lenORIGIN(self.tag) + len(self.identifier)
+        return lenORIGIN(self.tag) + len(self.string)
 
     def write(self, theStream):
         writeORIGIN(self.tag, theStream)
@@ -1707,14 +2059,18 @@ class TASCIIBase(CompoundBase):
 
 
 class TASCIIInternal(TASCIIBase):
+    __slots__ = ()
+
     def __init__(self, theTag, theValue):
         """Constructor from internal data."""
         super().__init__()
         self.tag = theTag
-        self.value = theValue
+        self.string = theValue
 
 
 class TASCIIStream(TASCIIBase):
+    __slots__ = ()
+
     def __init__(self, theStream):
         """Constructor from a stream."""
         self.read(theStream)
@@ -1734,12 +2090,14 @@ class FRATIOBase(CompoundBase):
     # TODO: Read/write with own struct e.g. '>ff' ???
     CODE = 41
     NAME = 'FRATIO'
-    # Numerator of ratio.
+    # numerator - Numerator of ratio.
     # FSINGL
-    numerator = None
-    # Denominator of ratio (> 0).
+    # denominator - Denominator of ratio (> 0).
     # FSINGL
-    denominator = None
+    __slots__ = ('numerator', 'denominator')
+
+    def _key(self):
+        return self.numerator, self.denominator
 
     def __len__(self):
         return 8
@@ -1754,6 +2112,8 @@ class FRATIOBase(CompoundBase):
 
 
 class FRATIOInternal(FRATIOBase):
+    __slots__ = ()
+
     def __init__(self, theNum, theDenom):
         """Constructor from internal data."""
         super().__init__()
@@ -1762,6 +2122,8 @@ class FRATIOInternal(FRATIOBase):
 
 
 class FRATIOStream(FRATIOBase):
+    __slots__ = ()
+
     def __init__(self, theStream):
         """Constructor from a stream."""
         self.read(theStream)
@@ -1780,19 +2142,21 @@ class DRATIOBase(CompoundBase):
     precision numerator and denominator."""
     CODE = 42
     NAME = 'DRATIO'
-    # Numerator of ratio.
+    # numerator - Numerator of ratio.
     # FDOUBL
-    numerator = None
-    # Denominator of ratio (> 0).
+    # denominator - Denominator of ratio (> 0).
     # FDOUBL
-    denominator = None
+    __slots__ = ('numerator', 'denominator')
+
+    def _key(self):
+        return self.numerator, self.denominator
 
     def __len__(self):
         return 16
 
     def write(self, theStream):
-        writeFDOUBL(self.type, theStream)
-        writeFDOUBL(self.origin, theStream)
+        writeFDOUBL(self.numerator, theStream)
+        writeFDOUBL(self.denominator, theStream)
 
     def read(self, theStream):
         self.numerator = readFDOUBL(theStream)
@@ -1800,6 +2164,8 @@ class DRATIOBase(CompoundBase):
 
 
 class DRATIOInternal(DRATIOBase):
+    __slots__ = ()
+
     def __init__(self, theNum, theDenom):
         """Constructor from internal data."""
         super().__init__()
@@ -1808,6 +2174,8 @@ class DRATIOInternal(DRATIOBase):
 
 
 class DRATIOStream(DRATIOBase):
+    __slots__ = ()
+
     def __init__(self, theStream):
         """Constructor from a stream."""
         self.read(theStream)
@@ -1899,10 +2267,25 @@ def readIndirectRepCode(c, theS):
     _checkRepCodeInRange(c)
     f = RC_INDIRECT_READ[c]
     assert (f is not None)
-    #print(f)
+    if Trace.counting:
+        return _readIndirectRepCodeCounted(c, f, theS)
     return f(theS)
 
 
+def _readIndirectRepCodeCounted(c, f, theS):
+    """readIndirectRepCode() recording the count, bytes and time per rep code."""
+    name = codeToName(c)
+    tell = getattr(theS, 'tell', None)
+    pos = tell() if tell is not None else None
+    t = time.perf_counter()
+    v = f(theS)
+    Trace.addTime('time.RepCode.' + name, time.perf_counter() - t)
+    Trace.count('values.RepCode.' + name)
+    if pos is not None:
+        Trace.count('bytes.RepCode.' + name, tell() - pos)
+    return v
+
+
 def writeIndirectRepCode(c, v, theS):
     """Given an integer code this writes the value, v, to the
     stream if a struct exists for it.
@@ -1912,7 +2295,568 @@ def writeIndirectRepCode(c, v, theS):
     assert (f is not None)
     return f(v, theS)
 
+
+# Simple fixed length rep codes that can be read in bulk into an array.array.
+# {code : struct of a single value, ...}
+RC_BULK_STRUCT = {
+    2: STRUCT_RC_FSINGL,
+    7: STRUCT_RC_FDOUBL,
+    12: STRUCT_RC_SSHORT,
+    13: STRUCT_RC_SNORM,
+    14: STRUCT_RC_SLONG,
+    15: STRUCT_RC_USHORT,
+    16: STRUCT_RC_UNORM,
+    17: STRUCT_RC_ULONG,
+    26: STRUCT_RC_STATUS,
+    30: STRUCT_RC_ISNORM,
+    31: STRUCT_RC_ISLONG,
+    32: STRUCT_RC_IUNORM,
+    33: STRUCT_RC_IULONG,
+    39: STRUCT_RC_LOGICL,
+}
+
+
+def _bulkTypecode(theStruct):
+    """Returns the array typecode with the same size as a single field struct."""
+    t = theStruct.format[-1:]
+    if t in ('i', 'I') and array.array(t).itemsize != 4:
+        t = t.replace('i', 'l').replace('I', 'L')
+    assert (array.array(t).itemsize == theStruct.size)
+    return t
+
+
+# {code : (array typecode, True if the bytes must be swapped), ...}
+RC_BULK_ARRAY = {
+    c: (_bulkTypecode(st), st.format[:1] != ('<' if sys.byteorder == 'little' else '>'))
+    for c, st in RC_BULK_STRUCT.items()
+}
+
+
+def _dtimeFromFields(y, tz_m, d, h, mi, sec, ms):
+    t = datetime.datetime(y + DTIMEBase.YEAR_OFFSET, tz_m & 0xF, d, h, mi, sec, ms * 1000)
+    return DTIMEInternal(t, tz_m >> 4)
+
+
+# Fixed length rep codes whose values are converted from the raw bits of a
+# simple code, the floating point formats that are not IEEE.
+# {code : (code of the raw bits in RC_BULK_ARRAY, function(raw) -> value), ...}
+RC_BULK_CONVERT = {
+    1: (16, fshortToFloat),
+    5: (17, isinglToFloat),
+    6: (17, vsinglToFloat),
+}
+
+# The other fixed length rep codes, the values are made from the fields of
+# a struct without a stream.
+# {code : (struct of a single value, function(*fields) -> value), ...}
+RC_BULK_FIELDS = {
+    3: (FSING1Base.STRUCT_RC_FSINGL1, FSING1Internal),
+    4: (FSING2Base.STRUCT_RC_FSINGL2, FSING2Internal),
+    8: (FDOUB1Base.STRUCT_RC_FDOUBL1, FDOUB1Internal),
+    9: (FDOUB2Base.STRUCT_RC_FDOUBL2, FDOUB2Internal),
+    10: (CSINGLBase.STRUCT_RC_CSINGL, lambda r, i: CSINGLInternal(complex(r, i))),
+    11: (CDOUBLBase.STRUCT_RC_CDOUBL, lambda r, i: CDOUBLInternal(complex(r, i))),
+    21: (DTIMEBase.STRUCT_RC_DTIME, _dtimeFromFields),
+    28: (struct.Struct('>hH'), RNORMInternal),
+    29: (struct.Struct('>iI'), RLONGInternal),
+    34: (struct.Struct('<hH'), IRNORMInternal),
+    35: (struct.Struct('<iI'), IRLONGInternal),
+    41: (struct.Struct('>ff'), FRATIOInternal),
+    42: (struct.Struct('>dd'), DRATIOInternal),
+}
+
+
+def _readBulkBytes(c, n, theS):
+    b = theS.read(n)
+    if len(b) != n:
+        raise ExceptionRepCodeEndOfStream('EOF: Got {:d} bytes but expected {:d} bytes.'.format(len(b), n))
+    if Trace.counting:
+        Trace.count('bytes.RepCode.' + codeToName(c), n)
+    return b
+
+
+def readIndirectRepCodeArray(c, count, theS):
+    """Reads count values of rep code c off the stream. Values of the simple
+    fixed length codes are read with one read and returned as an array.array in
+    native byte order. The other fixed length codes are read with one read and
+    returned as a list, values of FSHORT, ISINGL and VSINGL are converted
+    from an array.array of their raw bits and the compound codes are made from
+    struct fields. Variable length codes are returned as a list read one
+    value at a time.
+    May raise and ExceptionRepCodeCodeNumberOutOfRange if c out of range."""
+    _checkRepCodeInRange(c)
+    if c in RC_BULK_ARRAY:
+        typecode, swap = RC_BULK_ARRAY[c]
+        b = _readBulkBytes(c, count * RC_BULK_STRUCT[c].size, theS)
+        ret = array.array(typecode)
+        ret.frombytes(b)
+        if swap:
+            ret.byteswap()
+        if Trace.counting:
+            Trace.count('values.RepCode.' + codeToName(c), count)
+        return ret
+    if c in RC_BULK_CONVERT:
+        rawCode, convert = RC_BULK_CONVERT[c]
+        typecode, swap = RC_BULK_ARRAY[rawCode]
+        raw = array.array(typecode)
+        raw.frombytes(_readBulkBytes(c, count * RC_BULK_STRUCT[rawCode].size, theS))
+        if swap:
+            raw.byteswap()
+        if Trace.counting:
+            Trace.count('values.RepCode.' + codeToName(c), count)
+        return [convert(v) for v in raw]
+    if c in RC_BULK_FIELDS:
+        st, make = RC_BULK_FIELDS[c]
+        b = _readBulkBytes(c, count * st.size, theS)
+        if Trace.counting:
+            Trace.count('values.RepCode.' + codeToName(c), count)
+        return [make(*fields) for fields in st.iter_unpack(b)]
+    return [readIndirectRepCode(c, theS) for i in range(count)]
+
+
 #######################################
 # End: Dynamic despatch table creation.
 #######################################
 
+##############################################
+# Section: Offset based decoding.
+##############################################
+# The decode* functions are the counterparts of the read* functions that take
+# a buffer (bytes, bytearray or memoryview) and an offset rather than a stream
+# and return (value, new offset). The values are the same as the read*
+# functions give. Rep codes without a decode* function are decoded with their
+# read* function over a _BufferStream.
+
+
+class _BufferStream(object):
+    """Minimal read only stream over a buffer starting at an offset."""
+    __slots__ = ('_buf', '_pos')
+
+    def __init__(self, theBuffer, thePos):
+        self._buf = theBuffer
+        self._pos = thePos
+
+    def read(self, n):
+        b = self._buf[self._pos:self._pos + n]
+        self._pos += len(b)
+        return b
+
+    def tell(self):
+        return self._pos
+
+
+def _endOfBuffer(got, expected):
+    return ExceptionRepCodeEndOfStream('EOF: Got {:d} bytes but expected {:d} bytes.'.format(got, expected))
+
+
+def _decodeStruct(theStruct):
+    """Returns a decode function for a single field struct."""
+    unpack_from = theStruct.unpack_from
+    size = theStruct.size
+
+    def decode(theBuffer, theOffset):
+        try:
+            return unpack_from(theBuffer, theOffset)[0], theOffset + size
+        except struct.error:
+            raise _endOfBuffer(max(0, len(theBuffer) - theOffset), size)
+
+    return decode
+
+
+def decodeUVARI(theBuffer, theOffset):
+    b = theBuffer[theOffset]
+    if b < 0x80:
+        return b, theOffset + 1
+    l = UVARI_LENGTH[b]
+    end = theOffset + l
+    if end > len(theBuffer):
+        raise _endOfBuffer(len(theBuffer) - theOffset, l)
+    return int.from_bytes(theBuffer[theOffset:end], 'big') & UVARI_MASK[l], end
+
+
+def decodeUVARIArray(count, theBuffer, theOffset):
+    """Decodes count UVARI values in one pass, returns (list, new offset)."""
+    ret = []
+    lengths = UVARI_LENGTH
+    masks = UVARI_MASK
+    from_bytes = int.from_bytes
+    end = len(theBuffer)
+    for i in range(count):
+        b = theBuffer[theOffset]
+        if b < 0x80:
+            ret.append(b)
+            theOffset += 1
+        else:
+            l = lengths[b]
+            if theOffset + l > end:
+                raise _endOfBuffer(end - theOffset, l)
+            ret.append(from_bytes(theBuffer[theOffset:theOffset + l], 'big') & masks[l])
+            theOffset += l
+    return ret, theOffset
+
+
+def decodeORIGIN(theBuffer, theOffset):
+    return decodeUVARI(theBuffer, theOffset)
+
+
+def _decodePayload(theBuffer, theOffset, l):
+    """Returns (l bytes at theOffset, new offset)."""
+    b = bytes(theBuffer[theOffset:theOffset + l])
+    if len(b) != l:
+        raise _endOfBuffer(len(b), l)
+    return b, theOffset + l
+
+
+def decodeIDENT(theBuffer, theOffset):
+    b, theOffset = _decodePayload(theBuffer, theOffset + 1, theBuffer[theOffset])
+    return IDENTString(b), theOffset
+
+
+def decodeASCII(theBuffer, theOffset):
+    l, theOffset = decodeUVARI(theBuffer, theOffset)
+    b, theOffset = _decodePayload(theBuffer, theOffset, l)
+    return ASCIIString(b), theOffset
+
+
+def decodeUNITS(theBuffer, theOffset):
+    l, theOffset = decodeUVARI(theBuffer, theOffset)
+    b, theOffset = _decodePayload(theBuffer, theOffset, l)
+    return UNITSString(b), theOffset
+
+
+def decodeDTIME(theBuffer, theOffset):
+    st = DTIMEBase.STRUCT_RC_DTIME
+    try:
+        y, tz_m, d, h, mi, sec, ms = st.unpack_from(theBuffer, theOffset)
+    except struct.error:
+        raise _endOfBuffer(max(0, len(theBuffer) - theOffset), st.size)
+    t = datetime.datetime(y + DTIMEBase.YEAR_OFFSET, tz_m & 0xF, d, h, mi, sec, ms * 1000)
+    return DTIMEInternal(t, tz_m >> 4), theOffset + st.size
+
+
+def decodeOBNAME(theBuffer, theOffset):
+    origin, theOffset = decodeORIGIN(theBuffer, theOffset)
+    copy, theOffset = decodeUVARI(theBuffer, theOffset)
+    ident, theOffset = decodeIDENT(theBuffer, theOffset)
+    return OBNAMEInternal(None, origin, copy, ident, None), theOffset
+
+
+def decodeOBNAMEArray(count, theBuffer, theOffset, theCache=None, theIdentCache=None):
+    """Decodes count OBNAME values, the FRAME CHANNELS attribute for example,
+    in one pass without a function call per field. Returns (list, new offset).
+    theCache and theIdentCache are optional dicts keyed by the raw bytes of an
+    OBNAME and of its identifier that the values are interned in, as
+    InternPool does.
+    The values are made without going through their constructors and, with
+    strict validation, the new identifiers are checked together. New values
+    are only added to the caches once they are checked so an invalid one is
+    never cached."""
+    ret = []
+    lengths = UVARI_LENGTH
+    masks = UVARI_MASK
+    from_bytes = int.from_bytes
+    new = object.__new__
+    end = len(theBuffer)
+    valid = _validation != VALIDATE_DEFERRED
+    # Identifiers made here, validated at the end
+    made = []
+    # {raw bytes : value, ...} new values, added to the caches once validated
+    newNames = {}
+    newIdents = {}
+    hits = 0
+    for i in range(count):
+        start = theOffset
+        # Origin then copy number, both UVARI
+        b = theBuffer[theOffset]
+        if b < 0x80:
+            origin = b
+            theOffset += 1
+        else:
+            l = lengths[b]
+            if theOffset + l > end:
+                raise _endOfBuffer(end - theOffset, l)
+            origin = from_bytes(theBuffer[theOffset:theOffset + l], 'big') & masks[l]
+            theOffset += l
+        b = theBuffer[theOffset]
+        if b < 0x80:
+            copy = b
+            theOffset += 1
+        else:
+            l = lengths[b]
+            if theOffset + l > end:
+                raise _endOfBuffer(end - theOffset, l)
+            copy = from_bytes(theBuffer[theOffset:theOffset + l], 'big') & masks[l]
+            theOffset += l
+        # Identifier, IDENT
+        identStart = theOffset
+        l = theBuffer[theOffset]
+        theOffset += 1 + l
+        if theOffset > end:
+            raise _endOfBuffer(end - identStart - 1, l)
+        if theCache is not None:
+            key = bytes(theBuffer[start:theOffset])
+            v = theCache.get(key)
+            if v is None:
+                v = newNames.get(key)
+            if v is not None:
+                hits += 1
+                ret.append(v)
+                continue
+        ident = None
+        if theIdentCache is not None:
+            identKey = bytes(theBuffer[identStart:theOffset])
+            ident = theIdentCache.get(identKey)
+            if ident is None:
+                ident = newIdents.get(identKey)
+        if ident is None:
+            ident = new(IDENTString)
+            ident._len = l
+            ident._payload = bytes(theBuffer[identStart + 1:theOffset])
+            ident._pad = 0
+            ident._valid = valid
+            made.append(ident)
+            if theIdentCache is not None:
+                newIdents[identKey] = ident
+        v = new(OBNAMEInternal)
+        v.origin = origin
+        v.copy = copy
+        v.identifier = ident
+        if theCache is not None:
+            newNames[key] = v
+        ret.append(v)
+    if made and _validation == VALIDATE_STRICT \
+            and IDENTBase.IDENT_INVALID.search(b''.join(i._payload for i in made)) is not None:
+        # Nulls are allowed after the significant bytes, look at each
+        for ident in made:
+            ident.validate()
+    if newIdents:
+        theIdentCache.update(newIdents)
+    if newNames:
+        theCache.update(newNames)
+    if Trace.counting and theCache is not None:
+        Trace.count('intern.OBNAME.hits', hits)
+        Trace.count('intern.OBNAME.misses', count - hits)
+    return ret, theOffset
+
+
+def decodeOBJREF(theBuffer, theOffset):
+    typ, theOffset = decodeIDENT(theBuffer, theOffset)
+    origin, theOffset = decodeORIGIN(theBuffer, theOffset)
+    copy, theOffset = decodeUVARI(theBuffer, theOffset)
+    ident, theOffset = decodeIDENT(theBuffer, theOffset)
+    return OBJREFInternal(typ, origin, copy, ident, None), theOffset
+
+
+for __c, __st in RC_BULK_STRUCT.items():
+    globals()['decode' + RC_TABLE[__c].SymbolicName] = _decodeStruct(__st)
+
+_decodeRawFSHORT = _decodeStruct(STRUCT_RC_FSHORT)
+_decodeRawUINT_4 = _decodeStruct(STRUCT_RC_UINT_4)
+
+
+def decodeFSHORT(theBuffer, theOffset):
+    v, theOffset = _decodeRawFSHORT(theBuffer, theOffset)
+    return fshortToFloat(v), theOffset
+
+
+def decodeISINGL(theBuffer, theOffset):
+    v, theOffset = _decodeRawUINT_4(theBuffer, theOffset)
+    return isinglToFloat(v), theOffset
+
+
+def decodeVSINGL(theBuffer, theOffset):
+    v, theOffset = _decodeRawUINT_4(theBuffer, theOffset)
+    return vsinglToFloat(v), theOffset
+
+
+def _decodeWithRead(theRead):
+    """Returns a decode function that uses a read* function."""
+    def decode(theBuffer, theOffset):
+        s = _BufferStream(theBuffer, theOffset)
+        return theRead(s), s.tell()
+
+    return decode
+
+
+# A tuple of functions that can decode a rep code, ordinal is rep code integer code.
+# Function takes a buffer and an offset and returns (rep code value, new offset).
+RC_INDIRECT_DECODE = tuple(
+    [
+        None if o is None else globals().get(
+            'decode' + o.SymbolicName, _decodeWithRead(RC_INDIRECT_READ[o.Code])
+        ) for o in RC_TABLE
+    ]
+)
+
+
+def decodeIndirectRepCode(c, theBuffer, theOffset):
+    """Given an integer code this decodes a single instance of that code from
+    theBuffer at theOffset. Returns (value, new offset).
+    May raise and ExceptionRepCodeCodeNumberOutOfRange if c out of range."""
+    _checkRepCodeInRange(c)
+    if Trace.counting:
+        return _decodeIndirectRepCodeCounted(c, theBuffer, theOffset)
+    return RC_INDIRECT_DECODE[c](theBuffer, theOffset)
+
+
+def indirectDecoder(c):
+    """Returns the function(theBuffer, theOffset) that decodeIndirectRepCode()
+    uses for code c so callers that decode many values of the same code look
+    it up once. For an out of range c the function raises
+    ExceptionRepCodeCodeNumberOutOfRange when it is called."""
+    if 0 < c < LEN_RC_TABLE and not Trace.counting:
+        return RC_INDIRECT_DECODE[c]
+    return lambda theBuffer, theOffset: decodeIndirectRepCode(c, theBuffer, theOffset)
+
+
+def _decodeIndirectRepCodeCounted(c, theBuffer, theOffset):
+    """decodeIndirectRepCode() recording the count, bytes and time per rep code."""
+    name = codeToName(c)
+    t = time.perf_counter()
+    v, off = RC_INDIRECT_DECODE[c](theBuffer, theOffset)
+    Trace.addTime('time.RepCode.' + name, time.perf_counter() - t)
+    Trace.count('values.RepCode.' + name)
+    Trace.count('bytes.RepCode.' + name, off - theOffset)
+    return v, off
+
+
+# Variable length codes that have a bulk decoder.
+# {code : function(count, buffer, offset) that returns (list, new offset), ...}
+RC_DECODE_ARRAY = {
+    18: decodeUVARIArray,
+    22: decodeUVARIArray,
+    23: decodeOBNAMEArray,
+}
+
+
+def decodeIndirectRepCodeArray(c, count, theBuffer, theOffset):
+    """The offset based counterpart of readIndirectRepCodeArray().
+    Returns (array.array or list, new offset)."""
+    s = _BufferStream(theBuffer, theOffset)
+    if c in RC_BULK_ARRAY or lenFixedCodeOrNone(c) is not None:
+        return readIndirectRepCodeArray(c, count, s), s.tell()
+    if c in RC_DECODE_ARRAY:
+        ret, off = RC_DECODE_ARRAY[c](count, theBuffer, theOffset)
+        if Trace.counting:
+            Trace.count('values.RepCode.' + codeToName(c), count)
+            Trace.count('bytes.RepCode.' + codeToName(c), off - theOffset)
+        return ret, off
+    ret = []
+    for i in range(count):
+        v, theOffset = decodeIndirectRepCode(c, theBuffer, theOffset)
+        ret.append(v)
+    return ret, theOffset
+
+
+class InternPool(object):
+    """Decodes IDENT, UNITS and OBNAME values through a cache keyed by their
+    raw encoded bytes so that repeated values, attribute labels, units and
+    object references for example, are a single shared instance. Values are
+    immutable so this is safe, equal values are then usually identical.
+    A pool should be used for one logical file, the cache is never pruned."""
+    INTERNED = (19, 23, 27)
+
+    def __init__(self):
+        # {raw bytes : value, ...}
+        self._ident = {}
+        self._units = {}
+        self._obname = {}
+
+    def __len__(self):
+        return len(self._ident) + len(self._units) + len(self._obname)
+
+    def clear(self):
+        self._ident.clear()
+        self._units.clear()
+        self._obname.clear()
+
+    def _lookup(self, theCache, theName, theBuffer, theOffset, theEnd, theDecode):
+        key = bytes(theBuffer[theOffset:theEnd])
+        v = theCache.get(key)
+        if v is not None:
+            if Trace.counting:
+                Trace.count('intern.{:s}.hits'.format(theName))
+            return v, theEnd
+        v, off = theDecode(theBuffer, theOffset)
+        theCache[key] = v
+        if Trace.counting:
+            Trace.count('intern.{:s}.misses'.format(theName))
+        return v, off
+
+    def decodeIDENT(self, theBuffer, theOffset):
+        return self._lookup(
+            self._ident, 'IDENT', theBuffer, theOffset, theOffset + 1 + theBuffer[theOffset], decodeIDENT
+        )
+
+    def decodeUNITS(self, theBuffer, theOffset):
+        l, off = decodeUVARI(theBuffer, theOffset)
+        return self._lookup(self._units, 'UNITS', theBuffer, theOffset, off + l, decodeUNITS)
+
+    def decodeOBNAME(self, theBuffer, theOffset):
+        # The origin and copy number, nearly always a single byte, are needed
+        # to find the end of the key. They are decoded once and kept for a
+        # new value.
+        origin = theBuffer[theOffset]
+        if origin < 0x80:
+            off = theOffset + 1
+        else:
+            origin, off = decodeUVARI(theBuffer, theOffset)
+        copy = theBuffer[off]
+        if copy < 0x80:
+            off += 1
+        else:
+            copy, off = decodeUVARI(theBuffer, off)
+        end = off + 1 + theBuffer[off]
+        key = bytes(theBuffer[theOffset:end])
+        v = self._obname.get(key)
+        if v is not None:
+            if Trace.counting:
+                Trace.count('intern.OBNAME.hits')
+            return v, end
+        identKey = key[off - theOffset:]
+        ident = self._ident.get(identKey)
+        if ident is None:
+            if len(identKey) != 1 + identKey[0]:
+                raise _endOfBuffer(len(identKey) - 1, identKey[0])
+            ident = self._ident[identKey] = IDENTString(identKey[1:])
+        v = self._obname[key] = OBNAMEInternal(None, origin, copy, ident, None)
+        if Trace.counting:
+            Trace.count('intern.OBNAME.misses')
+        return v, end
+
+    def decodeIndirectRepCode(self, c, theBuffer, theOffset):
+        """As decodeIndirectRepCode() but IDENT, UNITS and OBNAME values are interned."""
+        if c == 19:
+            return self.decodeIDENT(theBuffer, theOffset)
+        if c == 23:
+            return self.decodeOBNAME(theBuffer, theOffset)
+        if c == 27:
+            return self.decodeUNITS(theBuffer, theOffset)
+        return decodeIndirectRepCode(c, theBuffer, theOffset)
+
+    def indirectDecoder(self, c):
+        """As indirectDecoder() but IDENT, UNITS and OBNAME values are interned."""
+        if c == 19:
+            return self.decodeIDENT
+        if c == 23:
+            return self.decodeOBNAME
+        if c == 27:
+            return self.decodeUNITS
+        return indirectDecoder(c)
+
+    def decodeIndirectRepCodeArray(self, c, count, theBuffer, theOffset):
+        """As decodeIndirectRepCodeArray() but IDENT, UNITS and OBNAME values are interned."""
+        if c not in self.INTERNED:
+            return decodeIndirectRepCodeArray(c, count, theBuffer, theOffset)
+        if c == 23:
+            return decodeOBNAMEArray(count, theBuffer, theOffset, self._obname, self._ident)
+        ret = []
+        for i in range(count):
+            v, theOffset = self.decodeIndirectRepCode(c, theBuffer, theOffset)
+            ret.append(v)
+        return ret, theOffset
+
+##############################################
+# End: Offset based decoding.
+##############################################
+
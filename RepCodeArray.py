@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+# Part of TotalDepth: Petrophysical data processing and presentation
+# Copyright (C) 1999-2012 Paul Ross
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Paul Ross: apaulross@gmail.com
+"""NumPy counterparts of the fixed length representation codes in RepCode.
+
+RC_DTYPE maps a representation code to the NumPy dtype that has the same
+size and byte order on disk so that np.frombuffer() can decode many values at
+once. Codes that NumPy can not represent directly (FSHORT, ISINGL, VSINGL,
+DTIME) are mapped to raw unsigned integers or bytes of the right size.
+
+The raw FSHORT, ISINGL and VSINGL arrays are converted to floats in bulk by
+fshortToFloat(), isinglToFloat() and vsinglToFloat(), see convert(), and
+floats are converted to raw arrays by floatToFSHORT(), floatToISINGL() and
+floatToVSINGL(), see encode(). These are the vectorised counterparts of the
+scalar functions in RepCode and give the same bits.
+
+Raw DTIME values are converted to datetime64[ms] by dtimeToDatetime64(), the
+time zone nibble is masked off the month and is available separately from
+dtimeTimeZone():
+
+    raw = np.frombuffer(theBuffer, dtype=RC_DTYPE[21], count=n, offset=theOffset)
+    times = dtimeToDatetime64(raw)
+    zones = dtimeTimeZone(raw)
+"""
+
+import numpy as np
+
+import Commitar.RepCode as RepCode
+
+
+class ExceptionRepCodeArray(RepCode.ExceptionRepCode):
+    pass
+
+
+RC_DTYPE = {
+    # 1    FSHORT    Low precision floating point, raw bits
+    1: np.dtype('>u2'),
+    # 2    FSINGL    IEEE single precision floating point
+    2: np.dtype('>f4'),
+    # 3    FSING1    Validated single precision floating point
+    3: np.dtype([('value', '>f4'), ('bound', '>f4')]),
+    # 4    FSING2    Two-way validated single precision floating point
+    4: np.dtype([('value', '>f4'), ('lower', '>f4'), ('upper', '>f4')]),
+    # 5    ISINGL    IBM single precision floating point, raw bits
+    5: np.dtype('>u4'),
+    # 6    VSINGL    VAX single precision floating point, raw bits
+    6: np.dtype('>u4'),
+    # 7    FDOUBL    IEEE double precision floating point
+    7: np.dtype('>f8'),
+    # 8    FDOUB1    Validated double precision floating point
+    8: np.dtype([('value', '>f8'), ('bound', '>f8')]),
+    # 9    FDOUB2    Two-way validated double precision floating point
+    9: np.dtype([('value', '>f8'), ('lower', '>f8'), ('upper', '>f8')]),
+    # 10    CSINGL    Single precision complex
+    10: np.dtype('>c8'),
+    # 11    CDOUBL    Double precision complex
+    11: np.dtype('>c16'),
+    # 12    SSHORT    Short signed integer
+    12: np.dtype('>i1'),
+    # 13    SNORM    Normal signed integer
+    13: np.dtype('>i2'),
+    # 14    SLONG    Long signed integer
+    14: np.dtype('>i4'),
+    # 15    USHORT    Short unsigned integer
+    15: np.dtype('>u1'),
+    # 16    UNORM    Normal unsigned integer
+    16: np.dtype('>u2'),
+    # 17    ULONG    Long unsigned integer
+    17: np.dtype('>u4'),
+    # 21    DTIME    Date and time, raw bytes
+    21: np.dtype('V8'),
+    # 26    STATUS    Boolean status
+    26: np.dtype('>u1'),
+    # 28    RNORM    Rational
+    28: np.dtype([('numerator', '>i2'), ('denominator', '>u2')]),
+    # 29    RLONG    Long rational
+    29: np.dtype([('numerator', '>i4'), ('denominator', '>u4')]),
+    # 30    ISNORM    Inverted order normal signed integer
+    30: np.dtype('<i2'),
+    # 31    ISLONG    Inverted order long signed integer
+    31: np.dtype('<i4'),
+    # 32    IUNORM    Inverted order normal unsigned integer
+    32: np.dtype('<u2'),
+    # 33    IULONG    Inverted order long unsigned integer
+    33: np.dtype('<u4'),
+    # 34    IRNORM    Inverted order rational
+    34: np.dtype([('numerator', '<i2'), ('denominator', '<u2')]),
+    # 35    IRLONG    Inverted order long rational
+    35: np.dtype([('numerator', '<i4'), ('denominator', '<u4')]),
+    # 39    LOGICL    Logical
+    39: np.dtype('>u1'),
+    # 41    FRATIO    Floating point ratio
+    41: np.dtype([('numerator', '>f4'), ('denominator', '>f4')]),
+    # 42    DRATIO    Double precision ratio
+    42: np.dtype([('numerator', '>f8'), ('denominator', '>f8')]),
+}
+
+# Sanity checks, the dtype must match the size of the rep code on disk.
+for __c, __dt in RC_DTYPE.items():
+    assert (__dt.itemsize == RepCode.lenFixedCode(__c))
+
+
+def dtypeForRepCode(c):
+    """Returns the NumPy dtype of a single value of rep code c.
+    May raise ExceptionRepCodeArray for variable length codes."""
+    try:
+        return RC_DTYPE[c]
+    except KeyError:
+        raise ExceptionRepCodeArray(
+            'Rep code {:d} ({:s}) has no fixed length NumPy dtype'.format(c, RepCode.codeToName(c)))
+
+
+def fshortToFloat(a):
+    """Converts an array of raw FSHORT bits to float32."""
+    v = np.asarray(a).astype(np.int32)
+    frac = v >> 4
+    frac = np.where(frac & 0x800, frac - 0x1000, frac)
+    return np.ldexp(frac.astype(np.float32), (v & 0xF) - 11)
+
+
+def isinglToFloat(a):
+    """Converts an array of raw ISINGL bits to float64, the exponent range of
+    IBM floats exceeds float32."""
+    v = np.asarray(a).astype(np.uint32)
+    r = np.ldexp((v & 0xFFFFFF).astype(np.float64), 4 * (((v >> 24) & 0x7F).astype(np.int32) - 64) - 24)
+    return np.where(v & 0x80000000, -r, r)
+
+
+def vsinglToFloat(a):
+    """Converts an array of raw VSINGL bits, read big endian, to float32. A
+    reserved operand (zero exponent with the sign set) becomes NaN."""
+    v = np.asarray(a).astype(np.uint32)
+    v = ((v & 0x00FF00FF) << 8) | ((v >> 8) & 0x00FF00FF)
+    e = ((v >> 23) & 0xFF).astype(np.int32)
+    neg = (v & 0x80000000) != 0
+    r = np.ldexp(((v & 0x7FFFFF) | 0x800000).astype(np.float64), e - 128 - 24)
+    r = np.where(neg, -r, r)
+    r = np.where(e == 0, np.where(neg, np.nan, 0.0), r)
+    return r.astype(np.float32)
+
+
+def _checkFloatRange(f, theOk, theName):
+    """Raises RepCode.ExceptionRepCodeFloatRange with the first value of f
+    where theOk is False."""
+    if not theOk.all():
+        raise RepCode.ExceptionRepCodeFloatRange(
+            'Value {!r} out of range for {:s}'.format(float(f[~theOk].flat[0]), theName))
+
+
+def floatToFSHORT(a):
+    """Converts an array of floats to raw FSHORT bits as uint16, the fraction
+    is rounded. May raise RepCode.ExceptionRepCodeFloatRange."""
+    f = np.asarray(a, dtype=np.float64)
+    _checkFloatRange(f, np.isfinite(f), 'FSHORT')
+    _m, x = np.frexp(f)
+    # Smallest exponent that gives a fraction in [-1, 1)
+    e = np.maximum(x, 0).astype(np.int64)
+    frac = np.rint(np.ldexp(f, 11 - e)).astype(np.int64)
+    up = frac == 0x800
+    # -2**n is a fraction of -1 at the exponent below
+    down = ~up & (e > 0) & (np.rint(np.ldexp(f, 12 - e)) == -0x800)
+    frac = np.where(up, frac >> 1, np.where(down, -0x800, frac))
+    e = e + up - down
+    _checkFloatRange(f, (e <= 15) & (frac >= -0x800), 'FSHORT')
+    return (((frac & 0xFFF) << 4) | e).astype(np.uint16)
+
+
+def floatToISINGL(a):
+    """Converts an array of floats to raw ISINGL bits as uint32, the fraction
+    is rounded. May raise RepCode.ExceptionRepCodeFloatRange."""
+    f = np.asarray(a, dtype=np.float64)
+    _checkFloatRange(f, np.isfinite(f), 'ISINGL')
+    sign = np.where(f < 0, 0x80000000, 0).astype(np.int64)
+    m, x = np.frexp(np.abs(f))
+    x = x.astype(np.int64)
+    # abs(f) = fraction * 16**e with fraction in [1/16, 1)
+    e = -(-x // 4)
+    frac = np.rint(np.ldexp(m, 24 + x - 4 * e)).astype(np.int64)
+    up = frac == 0x1000000
+    frac = np.where(up, frac >> 4, frac)
+    e = e + up
+    _checkFloatRange(f, e + 64 <= 0x7F, 'ISINGL')
+    r = np.where(e + 64 < 0, sign, sign | ((e + 64) << 24) | frac)
+    return np.where(f == 0.0, 0, r).astype(np.uint32)
+
+
+def floatToVSINGL(a):
+    """Converts an array of floats to raw VSINGL bits, to be written big
+    endian, as uint32, the fraction is rounded. May raise
+    RepCode.ExceptionRepCodeFloatRange."""
+    f = np.asarray(a, dtype=np.float64)
+    _checkFloatRange(f, np.isfinite(f), 'VSINGL')
+    sign = np.where(f < 0, 0x80000000, 0).astype(np.int64)
+    m, x = np.frexp(np.abs(f))
+    e = x.astype(np.int64) + 128
+    frac = np.rint(np.ldexp(m, 24)).astype(np.int64)
+    up = frac == 0x1000000
+    frac = np.where(up, frac >> 1, frac)
+    e = e + up
+    _checkFloatRange(f, e <= 0xFF, 'VSINGL')
+    v = sign | (e << 23) | (frac & 0x7FFFFF)
+    # The word swap of vsinglToFloat()
+    v = ((v & 0x00FF00FF) << 8) | ((v >> 8) & 0x00FF00FF)
+    return np.where((f == 0.0) | (e < 1), 0, v).astype(np.uint32)
+
+
+def _dtimeBytes(a):
+    """The raw DTIME array a as unsigned bytes with a last axis of 8."""
+    a = np.asarray(a)
+    return np.ascontiguousarray(a).view(np.uint8).reshape(a.shape + (RC_DTYPE[21].itemsize,))
+
+
+def dtimeToDatetime64(a):
+    """Converts an array of raw DTIME values to datetime64[ms]. The time is as
+    recorded, the time zone is ignored. Values with fields out of range, for
+    example a month of 13 or the 30th of February, become NaT."""
+    b = _dtimeBytes(a).astype(np.int64)
+    year = b[..., 0] + RepCode.DTIMEBase.YEAR_OFFSET
+    month = b[..., 1] & 0xF
+    day, hour, minute, second = b[..., 2], b[..., 3], b[..., 4], b[..., 5]
+    ms = (b[..., 6] << 8) | b[..., 7]
+    months = ((year - 1970) * 12 + month - 1).astype('datetime64[M]')
+    days = months.astype('datetime64[D]') + (day - 1)
+    ret = days.astype('datetime64[ms]') + (((hour * 60 + minute) * 60 + second) * 1000 + ms)
+    valid = (month >= 1) & (month <= 12) & (day >= 1) & (days.astype('datetime64[M]') == months) \
+        & (hour < 24) & (minute < 60) & (second < 60) & (ms < 1000)
+    ret[~valid] = np.datetime64('NaT')
+    return ret
+
+
+def dtimeTimeZone(a):
+    """Returns the time zones of an array of raw DTIME values, 0 = local
+    standard time, 1 = local daylight savings time, 2 = Universal Coordinated
+    Time (Greenwich Mean Time)."""
+    return _dtimeBytes(a)[..., 1] >> 4
+
+
+# {rep code : (converter, dtype of the result), ...} for the codes that
+# RC_DTYPE holds as raw bits.
+RC_CONVERT = {
+    1: (fshortToFloat, np.dtype(np.float32)),
+    5: (isinglToFloat, np.dtype(np.float64)),
+    6: (vsinglToFloat, np.dtype(np.float32)),
+    21: (dtimeToDatetime64, np.dtype('datetime64[ms]')),
+}
+
+
+# {rep code : encoder, ...} the inverse of RC_CONVERT for the float codes.
+RC_ENCODE = {
+    1: floatToFSHORT,
+    5: floatToISINGL,
+    6: floatToVSINGL,
+}
+
+
+def needsConversion(c):
+    return c in RC_CONVERT
+
+
+def valueDtype(c):
+    """Returns the dtype of the values of rep code c after convert()."""
+    if c in RC_CONVERT:
+        return RC_CONVERT[c][1]
+    return dtypeForRepCode(c)
+
+
+def convert(c, a):
+    """Returns the array a of rep code c as decoded by np.frombuffer() with
+    RC_DTYPE converted to usable values, a is returned unchanged for codes
+    that need no conversion."""
+    if c in RC_CONVERT:
+        return RC_CONVERT[c][0](a)
+    return a
+
+
+def encode(c, a):
+    """The inverse of convert() for the float codes, returns the array a of
+    floats as the raw values of rep code c in RC_DTYPE. a is returned
+    unchanged for other codes. May raise RepCode.ExceptionRepCodeFloatRange."""
+    if c in RC_ENCODE:
+        return RC_ENCODE[c](a)
+    return a
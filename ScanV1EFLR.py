@@ -30,11 +30,18 @@ __version__ = '0.1.0'
 __rights__ = 'Copyright (c) 2011 Paul Ross.'
 
 import sys
-import io
 import time
 import collections
-from TotalDepth.util import FileBuffer
 import Commitar.AttrComp_V2 as AttrComp
+import Commitar.LogicalRecord as LogicalRecord
+import Commitar.MmapBuffer as MmapBuffer
+import Commitar.RepCode as RepCode
+import Commitar.SidecarIndex as SidecarIndex
+import Commitar.Trace as Trace
+
+_TP_RECORD = Trace.point('ScanV1EFLR.record', Trace.DEBUG)
+_TP_BYTES = Trace.point('ScanV1EFLR.bytes', Trace.TRACE)
+_TP_TABLE = Trace.point('ScanV1EFLR.table', Trace.DEBUG)
 
 
 
@@ -204,247 +211,193 @@ class ScanV1EFLR(object):
     IDX_NAME_LEN = 5
     IDX_NAME_VALUE = 6
 
-    def __init__(self, theF):
-        self.cont = 0
-        self.length = 0
-        self._fb = FileBuffer.FileBuffer(theF)
-        self.pos = 0
-        self.next = 0
-        self.last = 0
-        self.data = ""
-        self.objects = {}
+    def __init__(self, theF, useSidecar=False):
+        """theF is a path or a file opened in binary mode. If useSidecar is True
+        the logical record index is loaded from, or saved to, a sidecar file
+        next to the DLIS file, see SidecarIndex. With a valid sidecar the EFLRs
+        are not parsed until objects is first used."""
+        # {file header ID : {set type : AttrComp.EFLRTable, ...}, ...}, None until parsed
+        self._objects = None
+        # The FRAME and CHANNEL tables of a sidecar, plain dicts of strings
+        self._sidecarTemplates = None
         self.objectName = ""
-        self.type = ""
         self.parameterCounter = 0
         self.channelCounter = 0
-
-
-        while True:
-            self.length = 0
-            try:
-                attr = self._fb[self.pos+self.IDX_ATTR]
-
-
-            except IndexError:
-                break
-
-            # Attribute must match 10xxxxxx i.e. EFL and the first segment (no predecessor)
-            if attr & 0x80 > 0 and attr & 0x40 == 0 and self.last == 0 and attr & 0x10 == 0 and attr & 0x8 == 0:
-                typeCode = self._fb[self.pos+self.IDX_TYPE]
-                self.data = ""
-
-                if typeCode in self.EFLR_TYPE_MAP:
-                    l = self._fb[self.pos+self.IDX_NAME_LEN]
-                    if l > 0:
-                        name = self._fb[self.pos+self.IDX_NAME_VALUE:self.pos+self.IDX_NAME_VALUE + l]
-                        if name in self.EFLR_TYPE_MAP[typeCode].setTypes:
-                            self.cont = 1
-                            # Got one!
-                            self.length = (self._fb[self.pos] << 8) + self._fb[self.pos+1]
-                            self.next = self.length
-                            if attr & 0x4:
-                                self.length = self.length - 2
-                            if attr & 0x2:
-                                self.length = self.length - 2
-                            if attr & 0x40 == 0 and attr & 0x1:
-                                n = self._fb[self.pos+self.length-1]
-                                self.length = self.length - n
-
-
-                            st = 'LRSH  len={:6d} [0x{:04x}] attr=0x{:x} [{:b}] EFLR code={:d} name: {:s}'.format(
-                                    self.length,
-                                    self.length,
-                                    attr,
-                                    attr,
-                                    typeCode,
-                                    name.decode("UTF8"),
-                                )
-
-                            print(st)
-
-
-
-                            if name.decode("UTF8") == "CHANNEL":
-
-                                ind = self.pos + self.IDX_NAME_VALUE + l
-
-                                self.data = self._fb[ind:self.pos + self.length]
-                                if attr & 0x60 > 0:
-                                    self.cont = 1
-                                    self.last = 1
-                                    self.type = "channel"
-                                else:
-                                    self.parseChannel(0)
-
-
-                            if name.decode("UTF8") == "FILE-HEADER":
-
-                                ind = self.pos + self.IDX_NAME_VALUE + l
-                                self.data = self._fb[ind:self.pos + self.length]
-                                self.parseHeader(0)
-
-
-                            if name.decode("UTF8") == "FRAME":
-                                ind = self.pos + self.IDX_NAME_VALUE + l
-                                self.data = self._fb[ind:self.pos + self.length]
-                                if attr & 0x60 > 0:
-                                    self.cont = 1
-                                    self.last = 1
-                                    self.type = "frame"
-                                else:
-                                    self.parseFrame(0)
-
-                            if name.decode("UTF8") == "ORIGIN":
-                                ind = self.pos + self.IDX_NAME_VALUE + l
-
-                                self.data = self._fb[ind:self.pos + self.length]
-                                if attr & 0x60 > 0:
-                                    self.cont = 1
-                                    self.last = 1
-                                    self.type = "origin"
-                                else:
-                                    print(self._fb[self.pos:self.pos + self.length])
-                                    print(self.data)
-                                    self.parseOrigin(0)
-
-
-                            if name.decode("UTF8") == "PARAMETER":
-                                ind = self.pos + self.IDX_NAME_VALUE + l + 3
-                                self.data = self._fb[ind:self.pos + self.length]
-                                if attr & 0x60 > 0:
-                                    self.cont = 1
-                                    self.last = 1
-                                    self.type = "parameter"
-                                else:
-                                    self.parseParameter(0)
-
-
-
-
-            elif attr & 0x80 > 0 and attr & 0x40 > 0 and attr & 0x10 == 0 and attr & 0x8 == 0 and self.last:
-
-                self.length = (self._fb[self.pos] << 8) + self._fb[self.pos + 1]
-
-                self.next = self.length
-                if attr & 0x4:
-                    self.length = self.length - 2
-                if attr & 0x2:
-                    self.length = self.length - 2
-                if attr & 0x40 == 0 and attr & 0x1:
-                    n = self._fb[self.pos + self.length - 1]
-                    self.length = self.length - n
-
-
-                self.data = self.data + self._fb[self.pos+4:self.pos + self.length]
-
-                if attr & 0x20 == 0:
-                    self.last = 0
-                    if self.type == "frame":
-                        self.p = self.parseFrame(0)
-                    elif self.type == "channel":
-                        self.p = self.parseChannel(0)
-                    elif self.type == "origin":
-                        self.p = self.parseOrigin(0)
-                    elif self.type == "parameter":
-                        self.p = self.parseParameter(0)
-
-                    self.data = ""
-                    self.type = ""
-
-            if attr & 0x80 == 0 and attr & 0x10 == 0 and attr & 0x8 == 0:
-                #print(self._fb[self.pos:self.pos+100])
-                #a = input()
-                pass
-
-
-            if self.length == 0:
-                self.pos = self.pos+1
-
-            else:
-                self.pos = self.pos + self.next
-
-
-
-    def parser(self, ind):
-        aa = AttrComp.AttrCompStream(int(self.getBits(ind,0, 3), 2), io.BytesIO(self.data[ind:]))
-        aa.readAll()
-        aa.clearAttributeList()
-        del aa
-
-
-    def parseHeader(self, ind):
-        aa = AttrComp.AttrCompStream(int(self.getBits(ind, 0, 3), 2), io.BytesIO(self.data[ind:]))
-        aa.readAll()
-        #aa.print()
-        self.objectName = aa.getObjName().strip()
+        # Interns labels, units and object names, a new pool per logical file
+        self.pool = RepCode.InternPool()
+
+
+        self._fb = MmapBuffer.MmapBuffer(theF)
+        path = theF if isinstance(theF, str) else getattr(theF, 'name', None)
+        if not isinstance(path, str):
+            path = None
+            useSidecar = False
+        # The file path, if known, so that other processes can map the file
+        self.path = path
+        sidecar = SidecarIndex.load(path, self._fb) if useSidecar else None
+        if sidecar is not None:
+            self.index = sidecar.lrshIndex(self._fb)
+            self.logicalRecords = sidecar.logicalRecords
+            self.setTypes = sidecar.setTypes
+            self._sidecarTemplates = sidecar.templates
+            return
+        self.index = LogicalRecord.LRSHIndex(self._fb)
+        self.logicalRecords = self.index.logicalRecords()
+        self.setTypes = [self.index.setType(p) for p in self.logicalRecords]
+        self.parseEFLRs()
+        if useSidecar:
+            SidecarIndex.save(path, self._fb, SidecarIndex.SidecarIndex(
+                self.index.entries,
+                self.logicalRecords,
+                self.setTypes,
+                # Plain dicts, the tables are saved as JSON
+                {n: {k: dict(v) for k, v in tables.items()} for n, tables in self.templates.items()},
+                self.index.storageUnitLabel,
+            ))
+
+    @property
+    def objects(self):
+        """{file header ID : {set type : AttrComp.EFLRTable, ...}, ...}, the
+        EFLRs are parsed on first use if the index came from a sidecar."""
+        if self._objects is None:
+            self.parseEFLRs()
+        return self._objects
+
+    @property
+    def templates(self):
+        """The FRAME and CHANNEL tables of each logical file, these are what is
+        needed to decode frame data. They are those of the sidecar, plain
+        dicts of strings, until the EFLRs are parsed."""
+        if self._objects is None and self._sidecarTemplates is not None:
+            return self._sidecarTemplates
+        return self._templates()
+
+    def parseEFLRs(self):
+        """Parses every EFLR of the file from self.index into self.objects,
+        replacing what was there."""
+        self._objects = {}
+        self.objectName = ""
+        self.parameterCounter = 0
+        self.channelCounter = 0
+        self.pool = RepCode.InternPool()
+        # IFLRs are never visited, only each assembled EFLR
+        for record in self.index.iterRecords(p for p in self.logicalRecords if p.isEFLR):
+            self.parseRecord(record)
+
+    def parseRecord(self, theRecord):
+        """Parses one EFLR, a LogicalRecord.LogicalRecordBody. This can be fed
+        from LogicalRecord.iterLogicalRecords() or LRSHIndex.iterRecords()."""
+        # Encrypted records can not be parsed
+        if theRecord.attributes & (LogicalRecord.LRSH_ATTR_ENCRYPTION | LogicalRecord.LRSH_ATTR_ENCRYPTION_PACKET):
+            return
+        if not theRecord.isEFLR or theRecord.recordType not in self.EFLR_TYPE_MAP:
+            return
+        body = theRecord.body
+        l = body[1] if len(body) > 1 else 0
+        if l == 0:
+            return
+        name = bytes(body[2:2 + l])
+        if name not in self.EFLR_TYPE_MAP[theRecord.recordType].setTypes:
+            return
+
+        if _TP_RECORD.on:
+            _TP_RECORD.emit(
+                'LRSH  len={:6d} [0x{:04x}] attr=0x{:x} [{:b}] EFLR code={:d} name: {:s}',
+                len(body),
+                len(body),
+                theRecord.attributes,
+                theRecord.attributes,
+                theRecord.recordType,
+                name.decode("UTF8"),
+            )
+        if Trace.counting:
+            Trace.count('records.EFLR')
+            Trace.count('bytes.EFLR', len(body))
+            t = time.perf_counter()
+
+        # The parser decodes the set component, type and name, itself
+        if name == b"CHANNEL":
+            self.parseChannel(body)
+        elif name == b"FILE-HEADER":
+            self.parseHeader(body)
+        elif name == b"FRAME":
+            self.parseFrame(body)
+        elif name == b"ORIGIN":
+            if _TP_BYTES.on:
+                _TP_BYTES.emit('{!r}', bytes(body))
+            self.parseOrigin(body)
+        elif name == b"PARAMETER":
+            self.parseParameter(body)
+
+        if Trace.counting:
+            Trace.addTime('time.EFLR.' + name.decode("UTF8"), time.perf_counter() - t)
+
+    def _templates(self):
+        """Returns the FRAME and CHANNEL tables of each logical file from
+        self.objects, these are what is needed to decode frame data."""
+        return {
+            name: {k: v for k, v in tables.items() if k.startswith('FRAME') or k.startswith('CHANNEL')}
+            for name, tables in self.objects.items()
+        }
+
+    def parseHeader(self, theData):
+        # A FILE-HEADER starts a logical file
+        self.pool = RepCode.InternPool()
+        table = AttrComp.parseSet(theData, self.pool)
+        self.objectName = AttrComp.setId(table).strip()
         self.objects[self.objectName] = {}
-        self.objects[self.objectName]["HEADER"] = aa.getFrame()
-        del aa
-
-    def parseFrame(self,ind):
-        aa = AttrComp.AttrCompStream(int(self.getBits(ind, 0, 3), 2), io.BytesIO(self.data[ind:]))
-        #print(self.data[ind:])
-        aa.readAll()
-        aa.print()
-        self.objects[self.objectName]["FRAME"] = aa.getFrame()
-        del aa
-
-    def parseChannel(self,ind):
-        aa = AttrComp.AttrCompStream(int(self.getBits(ind, 0, 3), 2), io.BytesIO(self.data[ind:]))
-        print(self.data[ind:])
-        aa.readAll()
-        aa.print()
+        self.objects[self.objectName]["HEADER"] = table
+
+    def parseFrame(self, theData):
+        table = AttrComp.parseSet(theData, self.pool)
+        if _TP_TABLE.on:
+            _TP_TABLE.emit('{!r}', table)
+        self.objects[self.objectName]["FRAME"] = table
+
+    def parseChannel(self, theData):
+        if _TP_BYTES.on:
+            _TP_BYTES.emit('{!r}', bytes(theData))
+        table = AttrComp.parseSet(theData, self.pool)
+        if _TP_TABLE.on:
+            _TP_TABLE.emit('{!r}', table)
         if "CHANNEL" in self.objects[self.objectName]:
-            self.objects[self.objectName]["CHANNEL_" + str(self.channelCounter)] = aa.getFrame()
+            self.objects[self.objectName]["CHANNEL_" + str(self.channelCounter)] = table
         else:
-            self.objects[self.objectName]["CHANNEL"] = aa.getFrame()
+            self.objects[self.objectName]["CHANNEL"] = table
         self.channelCounter = self.channelCounter + 1
-        del aa
-
-    def parseOrigin(self,ind):
-        aa = AttrComp.AttrCompStream(int(self.getBits(ind, 0, 3), 2), io.BytesIO(self.data[ind:]))
-        #print(self.data[ind:])
-        aa.readAll()
-        aa.print()
-        self.objects[self.objectName]["ORIGIN"] = aa.getFrame()
-        del aa
-
-    def parseParameter(self,ind):
-        aa = AttrComp.AttrCompStream(int(self.getBits(ind, 0, 3), 2), io.BytesIO(self.data[ind:]))
-        print(self.data[ind:])
-        aa.readAll()
-        aa.print()
+
+    def parseOrigin(self, theData):
+        table = AttrComp.parseSet(theData, self.pool)
+        if _TP_TABLE.on:
+            _TP_TABLE.emit('{!r}', table)
+        self.objects[self.objectName]["ORIGIN"] = table
+
+    def parseParameter(self, theData):
+        if _TP_BYTES.on:
+            _TP_BYTES.emit('{!r}', bytes(theData))
+        table = AttrComp.parseSet(theData, self.pool)
+        if _TP_TABLE.on:
+            _TP_TABLE.emit('{!r}', table)
         if "PARAMETER" in self.objects[self.objectName]:
-            self.objects[self.objectName]["PARAMETER_"+ str(self.parameterCounter)] = aa.getFrame()
+            self.objects[self.objectName]["PARAMETER_"+ str(self.parameterCounter)] = table
         else:
-            self.objects[self.objectName]["PARAMETER"] = aa.getFrame()
+            self.objects[self.objectName]["PARAMETER"] = table
         self.parameterCounter = self.parameterCounter + 1
-        del aa
-
-    def getBits(self,ind,start,end):
-        attr = self.data[ind]
-        return ("{0:08b}".format(attr))[start:end]
-
 
 def main():
+    if len(sys.argv) != 2:
+        print('Usage: python ScanV1EFLR.py FILE')
+        return 1
 
-    path = "/home/lmdc/Downloads/TotalDepth-master/in"
-    #file = "1-mrk-3-rjs_wave.dlis"
-    #file = "7-GVR-2D-MA_UBI_PRINCIPAL_TVD_8.5..DLIS"
-    file = "7-ATL-2HP-RJS_LWD-mem_14.75in_GR-RES_SDTK_ZTK.dlis"
-    #file = "OBMI_IP_proc.dlis"
-
-    a = open(path + "/" + file, "rb")
-
-    clkStart = time.clock()
-    timStart = time.time()
+    clkStart = time.process_time()
+    timStart = time.perf_counter()
 
-    myObj = ScanV1EFLR(a)
+    myObj = ScanV1EFLR(sys.argv[1])
     print(myObj.objects)
     del myObj
 
-    print('  CPU time = %8.3f (S)' % (time.clock() - clkStart))
-    print('Exec. time = %8.3f (S)' % (time.time() - timStart))
+    print('  CPU time = %8.3f (S)' % (time.process_time() - clkStart))
+    print('Exec. time = %8.3f (S)' % (time.perf_counter() - timStart))
     print('Bye, bye!')
     return 0
 
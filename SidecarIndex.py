@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# Part of TotalDepth: Petrophysical data processing and presentation
+# Copyright (C) 1999-2012 Paul Ross
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Paul Ross: apaulross@gmail.com
+"""Persistent on-disk index of the logical records of a DLIS file.
+
+The sidecar lives next to the DLIS file (<file>.idx.json) and records:
+- the Logical Record Segment index (offset, length, attributes, record type).
+- the assembled Logical Record boundaries and the set type of every EFLR.
+- the FRAME and CHANNEL tables needed to decode frame data.
+
+It is invalidated when the file size, modification time or a hash of the
+start of the file changes. A stale, corrupt or unreadable sidecar is ignored
+and a sidecar that can not be written (read only archive for example) is
+silently skipped, the sidecar is only ever an optimisation.
+"""
+
+import hashlib
+import json
+import os
+
+import Commitar.LogicalRecord as LogicalRecord
+
+SIDECAR_SUFFIX = '.idx.json'
+SIDECAR_VERSION = 1
+# Number of bytes at the start of the file that are hashed.
+LEN_HEADER_HASH = 4096
+
+
+def sidecarPath(path):
+    return path + SIDECAR_SUFFIX
+
+
+def fileSignature(path, theBuffer):
+    """Returns a dict of the properties that invalidate a sidecar."""
+    st = os.stat(path)
+    return {
+        'size': st.st_size,
+        'mtime': st.st_mtime_ns,
+        'headerHash': hashlib.sha1(theBuffer[:LEN_HEADER_HASH]).hexdigest(),
+    }
+
+
+class SidecarIndex(object):
+    """The contents of a sidecar file.
+    segments - list of LogicalRecord.LRSHIndexEntry.
+    logicalRecords - list of LogicalRecord.LogicalRecordPosition.
+    setTypes - list, parallel to logicalRecords, of the EFLR set type as bytes or None.
+    templates - {file header ID : {'FRAME' : table, 'CHANNEL' : table, ...}, ...}
+    as ScanV1EFLR.objects."""
+
+    def __init__(self, segments, logicalRecords, setTypes, templates, storageUnitLabel=None):
+        self.segments = segments
+        self.logicalRecords = logicalRecords
+        self.setTypes = setTypes
+        self.templates = templates
+        self.storageUnitLabel = storageUnitLabel
+
+    def lrshIndex(self, theBuffer):
+        """Returns a LogicalRecord.LRSHIndex over theBuffer without walking the file."""
+        return LogicalRecord.LRSHIndex(theBuffer, self.segments, self.storageUnitLabel)
+
+    def _toJson(self, signature):
+        return {
+            'version': SIDECAR_VERSION,
+            'signature': signature,
+            'storageUnitLabel': None if self.storageUnitLabel is None else self.storageUnitLabel.hex(),
+            'segments': [[e.offset, e.length, e.attributes, e.recordType] for e in self.segments],
+            'logicalRecords': [[p.first, p.last] for p in self.logicalRecords],
+            'setTypes': [None if t is None else t.decode('latin-1') for t in self.setTypes],
+            'templates': self.templates,
+        }
+
+    @classmethod
+    def _fromJson(cls, d):
+        segments = [
+            LogicalRecord.LRSHIndexEntry(o, l, a, t, a & LogicalRecord.LRSH_ATTR_EFLR != 0)
+            for o, l, a, t in d['segments']
+        ]
+        logicalRecords = [
+            LogicalRecord.LogicalRecordPosition(f, l, segments[f].recordType, segments[f].isEFLR)
+            for f, l in d['logicalRecords']
+        ]
+        setTypes = [None if t is None else t.encode('latin-1') for t in d['setTypes']]
+        sul = d['storageUnitLabel']
+        return cls(segments, logicalRecords, setTypes, d['templates'], None if sul is None else bytes.fromhex(sul))
+
+
+def load(path, theBuffer, theSidecarPath=None):
+    """Returns a SidecarIndex for the DLIS file at path or None if there is no
+    valid sidecar."""
+    scPath = theSidecarPath or sidecarPath(path)
+    try:
+        with open(scPath, 'r') as f:
+            d = json.load(f)
+        if d.get('version') != SIDECAR_VERSION or d.get('signature') != fileSignature(path, theBuffer):
+            return None
+        return SidecarIndex._fromJson(d)
+    except (OSError, ValueError, KeyError, TypeError, IndexError):
+        return None
+
+
+def save(path, theBuffer, theSidecar, theSidecarPath=None):
+    """Writes theSidecar for the DLIS file at path. Returns True on success,
+    the temporary file is removed whatever happens."""
+    scPath = theSidecarPath or sidecarPath(path)
+    tmpPath = scPath + '.tmp'
+    try:
+        with open(tmpPath, 'w') as f:
+            json.dump(theSidecar._toJson(fileSignature(path, theBuffer)), f)
+        os.replace(tmpPath, scPath)
+    except (OSError, TypeError, ValueError):
+        # TypeError and ValueError from values that JSON can not hold
+        return False
+    finally:
+        try:
+            os.remove(tmpPath)
+        except OSError:
+            pass
+    return True
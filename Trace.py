@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# Part of TotalDepth: Petrophysical data processing and presentation
+# Copyright (C) 1999-2012 Paul Ross
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Paul Ross: apaulross@gmail.com
+"""Tracing and counters for the decoders.
+
+Trace points are named places in the code that can emit a message. Each has a
+level and is switched on only if there is at least one sink, its level is at
+or above the current level and its name has not been disabled. The caller
+tests the point before building the message so a switched off point costs a
+single attribute read:
+
+    _TP_RECORD = Trace.point('ScanV1EFLR.record', Trace.DEBUG)
+    ...
+    if _TP_RECORD.on:
+        _TP_RECORD.emit('EFLR {:s} length {:d}', name, length)
+
+A sink is any callable sink(point, message, args), StreamSink and LoggingSink
+are provided. Nothing is emitted until a sink is added, for example:
+
+    Trace.setLevel(Trace.DEBUG)
+    Trace.addSink(Trace.StreamSink())
+
+Counters are separately switched on with enableCounters(). They record the
+number of records seen, the bytes decoded and the time spent per
+representation code and per EFLR set type, see report().
+"""
+
+import collections
+import logging
+import sys
+
+# Levels, as the logging module.
+TRACE = 5
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+
+class ExceptionTrace(Exception):
+    pass
+
+
+class TracePoint(object):
+    """A named trace point, create these with point()."""
+    __slots__ = ('name', 'level', 'on')
+
+    def __init__(self, theName, theLevel):
+        self.name = theName
+        self.level = theLevel
+        self.on = False
+
+    def emit(self, message, *args):
+        """Sends message, a str.format() string, and its args to every sink.
+        Formatting is left to the sink."""
+        for sink in _sinks:
+            sink(self, message, args)
+
+    def __repr__(self):
+        return 'TracePoint({!r}, {:d}, on={!r})'.format(self.name, self.level, self.on)
+
+
+# {name : TracePoint, ...}
+_points = {}
+_sinks = []
+_level = WARNING
+# Name prefixes of trace points that are switched off whatever the level.
+_disabled = set()
+
+
+def _isOn(thePoint):
+    if not _sinks or thePoint.level < _level:
+        return False
+    return not any(thePoint.name == p or thePoint.name.startswith(p + '.') for p in _disabled)
+
+
+def _update():
+    for p in _points.values():
+        p.on = _isOn(p)
+
+
+def point(theName, theLevel=DEBUG):
+    """Returns the TracePoint called theName, creating it if necessary."""
+    if theName not in _points:
+        p = TracePoint(theName, theLevel)
+        p.on = _isOn(p)
+        _points[theName] = p
+    return _points[theName]
+
+
+def points():
+    """Returns the list of registered TracePoint sorted by name."""
+    return [_points[k] for k in sorted(_points.keys())]
+
+
+def setLevel(theLevel):
+    global _level
+    _level = theLevel
+    _update()
+
+
+def getLevel():
+    return _level
+
+
+def disable(thePrefix):
+    """Switches off the trace points called thePrefix or below it, for
+    example 'RepCode' switches off 'RepCode.IDENT'."""
+    _disabled.add(thePrefix)
+    _update()
+
+
+def enable(thePrefix):
+    """Reverses disable()."""
+    _disabled.discard(thePrefix)
+    _update()
+
+
+def addSink(theSink):
+    if not callable(theSink):
+        raise ExceptionTrace('Sink {!r} is not callable'.format(theSink))
+    _sinks.append(theSink)
+    _update()
+
+
+def removeSink(theSink):
+    _sinks.remove(theSink)
+    _update()
+
+
+def clearSinks():
+    del _sinks[:]
+    _update()
+
+
+class StreamSink(object):
+    """Writes 'name: message' lines to a stream, by default whatever
+    sys.stdout is at the time of writing."""
+
+    def __init__(self, theStream=None):
+        self._stream = theStream
+
+    def __call__(self, thePoint, message, args):
+        stream = self._stream or sys.stdout
+        stream.write('{:s}: {:s}\n'.format(thePoint.name, message.format(*args)))
+
+
+class LoggingSink(object):
+    """Forwards to the logging module, the logger name is the trace point name
+    below theRoot."""
+
+    def __init__(self, theRoot='Commitar'):
+        self._root = theRoot
+
+    def __call__(self, thePoint, message, args):
+        logger = logging.getLogger('{:s}.{:s}'.format(self._root, thePoint.name))
+        if logger.isEnabledFor(thePoint.level):
+            logger.log(thePoint.level, message.format(*args))
+
+
+# True when counters are being recorded, callers test this first:
+#     if Trace.counting:
+#         Trace.count('records.EFLR')
+counting = False
+# {name : integer, ...}
+counts = collections.Counter()
+# {name : seconds, ...}
+seconds = collections.Counter()
+
+
+def enableCounters(on=True):
+    global counting
+    counting = on
+
+
+def resetCounters():
+    counts.clear()
+    seconds.clear()
+
+
+def count(theName, n=1):
+    counts[theName] += n
+
+
+def addTime(theName, t):
+    seconds[theName] += t
+
+
+def report():
+    """Returns the counters as a multi-line string."""
+    lines = []
+    for k in sorted(counts.keys()):
+        lines.append('{:40s} {:12d}'.format(k, counts[k]))
+    for k in sorted(seconds.keys()):
+        lines.append('{:40s} {:12.6f} (S)'.format(k, seconds[k]))
+    return '\n'.join(lines)
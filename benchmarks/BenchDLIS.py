@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# Part of TotalDepth: Petrophysical data processing and presentation
+# Copyright (C) 1999-2012 Paul Ross
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Paul Ross: apaulross@gmail.com
+"""Benchmarks of scanning, EFLR parsing and frame decoding.
+
+Synthetic files are written with SyntheticDLIS for each case in CASES, then
+for each stage the best wall clock time of --repeat runs is reported with the
+throughput in MB/s and records/s. Peak memory of a stage is measured in a
+separate run under tracemalloc, so it does not distort the timings, and the
+process high water mark is reported at the end.
+
+Stages, each is measured on its own, what it needs is set up beforehand:
+scan - LogicalRecord.LRSHIndex over the file and assembling Logical Records.
+eflr - ScanV1EFLR.parseEFLRs(), assembling and parsing the EFLRs over an
+existing index.
+decode - FrameData.FrameDecoder.decode() of every frame type.
+
+Usage:
+    python BenchDLIS.py [--scale F] [--repeat N] [--case NAME] [--keep DIR] [--json OUT] [--validation POLICY]
+
+--scale multiplies the number of frames and parameters, --scale 10 gives the
+IFLR heavy case ten million frames. --json appends the results so runs of
+different releases can be compared.
+"""
+
+import argparse
+import collections
+import gc
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import Commitar.FrameData as FrameData
+import Commitar.LogicalRecord as LogicalRecord
+import Commitar.MmapBuffer as MmapBuffer
+import Commitar.RepCode as RepCode
+import Commitar.ScanV1EFLR as ScanV1EFLR
+import Commitar.benchmarks.SyntheticDLIS as SyntheticDLIS
+
+# name - case name.
+# channels, frames, parameters - passed to SyntheticDLIS.writeFile().
+# seg - maximum segment body length, small values give multi-segment EFLRs.
+# repCode - of the channels other than DEPT.
+Case = collections.namedtuple('Case', 'name channels frames parameters seg repCode')
+
+CASES = (
+    # Many PARAMETER objects and many channels in multi-segment EFLRs
+    Case('eflr-heavy', 500, 1000, 20000, 2000, 2),
+    # Many small frames
+    Case('iflr-heavy', 8, 1000000, 10, 4000, 2),
+    # Wide frames that span several segments
+    Case('wide-frames', 2000, 2000, 100, 4000, 2),
+    # VAX floats that are converted after decoding
+    Case('vax-frames', 8, 200000, 10, 4000, 6),
+)
+
+# case, stage - names.
+# seconds - best wall clock time.
+# mbPerSec - file size / seconds.
+# records - the number of records processed by the stage.
+# recordsPerSec - records / seconds.
+# peakMB - peak traced memory of the stage, None if not measured.
+Result = collections.namedtuple('Result', 'case stage seconds mbPerSec records recordsPerSec peakMB')
+
+
+def setupScan(path):
+    return MmapBuffer.MmapBuffer(path)
+
+
+def stageScan(theBuffer):
+    """Returns the number of Logical Records."""
+    index = LogicalRecord.LRSHIndex(theBuffer)
+    return len(index.logicalRecords())
+
+
+def setupEFLR(path):
+    """A ScanV1EFLR, its index is reused by stageEFLR()."""
+    return ScanV1EFLR.ScanV1EFLR(path)
+
+
+def stageEFLR(theScan):
+    """Parses the EFLRs over the prebuilt index, returns the number of EFLRs."""
+    theScan.parseEFLRs()
+    return sum(1 for p in theScan.logicalRecords if p.isEFLR)
+
+
+def setupDecode(path):
+    return FrameData.fromScan(ScanV1EFLR.ScanV1EFLR(path))
+
+
+def stageDecode(theDecoder):
+    """Returns the number of frames."""
+    return sum(len(theDecoder.decode(name).frameNumbers) for name in theDecoder.frames)
+
+
+# {name : (function that takes the path and returns what the stage needs, it
+# is not measured, the stage function that returns the number of records), ...}
+STAGES = collections.OrderedDict((
+    ('scan', (setupScan, stageScan)),
+    ('eflr', (setupEFLR, stageEFLR)),
+    ('decode', (setupDecode, stageDecode)),
+))
+
+
+def _run(theStage, path):
+    """Returns (number of records, seconds) of the stage, not the setup."""
+    setup, f = theStage
+    arg = setup(path)
+    gc.collect()
+    t = time.perf_counter()
+    ret = f(arg)
+    return ret, time.perf_counter() - t
+
+
+def _peakMemory(theStage, path):
+    """Returns the peak memory in MB allocated by the stage, not the setup."""
+    setup, f = theStage
+    arg = setup(path)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        f(arg)
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def benchCase(theCase, theDir, repeat=3, measureMemory=True):
+    """Writes the file of theCase in theDir and returns a list of Result."""
+    path = os.path.join(theDir, theCase.name + '.dlis')
+    if not os.path.exists(path):
+        SyntheticDLIS.writeFile(
+            path, theCase.channels, theCase.frames, theCase.parameters, theCase.seg, theCase.repCode)
+    mb = os.path.getsize(path) / 2**20
+    ret = []
+    for stage, f in STAGES.items():
+        runs = [_run(f, path) for _i in range(repeat)]
+        records = runs[0][0]
+        seconds = min(r[1] for r in runs)
+        peak = _peakMemory(f, path) if measureMemory else None
+        ret.append(Result(theCase.name, stage, seconds, mb / seconds, records, records / seconds, peak))
+    return ret
+
+
+def scaled(theCase, scale):
+    return theCase._replace(
+        frames=max(1, int(theCase.frames * scale)),
+        parameters=max(1, int(theCase.parameters * scale)),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks DLIS scanning and decoding.')
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiplies the frames and parameters, default 1.')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per stage, the best is reported, default 3.')
+    parser.add_argument('--case', action='append', default=None, help='Case name, may be repeated, default all.')
+    parser.add_argument('--keep', default=None, help='Directory to write and keep the files in.')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the peak memory runs.')
+    parser.add_argument('--json', default=None, help='Append the results as a JSON line to this file.')
+    parser.add_argument('--validation', default=RepCode.VALIDATE_STRICT, choices=RepCode.VALIDATE_POLICIES,
+                        help='Character validation policy, default strict.')
+    args = parser.parse_args()
+    RepCode.setValidation(args.validation)
+
+    cases = [scaled(c, args.scale) for c in CASES if args.case is None or c.name in args.case]
+    theDir = args.keep or tempfile.mkdtemp(prefix='BenchDLIS')
+    os.makedirs(theDir, exist_ok=True)
+    results = []
+    try:
+        print('{:12s} {:7s} {:>10s} {:>10s} {:>10s} {:>12s} {:>10s}'.format(
+            'Case', 'Stage', 'Time (S)', 'MB/s', 'Records', 'Records/s', 'Peak (MB)'))
+        for case in cases:
+            for r in benchCase(case, theDir, args.repeat, not args.no_memory):
+                results.append(r)
+                print('{:12s} {:7s} {:10.3f} {:10.1f} {:10d} {:12.0f} {:>10s}'.format(
+                    r.case, r.stage, r.seconds, r.mbPerSec, r.records, r.recordsPerSec,
+                    '-' if r.peakMB is None else '{:.1f}'.format(r.peakMB)))
+    finally:
+        if args.keep is None:
+            shutil.rmtree(theDir, ignore_errors=True)
+    # ru_maxrss is in kB on Linux, bytes on macOS
+    maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2**20 if sys.platform == 'darwin' else 2**10)
+    print('Process peak RSS: {:.1f} (MB)'.format(maxRss))
+    if args.json:
+        with open(args.json, 'a') as f:
+            json.dump({
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'scale': args.scale,
+                'validation': args.validation,
+                'maxRssMB': maxRss,
+                'results': [r._asdict() for r in results],
+            }, f)
+            f.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
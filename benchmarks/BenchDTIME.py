@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# Part of TotalDepth: Petrophysical data processing and presentation
+# Copyright (C) 1999-2012 Paul Ross
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Paul Ross: apaulross@gmail.com
+"""Micro-benchmark of DTIME decoding and formatting.
+
+The reference is the original string conversion of AttrComp_V2 that went
+through DTIMEBase.mktime(), datetime.fromtimestamp() and strftime(), it is
+copied here as _mktimeString(). It is compared with DTIMEBase.toString() and
+with the bulk RepCodeArray.dtimeToDatetime64().
+
+Usage:
+    python BenchDTIME.py [--count N] [--repeat N]
+"""
+
+import argparse
+import datetime
+import io
+import random
+import sys
+import timeit
+
+import numpy as np
+
+import Commitar.RepCode as RepCode
+import Commitar.RepCodeArray as RepCodeArray
+
+
+def _mktimeString(theValue):
+    """The original string of a DTIME value in AttrComp_V2."""
+    return datetime.datetime.fromtimestamp(int(theValue.mktime())).strftime('%d-%m-%Y %H:%M:%S')
+
+
+def dtimeBuffer(count):
+    """Returns count datetime.datetime, one second apart, and their DTIME encoding."""
+    rnd = random.Random(count)
+    start = datetime.datetime(2018, 1, 1, 0, 0, 0)
+    values = [start + datetime.timedelta(seconds=i, milliseconds=rnd.randrange(1000)) for i in range(count)]
+    s = io.BytesIO()
+    for v in values:
+        RepCode.writeDTIME(RepCode.DTIMEInternal(v, 2), s)
+    return values, s.getvalue()
+
+
+def _decodeEach(count, theBuffer, theFunction):
+    off = 0
+    ret = []
+    for i in range(count):
+        v, off = RepCode.decodeDTIME(theBuffer, off)
+        ret.append(theFunction(v))
+    return ret
+
+
+def cases(count):
+    """Returns a list of (name, function, expected values)."""
+    values, b = dtimeBuffer(count)
+    strings = [v.strftime('%d-%m-%Y %H:%M:%S') for v in values]
+    times = np.array(values, dtype='datetime64[ms]')
+    return [
+        ('DTIME string, mktime (original)', lambda: _decodeEach(count, b, _mktimeString), strings),
+        ('DTIME string, toString', lambda: _decodeEach(count, b, RepCode.DTIMEBase.toString), strings),
+        ('DTIME datetime64, each', lambda: np.array(_decodeEach(count, b, lambda v: v._time), dtype='datetime64[ms]'), times),
+        ('DTIME datetime64, bulk', lambda: RepCodeArray.dtimeToDatetime64(np.frombuffer(b, RepCodeArray.RC_DTYPE[21])), times),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks DTIME decoding.')
+    parser.add_argument('--count', type=int, default=100000, help='Values per run, default 100000.')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs, the best is reported, default 5.')
+    args = parser.parse_args()
+
+    print('{:32s} {:>10s} {:>12s} {:>8s}'.format('Case', 'Time (S)', 'Values/s', 'Speedup'))
+    base = {}
+    for name, f, expected in cases(args.count):
+        if not np.array_equal(np.asarray(f()), np.asarray(expected)):
+            print('{:32s} gives the wrong values'.format(name))
+            return 1
+        t = min(timeit.repeat(f, number=1, repeat=args.repeat))
+        kind = name.split(',')[0]
+        base.setdefault(kind, t)
+        print('{:32s} {:10.4f} {:12.0f} {:8.1f}'.format(name, t, args.count / t, base[kind] / t))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# Part of TotalDepth: Petrophysical data processing and presentation
+# Copyright (C) 1999-2012 Paul Ross
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Paul Ross: apaulross@gmail.com
+"""Benchmark of component descriptor handling on metadata heavy files.
+
+The reference is the original AttrCompStream state machine that formatted
+every component descriptor as a binary string, compared slices of it with
+literals such as '001' and re-read the template for every attribute. It is
+copied here as _AttrCompFormat. It is compared with AttrCompStream that looks
+descriptors up in AttrComp.DESCRIPTORS and follows the compiled template.
+
+The EFLRs of a synthetic file with many CHANNEL and PARAMETER objects are
+parsed by both, the tables must be the same. The reference finds the
+template by skipping to the first byte 0x34, 0x38 or 0x3C, the set types and
+SyntheticDLIS.SET_NAME do not contain these.
+
+Usage:
+    python BenchDescriptor.py [--channels N] [--parameters N] [--repeat N]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+
+import Commitar.AttrComp_V2 as AttrComp
+import Commitar.LogicalRecord as LogicalRecord
+import Commitar.RepCode as RepCode
+import Commitar.benchmarks.SyntheticDLIS as SyntheticDLIS
+
+
+class _AttrCompFormat(AttrComp.AttrCompStream):
+    """The original readAll() and readWithTemplate()."""
+
+    def getBits(self, start, end, attr):
+        return ("{0:08b}".format(attr))[start:end]
+
+    def readAll(self):
+        self.clearAttributeList()
+        attr = self.buffer[self.offset]
+        self.offset += 1
+        while int(attr) != 52 and int(attr) != 60 and int(attr) != 56:
+            attr = self.buffer[self.offset]
+            self.offset += 1
+        ok = 1
+        while True:
+            if ok == 1:
+                ok = 0
+            else:
+                attr = self.buffer[self.offset]
+                self.offset += 1
+            attr2 = self.getBits(3, 8, attr)
+            bits1_3 = self.getBits(0, 3, attr)
+            if bits1_3 == "000":
+                continue
+            if bits1_3 != '001' and bits1_3 != '010':
+                break
+            self.offset = self.decode(int(attr2, 2), self.buffer, self.offset)
+            self.role = self.getBits(0, 3, self.repCode)
+            self.attributeList.append(
+                AttrComp.Attribute(self.lable, self.count, self.repCode, self.units, self.value, self.role))
+        while self.getBits(0, 3, attr) == '011':
+            attr2 = self.getBits(3, 8, attr)
+            self.l = []
+            if int(attr2, 2) & 0x10:
+                id1 = self.buffer[self.offset]
+                id2 = self.buffer[self.offset + 1]
+                name, self.offset = RepCode.decodeIDENT(self.buffer, self.offset + 2)
+                self.l.append(AttrComp.RawName(id1, id2, name))
+            attr = self.buffer[self.offset]
+            self.offset += 1
+            attr = self.readWithTemplate(0, attr)
+            try:
+                self.getBits(0, 3, attr)
+            except Exception:
+                return
+
+    def readWithTemplate(self, ind, attr):
+        bits1_3 = self.getBits(0, 3, attr)
+        while ind < len(self.attributeList) and (bits1_3 == '000' or bits1_3 == '001' or bits1_3 == '010'):
+            bits1_3 = self.getBits(0, 3, attr)
+            a = None
+            count = 1
+            if bits1_3 == "001":
+                repCode = self.attributeList[ind].repCode
+                self.units = 0
+                buf = self.buffer
+                decoder = self.decoder
+                if attr & 0x10:
+                    self.lable, self.offset = decoder.decodeIDENT(buf, self.offset)
+                if attr & 0x8:
+                    count, self.offset = RepCode.decodeUVARI(buf, self.offset)
+                if attr & 0x4:
+                    repCode = buf[self.offset]
+                    self.offset += 1
+                if attr & 0x2:
+                    self.units, self.offset = decoder.decodeUNITS(buf, self.offset)
+                if attr & 0x1:
+                    if count > 1:
+                        a, self.offset = decoder.decodeIndirectRepCodeArray(repCode, count, buf, self.offset)
+                    else:
+                        a, self.offset = decoder.decodeIndirectRepCode(repCode, buf, self.offset)
+                ind = ind + 1
+            else:
+                a = 0
+                ind = ind + 1
+            if count > 1 and attr & 0x1:
+                self.l.append(AttrComp.RawValue(a, self.units, True))
+            elif self.units:
+                self.l.append(AttrComp.RawValue(a, self.units, False))
+            else:
+                self.l.append(a)
+            self.units = 0
+            if ind == len(self.attributeList) - 1:
+                self.dataList.append(self.l)
+            try:
+                attr = self.buffer[self.offset]
+                self.offset += 1
+            except Exception:
+                return
+            bits1_3 = self.getBits(0, 3, attr)
+        return attr
+
+
+def setBodies(path):
+    """Returns the EFLR bodies of path, from the set component on, as
+    ScanV1EFLR passes them to AttrComp.parseSet()."""
+    ret = []
+    for record in LogicalRecord.iterLogicalRecords(path):
+        if record.isEFLR and LogicalRecord.bodySetType(record.body) is not None:
+            ret.append(bytes(record.body))
+    return ret
+
+
+def parseAll(theClass, bodies):
+    """Parses every body with theClass, returns the number of rows."""
+    pool = RepCode.InternPool()
+    rows = 0
+    for body in bodies:
+        aa = theClass(AttrComp.DESCRIPTORS[body[0]].role, body, 0, pool)
+        aa.readAll()
+        rows += len(aa.dataList)
+    return rows
+
+
+def tables(theClass, bodies):
+    ret = []
+    for body in bodies:
+        aa = theClass(AttrComp.DESCRIPTORS[body[0]].role, body, 0, RepCode.InternPool())
+        aa.readAll()
+        ret.append(dict(aa.getFrame()))
+    return ret
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks component descriptor handling.')
+    parser.add_argument('--channels', type=int, default=2000, help='Number of CHANNEL objects, default 2000.')
+    parser.add_argument('--parameters', type=int, default=50000, help='Number of PARAMETER objects, default 50000.')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs, the best is reported, default 5.')
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.dlis', prefix='BenchDescriptor')
+    os.close(fd)
+    try:
+        SyntheticDLIS.writeFile(path, args.channels, 10, args.parameters, 4000)
+        bodies = setBodies(path)
+    finally:
+        os.remove(path)
+    if tables(_AttrCompFormat, bodies) != tables(AttrComp.AttrCompStream, bodies):
+        print('The tables differ')
+        return 1
+    print('{:32s} {:>10s} {:>12s} {:>8s}'.format('Case', 'Time (S)', 'Objects/s', 'Speedup'))
+    base = None
+    for name, cls in (('Format strings (original)', _AttrCompFormat), ('Descriptor table', AttrComp.AttrCompStream)):
+        rows = parseAll(cls, bodies)
+        t = min(timeit.repeat(lambda: parseAll(cls, bodies), number=1, repeat=args.repeat))
+        base = base or t
+        print('{:32s} {:10.4f} {:12.0f} {:8.1f}'.format(name, t, rows / t, base / t))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
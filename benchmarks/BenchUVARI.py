@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# Part of TotalDepth: Petrophysical data processing and presentation
+# Copyright (C) 1999-2012 Paul Ross
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Paul Ross: apaulross@gmail.com
+"""Micro-benchmark of UVARI and OBNAME decoding.
+
+The reference is the original readUVARI() that formatted every first byte as
+a binary string and read the continuation bytes one at a time, it is copied
+here as _readUVARIFormat(). It is compared with the table driven readUVARI(),
+decodeUVARI() and the bulk decodeUVARIArray() and decodeOBNAMEArray(), also
+through a RepCode.InternPool as when EFLRs are parsed.
+
+Usage:
+    python BenchUVARI.py [--count N] [--repeat N]
+"""
+
+import argparse
+import io
+import random
+import sys
+import timeit
+
+import Commitar.RepCode as RepCode
+
+
+def _readUVARIFormat(theS):
+    """The original implementation of RepCode.readUVARI()."""
+    b = theS.read(1)[0]
+    bn = "{0:08b}".format(b)
+    if bn[0] == "1":
+        if bn[1] == "1":
+            b &= 0x3F
+            for i in range(3):
+                b <<= 8
+                b |= theS.read(1)[0]
+        else:
+            b &= 0x7F
+            b <<= 8
+            b |= theS.read(1)[0]
+    return b
+
+
+def _readOBNAMEFormat(theS):
+    """An OBNAME read with the original UVARI reader, as readOBNAME() was."""
+    origin = _readUVARIFormat(theS)
+    copy = _readUVARIFormat(theS)
+    return RepCode.OBNAMEInternal(None, origin, copy, RepCode.IDENTStream(theS), None)
+
+
+def uvariBuffer(count):
+    """Returns count UVARI values, mostly small like real counts and copy
+    numbers, and their encoding."""
+    rnd = random.Random(count)
+    values = [rnd.choice((rnd.randrange(128), rnd.randrange(16384), rnd.randrange(2**30))) for i in range(count)]
+    s = io.BytesIO()
+    for v in values:
+        RepCode.writeUVARI(v, s)
+    return values, s.getvalue()
+
+
+def obnameBuffer(count):
+    """Returns count OBNAME values, like the CHANNELS of a FRAME, and their encoding."""
+    values = [
+        RepCode.OBNAMEInternal(None, 2, 0, RepCode.IDENTString('CH{:04d}'.format(i).encode('ascii')), None)
+        for i in range(count)
+    ]
+    s = io.BytesIO()
+    for v in values:
+        RepCode.writeOBNAME(v, s)
+    return values, s.getvalue()
+
+
+def _decodeEach(theFunction, count, theBuffer):
+    off = 0
+    ret = []
+    for i in range(count):
+        v, off = theFunction(theBuffer, off)
+        ret.append(v)
+    return ret
+
+
+def cases(count):
+    """Returns a list of (name, function, expected values)."""
+    uvari, ub = uvariBuffer(count)
+    obname, ob = obnameBuffer(count)
+    return [
+        ('UVARI read, format (original)', lambda: [_readUVARIFormat(s) for s in [io.BytesIO(ub)] for i in range(count)], uvari),
+        ('UVARI read, table', lambda: [RepCode.readUVARI(s) for s in [io.BytesIO(ub)] for i in range(count)], uvari),
+        ('UVARI decode, each', lambda: _decodeEach(RepCode.decodeUVARI, count, ub), uvari),
+        ('UVARI decode, bulk', lambda: RepCode.decodeUVARIArray(count, ub, 0)[0], uvari),
+        ('OBNAME read, format (original)', lambda: [_readOBNAMEFormat(s) for s in [io.BytesIO(ob)] for i in range(count)], obname),
+        ('OBNAME read, table', lambda: [RepCode.readOBNAME(s) for s in [io.BytesIO(ob)] for i in range(count)], obname),
+        ('OBNAME decode, each', lambda: _decodeEach(RepCode.decodeOBNAME, count, ob), obname),
+        ('OBNAME decode, bulk', lambda: RepCode.decodeOBNAMEArray(count, ob, 0)[0], obname),
+        # As ScanV1EFLR decodes them, a new pool as the values of a file are mostly new
+        ('OBNAME pool, each', lambda: _decodeEach(RepCode.InternPool().decodeOBNAME, count, ob), obname),
+        ('OBNAME pool, bulk', lambda: RepCode.InternPool().decodeIndirectRepCodeArray(23, count, ob, 0)[0], obname),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks UVARI and OBNAME decoding.')
+    parser.add_argument('--count', type=int, default=100000, help='Values per run, default 100000.')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs, the best is reported, default 5.')
+    args = parser.parse_args()
+
+    print('{:32s} {:>10s} {:>12s} {:>8s}'.format('Case', 'Time (S)', 'Values/s', 'Speedup'))
+    base = {}
+    for name, f, expected in cases(args.count):
+        if f() != expected:
+            print('{:32s} gives the wrong values'.format(name))
+            return 1
+        t = min(timeit.repeat(f, number=1, repeat=args.repeat))
+        kind = name.split()[0]
+        base.setdefault(kind, t)
+        print('{:32s} {:10.4f} {:12.0f} {:8.1f}'.format(name, t, args.count / t, base[kind] / t))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
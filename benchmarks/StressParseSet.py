@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# Part of TotalDepth: Petrophysical data processing and presentation
+# Copyright (C) 1999-2012 Paul Ross
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Paul Ross: apaulross@gmail.com
+"""Stress test of parsing EFLR sets from a thread pool.
+
+The set bodies of a synthetic file, or of the given files, are parsed once
+serially with AttrComp.parseSet(). They are then parsed --rounds times over
+by --threads threads in a shuffled order, without an InternPool and
+with one InternPool shared by all threads. Every table must be the same as
+the serial one: the header, the "data" strings and the native values and
+units. The thread switch interval is made very short so the threads
+interleave inside the parser.
+
+Usage:
+    python StressParseSet.py [FILE ...] [--threads N] [--rounds N] [--channels N] [--parameters N]
+
+Exits with 1 if any table differs.
+"""
+
+import argparse
+import concurrent.futures
+import os
+import random
+import sys
+import tempfile
+import time
+
+import Commitar.AttrComp_V2 as AttrComp
+import Commitar.RepCode as RepCode
+import Commitar.benchmarks.BenchDescriptor as BenchDescriptor
+import Commitar.benchmarks.SyntheticDLIS as SyntheticDLIS
+
+
+def tableResult(theTable):
+    """What is compared of a table, repr() of the native values so that NaN
+    compares equal to itself."""
+    return dict(theTable), repr(theTable.nativeRows()), theTable.unitsRows()
+
+
+def parseOne(theBody, thePool):
+    return tableResult(AttrComp.parseSet(theBody, thePool))
+
+
+def serial(bodies):
+    pool = RepCode.InternPool()
+    return [parseOne(body, pool) for body in bodies]
+
+
+def parallel(bodies, threads, rounds, sharedPool, seed=0):
+    """Parses every body rounds times from threads threads. Returns the list
+    of (index of the body, result) in the order the calls were made."""
+    order = [i for _r in range(rounds) for i in range(len(bodies))]
+    random.Random(seed).shuffle(order)
+    pool = RepCode.InternPool() if sharedPool else None
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        results = executor.map(lambda i: parseOne(bodies[i], pool), order)
+        return list(zip(order, results))
+
+
+def check(bodies, expected, threads, rounds, sharedPool):
+    """Returns (number of tables that differ from expected, seconds)."""
+    t = time.perf_counter()
+    results = parallel(bodies, threads, rounds, sharedPool)
+    t = time.perf_counter() - t
+    return sum(1 for i, r in results if r != expected[i]), t
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parses EFLR sets concurrently and compares with serial parsing.')
+    parser.add_argument('paths', nargs='*', help='DLIS files, default a synthetic file.')
+    parser.add_argument('--threads', type=int, default=8, help='Threads, default 8.')
+    parser.add_argument('--rounds', type=int, default=20, help='Times each set is parsed, default 20.')
+    parser.add_argument('--channels', type=int, default=200, help='CHANNEL objects of the synthetic file, default 200.')
+    parser.add_argument('--parameters', type=int, default=2000, help='PARAMETER objects of the synthetic file, default 2000.')
+    args = parser.parse_args()
+
+    bodies = []
+    if args.paths:
+        for path in args.paths:
+            bodies.extend(BenchDescriptor.setBodies(path))
+    else:
+        fd, path = tempfile.mkstemp(suffix='.dlis', prefix='StressParseSet')
+        os.close(fd)
+        try:
+            # Small segments so that sets span several of them
+            SyntheticDLIS.writeFile(path, args.channels, 10, args.parameters, 500)
+            bodies = BenchDescriptor.setBodies(path)
+        finally:
+            os.remove(path)
+    expected = serial(bodies)
+    print('{:d} sets, {:d} objects, {:d} threads, {:d} rounds'.format(
+        len(bodies), sum(len(e[0]['data']) for e in expected), args.threads, args.rounds))
+
+    switchInterval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    failed = 0
+    try:
+        for name, sharedPool in (('No pool', False), ('Shared pool', True)):
+            differ, t = check(bodies, expected, args.threads, args.rounds, sharedPool)
+            failed += differ
+            print('{:16s} {:8d} tables {:8d} differ {:10.3f} (S)'.format(
+                name, len(bodies) * args.rounds, differ, t))
+    finally:
+        sys.setswitchinterval(switchInterval)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# Part of TotalDepth: Petrophysical data processing and presentation
+# Copyright (C) 1999-2012 Paul Ross
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Paul Ross: apaulross@gmail.com
+"""Writes synthetic DLIS files for benchmarking.
+
+One logical file is written: FILE-HEADER, ORIGIN, CHANNEL, FRAME and
+PARAMETER sets followed by the frame data of a single frame type MAIN. The
+first channel is DEPT (FDOUBL), the others are FSINGL or, optionally, one of
+FSHORT, ISINGL, VSINGL or the inverted order ISNORM. The file is written with
+DLISWriter, EFLRs with DLISWriter.SetWriter and the frame data from NumPy
+arrays with DLISWriter.writeFrames() since there may be millions of frames.
+
+checkFile() decodes the frames of a file with FrameData and compares them
+with what was written, --check does that after writing.
+
+Logical records longer than segMax bytes are split into several segments so
+multi-segment EFLRs (and IFLRs) can be exercised.
+
+Usage:
+    python SyntheticDLIS.py OUT [--channels N] [--frames N] [--parameters N] [--seg N] [--rep-code NAME] [--check]
+"""
+
+import argparse
+import datetime
+import sys
+
+import numpy as np
+
+import Commitar.DLISWriter as DLISWriter
+import Commitar.FrameData as FrameData
+import Commitar.RepCode as RepCode
+import Commitar.ScanV1EFLR as ScanV1EFLR
+
+# Set name of every set.
+SET_NAME = b'SYNTH'
+
+FRAME_NAME = b'MAIN'
+# Frames written per call to DLISWriter.writeFrames().
+FRAME_CHUNK = 100000
+
+
+def channelNames(nChannels):
+    return [b'DEPT'] + ['CH{:04d}'.format(i).encode('ascii') for i in range(1, nChannels)]
+
+
+# Rep codes of the channels other than DEPT, the values are written as floats
+# and DLISWriter encodes them.
+FRAME_REP_CODES = (
+    RepCode.nameToCode('FSINGL'),
+    RepCode.nameToCode('FSHORT'),
+    RepCode.nameToCode('ISINGL'),
+    RepCode.nameToCode('VSINGL'),
+    RepCode.nameToCode('ISNORM'),
+)
+
+# Rep codes whose channel values are kept below 1000, FSHORT has 11 bits of
+# fraction and ISNORM is 16 bits.
+SMALL_VALUES = (RepCode.nameToCode('FSHORT'), RepCode.nameToCode('ISNORM'))
+
+
+def frameDtype(nChannels, repCode=RepCode.nameToCode('FSINGL')):
+    """The dtype of the channel values of one frame as on disk."""
+    return FrameData.frameDtype([
+        FrameData.ChannelInfo(name.decode('ascii'), RepCode.nameToCode('FDOUBL') if i == 0 else repCode, (1,), '')
+        for i, name in enumerate(channelNames(nChannels))
+    ])
+
+
+def writeEFLRs(theWriter, nChannels, nParameters, repCode=RepCode.nameToCode('FSINGL')):
+    rcIDENT = RepCode.nameToCode('IDENT')
+    rcASCII = RepCode.nameToCode('ASCII')
+    rcUSHORT = RepCode.nameToCode('USHORT')
+    rcUVARI = RepCode.nameToCode('UVARI')
+    rcUNITS = RepCode.nameToCode('UNITS')
+    rcDTIME = RepCode.nameToCode('DTIME')
+    rcOBNAME = RepCode.nameToCode('OBNAME')
+    rcFDOUBL = RepCode.nameToCode('FDOUBL')
+
+    s = DLISWriter.SetWriter(b'FILE-HEADER', SET_NAME)
+    s.template(b'SEQUENCE-NUMBER', rcASCII)
+    s.template(b'ID', rcASCII)
+    s.object(b'5')
+    s.value(rcASCII, RepCode.ASCIIString('1'))
+    s.value(rcASCII, RepCode.ASCIIString('SYNTHETIC'))
+    theWriter.writeEFLR(DLISWriter.EFLR_FHLR, s.getvalue())
+
+    s = DLISWriter.SetWriter(b'ORIGIN', SET_NAME)
+    s.template(b'FILE-ID', rcASCII)
+    s.template(b'FILE-SET-NAME', rcIDENT)
+    s.template(b'FILE-NUMBER', rcUVARI)
+    s.template(b'CREATION-TIME', rcDTIME)
+    s.object(b'DLIS_DEFINING_ORIGIN')
+    s.value(rcASCII, RepCode.ASCIIString('SYNTHETIC'))
+    s.value(rcIDENT, RepCode.IDENTString(b'BENCHMARK'))
+    s.value(rcUVARI, 1)
+    s.value(rcDTIME, RepCode.DTIMEInternal(datetime.datetime(2018, 5, 17, 10, 30, 0)))
+    theWriter.writeEFLR(DLISWriter.EFLR_OLR, s.getvalue())
+
+    names = channelNames(nChannels)
+    s = DLISWriter.SetWriter(b'CHANNEL', SET_NAME)
+    s.template(b'LONG-NAME', rcASCII)
+    s.template(b'PROPERTIES', rcIDENT)
+    s.template(b'REPRESENTATION-CODE', rcUSHORT)
+    s.template(b'UNITS', rcUNITS)
+    s.template(b'DIMENSION', rcUVARI)
+    s.template(b'ELEMENT-LIMIT', rcUVARI)
+    for i, name in enumerate(names):
+        s.object(name)
+        s.value(rcASCII, RepCode.ASCIIString('Channel ' + name.decode('ascii')))
+        s.absent()
+        s.value(rcUSHORT, rcFDOUBL if i == 0 else repCode)
+        s.value(rcUNITS, RepCode.UNITSString('m' if i == 0 else 'gAPI'))
+        s.value(rcUVARI, 1)
+        s.value(rcUVARI, 1)
+    theWriter.writeEFLR(DLISWriter.EFLR_CHANNL, s.getvalue())
+
+    s = DLISWriter.SetWriter(b'FRAME', SET_NAME)
+    s.template(b'DESCRIPTION', rcASCII)
+    s.template(b'CHANNELS', rcOBNAME)
+    s.template(b'INDEX-TYPE', rcIDENT)
+    s.template(b'DIRECTION', rcIDENT)
+    s.template(b'SPACING', rcFDOUBL)
+    s.object(FRAME_NAME)
+    s.value(rcASCII, RepCode.ASCIIString('Main frame'))
+    s.values(rcOBNAME, [DLISWriter.obname(n) for n in names])
+    s.value(rcIDENT, RepCode.IDENTString(b'BOREHOLE-DEPTH'))
+    s.value(rcIDENT, RepCode.IDENTString(b'INCREASING'))
+    s.value(rcFDOUBL, 0.1524, 'm')
+    theWriter.writeEFLR(DLISWriter.EFLR_FRAME, s.getvalue())
+
+    if nParameters:
+        s = DLISWriter.SetWriter(b'PARAMETER', SET_NAME)
+        s.template(b'LONG-NAME', rcASCII)
+        s.template(b'DIMENSION', rcUVARI)
+        s.template(b'VALUES', rcFDOUBL)
+        for i in range(nParameters):
+            s.object('P{:06d}'.format(i).encode('ascii'))
+            s.value(rcASCII, RepCode.ASCIIString('Parameter {:d}'.format(i)))
+            s.value(rcUVARI, 1)
+            s.value(rcFDOUBL, i * 1.5, 'm')
+        theWriter.writeEFLR(DLISWriter.EFLR_STATIC, s.getvalue())
+
+
+def frameValues(nChannels, nFrames, start, stop, repCode=RepCode.nameToCode('FSINGL')):
+    """Returns (frame numbers, DEPT values, 2D array of the values of the
+    other channels) of the frames start to stop, the values are floats."""
+    f = np.arange(start, stop)
+    mod = 1000 if repCode in SMALL_VALUES else nFrames * 10 + nChannels
+    others = ((f[:, np.newaxis] * 10 + np.arange(1, nChannels)) % mod).astype(np.float64)
+    return f + 1, 1000.0 + f * 0.1524, others
+
+
+def writeFrames(theWriter, nChannels, nFrames, repCode=RepCode.nameToCode('FSINGL')):
+    names = frameDtype(nChannels, repCode).names
+    repCodes = [RepCode.nameToCode('FDOUBL')] + [repCode] * (nChannels - 1)
+    dt = np.dtype([(name, np.float64) for name in names])
+    for start in range(0, nFrames, FRAME_CHUNK):
+        numbers, depth, v = frameValues(nChannels, nFrames, start, min(nFrames, start + FRAME_CHUNK), repCode)
+        values = np.empty(len(numbers), dtype=dt)
+        values[names[0]] = depth
+        for j, name in enumerate(names[1:]):
+            values[name] = v[:, j]
+        theWriter.writeFrames(FRAME_NAME, values, numbers, repCodes=repCodes)
+
+
+def checkFile(path, nChannels, nFrames, repCode=RepCode.nameToCode('FSINGL')):
+    """Decodes the frames of a file written by writeFile() with
+    FrameData.FrameDecoder and returns True if they are what was written."""
+    decoded = FrameData.fromScan(ScanV1EFLR.ScanV1EFLR(path)).decode(FRAME_NAME.decode('ascii'))
+    numbers, depth, v = frameValues(nChannels, nFrames, 0, nFrames, repCode)
+    values = decoded.values
+    names = values.dtype.names
+    return len(values) == nFrames \
+        and np.array_equal(decoded.frameNumbers, numbers) \
+        and np.array_equal(values[names[0]], depth) \
+        and all(np.array_equal(values[name], v[:, j]) for j, name in enumerate(names[1:]))
+
+
+def writeFile(path, nChannels=8, nFrames=1000, nParameters=100, segMax=4000, repCode=RepCode.nameToCode('FSINGL')):
+    """Writes a synthetic DLIS file to path. repCode is that of the channels
+    other than DEPT, one of FRAME_REP_CODES."""
+    with DLISWriter.DLISWriter(path, segMax) as w:
+        writeEFLRs(w, nChannels, nParameters, repCode)
+        writeFrames(w, nChannels, nFrames, repCode)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Writes a synthetic DLIS file.')
+    parser.add_argument('path', help='Output file.')
+    parser.add_argument('--channels', type=int, default=8, help='Number of channels, default 8.')
+    parser.add_argument('--frames', type=int, default=1000, help='Number of frames, default 1000.')
+    parser.add_argument('--parameters', type=int, default=100, help='Number of PARAMETER objects, default 100.')
+    parser.add_argument('--seg', type=int, default=4000, help='Maximum segment body length, default 4000.')
+    parser.add_argument('--rep-code', default='FSINGL', choices=[RepCode.codeToName(c) for c in FRAME_REP_CODES],
+                        help='Rep code of the channels other than DEPT, default FSINGL.')
+    parser.add_argument('--check', action='store_true', help='Decode the frames and compare them with what was written.')
+    args = parser.parse_args()
+    repCode = RepCode.nameToCode(args.rep_code)
+    writeFile(args.path, args.channels, args.frames, args.parameters, args.seg, repCode)
+    if args.check and not checkFile(args.path, args.channels, args.frames, repCode):
+        print('The decoded frames differ from those written')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,44 @@
+# Part of TotalDepth: Petrophysical data processing and presentation
+# Copyright (C) 1999-2012 Paul Ross
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Paul Ross: apaulross@gmail.com
+"""The modules import each other as Commitar.<module>. If the checkout is not
+itself importable as Commitar the repository directory is registered as that
+package so the tests can be run with "python -m pytest tests" from anywhere."""
+
+import os
+import sys
+import types
+
+try:
+    import Commitar
+except ImportError:
+    Commitar = types.ModuleType('Commitar')
+    Commitar.__path__ = [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))]
+    sys.modules['Commitar'] = Commitar
+
+import pytest
+
+import Commitar.benchmarks.SyntheticDLIS as SyntheticDLIS
+
+
+@pytest.fixture
+def syntheticPath(tmp_path):
+    """Path of a small synthetic DLIS file."""
+    path = str(tmp_path / 'synthetic.dlis')
+    SyntheticDLIS.writeFile(path, nChannels=4, nFrames=50, nParameters=20)
+    return path
@@ -0,0 +1,197 @@
+# Part of TotalDepth: Petrophysical data processing and presentation
+# Copyright (C) 1999-2012 Paul Ross
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Paul Ross: apaulross@gmail.com
+"""Tests of reading EFLR sets with AttrComp_V2."""
+
+import io
+
+import pytest
+
+import Commitar.AttrComp_V2 as AttrComp
+import Commitar.RepCode as RepCode
+
+FSINGL = RepCode.nameToCode('FSINGL')
+UVARI = RepCode.nameToCode('UVARI')
+
+
+class SetBody(object):
+    """Writes the body of an EFLR, a set component, template and objects."""
+
+    def __init__(self, theType=b'PARAMETER', theName=b'S'):
+        self.s = io.BytesIO()
+        self.s.write(bytes([0xF8]))
+        RepCode.writeIDENT(RepCode.IDENTString(theType), self.s)
+        RepCode.writeIDENT(RepCode.IDENTString(theName), self.s)
+
+    def attribute(self, theLabel, theRepCode, theCount=None, theUnits=None, theValue=None):
+        """A template attribute."""
+        desc = 0x34
+        if theCount is not None:
+            desc |= 0x08
+        if theUnits is not None:
+            desc |= 0x02
+        if theValue is not None:
+            desc |= 0x01
+        self.s.write(bytes([desc]))
+        RepCode.writeIDENT(RepCode.IDENTString(theLabel), self.s)
+        if theCount is not None:
+            RepCode.writeUVARI(theCount, self.s)
+        self.s.write(bytes([theRepCode]))
+        if theUnits is not None:
+            RepCode.writeUNITS(RepCode.UNITSString(theUnits), self.s)
+        if theValue is not None:
+            for v in theValue if isinstance(theValue, list) else [theValue]:
+                RepCode.writeIndirectRepCode(theRepCode, v, self.s)
+        return self
+
+    def object(self, theName, theOrigin=1, theCopy=0):
+        self.s.write(bytes([0x70]))
+        RepCode.writeOBNAME(
+            RepCode.OBNAMEInternal(None, theOrigin, theCopy, RepCode.IDENTString(theName), None), self.s)
+        return self
+
+    def value(self, theRepCode, *theValues):
+        """An object attribute with only a value, descriptor 0x21."""
+        self.s.write(bytes([0x21]))
+        for v in theValues:
+            RepCode.writeIndirectRepCode(theRepCode, v, self.s)
+        return self
+
+    def absent(self):
+        self.s.write(bytes([0x00]))
+        return self
+
+    def body(self):
+        return self.s.getvalue()
+
+
+def _parse(theBody, thePool=None):
+    table = AttrComp.parseSet(theBody, thePool)
+    return table['data'], table.nativeRows()
+
+
+@pytest.mark.parametrize('origin', [0, 127, 128, 200, 16383, 16384, 70000])
+def test_object_name_origin(origin):
+    b = SetBody().attribute(b'X', FSINGL).attribute(b'Y', FSINGL)
+    b.object(b'A', origin).value(FSINGL, 1.0).value(FSINGL, 2.0)
+    b.object(b'B', origin, 3).value(FSINGL, 3.0).value(FSINGL, 4.0)
+    data, rows = _parse(b.body())
+    assert data == [
+        ['{:d}&0&A'.format(origin), '1.0', '2.0'],
+        ['{:d}&3&B'.format(origin), '3.0', '4.0'],
+    ]
+    assert rows[1][0] == AttrComp.ObjectName(origin, 3, 'B')
+
+
+def test_template_of_one_attribute():
+    b = SetBody().attribute(b'X', FSINGL)
+    for i in range(3):
+        b.object(b'O%d' % i).value(FSINGL, float(i))
+    data, _rows = _parse(b.body())
+    assert data == [['1&0&O0', '0.0'], ['1&0&O1', '1.0'], ['1&0&O2', '2.0']]
+
+
+def test_empty_template():
+    b = SetBody()
+    b.object(b'A').object(b'B')
+    data, _rows = _parse(b.body())
+    assert data == [['1&0&A'], ['1&0&B']]
+
+
+def test_object_ends_before_template_takes_defaults():
+    b = SetBody()
+    b.attribute(b'X', FSINGL)
+    b.attribute(b'Y', FSINGL, theUnits='m', theValue=5.0)
+    b.attribute(b'Z', UVARI, theCount=2, theValue=[7, 8])
+    b.attribute(b'W', FSINGL)
+    # W has no default value, it is shown as None
+    # Ends after X, followed by another object
+    b.object(b'A').value(FSINGL, 1.0)
+    # Ends after Y
+    b.object(b'B').value(FSINGL, 2.0).value(FSINGL, 6.0)
+    # Complete, Y is absent which is shown as 0
+    b.object(b'C').value(FSINGL, 3.0).absent().value(UVARI, 1, 2).value(FSINGL, 4.0)
+    # Ends with the set, after X
+    b.object(b'D').value(FSINGL, 9.0)
+    data, rows = _parse(b.body())
+    assert data == [
+        ['1&0&A', '1.0', '5.0 m', ['7', '8'], 'None'],
+        ['1&0&B', '2.0', '6.0 m', ['7', '8'], 'None'],
+        ['1&0&C', '3.0', '0', ['1', '2'], '4.0'],
+        ['1&0&D', '9.0', '5.0 m', ['7', '8'], 'None'],
+    ]
+    assert [len(r) for r in rows] == [5, 5, 5, 5]
+    assert rows[0][2:] == [5.0, [7, 8], None]
+
+
+def test_last_object_without_attributes():
+    b = SetBody().attribute(b'X', FSINGL, theValue=1.5).attribute(b'Y', FSINGL)
+    b.object(b'A').value(FSINGL, 1.0).value(FSINGL, 2.0)
+    b.object(b'B')
+    data, _rows = _parse(b.body())
+    assert data == [['1&0&A', '1.0', '2.0'], ['1&0&B', '1.5', 'None']]
+
+
+def test_not_a_set():
+    with pytest.raises(AttrComp.ExceptionAttrComp):
+        AttrComp.parseSet(bytes([0x70, 1, 0, 1, 65]))
+
+
+def test_pool_interns_object_names():
+    channels = SetBody(b'CHANNEL').attribute(b'UNITS', RepCode.nameToCode('IDENT'))
+    for name in (b'DEPT', b'GR'):
+        channels.object(name).value(RepCode.nameToCode('IDENT'), RepCode.IDENTString(b'm'))
+    frame = SetBody(b'FRAME').attribute(b'CHANNELS', RepCode.nameToCode('OBNAME'), theCount=2)
+    frame.object(b'MAIN').value(
+        RepCode.nameToCode('OBNAME'),
+        *[RepCode.OBNAMEInternal(None, 1, 0, RepCode.IDENTString(n), None) for n in (b'DEPT', b'GR')]
+    )
+    pool = RepCode.InternPool()
+    channelRows = AttrComp.parseSet(channels.body(), pool).rows
+    frameRows = AttrComp.parseSet(frame.body(), pool).rows
+    # The object names and the references to them share their identifier
+    assert [r[0].identifier for r in channelRows] == [v.identifier for v in frameRows[0][1].value]
+    for row, ref in zip(channelRows, frameRows[0][1].value):
+        assert row[0].identifier is ref.identifier
+
+
+@pytest.mark.parametrize('name', [b'RUN4', b'4', b'84', b'<', b'8', b''])
+def test_set_name_of_descriptor_bytes(name):
+    # The set name has bytes that are template descriptors, 0x34 '4', 0x38 '8'
+    # and 0x3C '<'
+    b = SetBody(theName=name).attribute(b'X', FSINGL)
+    b.object(b'A').value(FSINGL, 1.0)
+    table = AttrComp.parseSet(b.body())
+    assert table['header'] == ['', 'X']
+    assert table['data'] == [['1&0&A', '1.0']]
+
+
+def test_first_template_attribute_with_default():
+    # The first attribute has descriptor 0x3D, label, count, rep code and value
+    b = SetBody().attribute(b'LIMITS', FSINGL, theCount=2, theValue=[0.5, 1.5]).attribute(b'X', FSINGL)
+    b.object(b'A').absent().value(FSINGL, 7.0)
+    b.object(b'B')
+    table = AttrComp.parseSet(b.body())
+    assert table['header'] == ['', 'LIMITS', 'X']
+    assert table['data'] == [['1&0&A', '0', '7.0'], ['1&0&B', ['0.5', '1.5'], 'None']]
+
+
+def test_set_without_objects():
+    table = AttrComp.parseSet(SetBody().attribute(b'X', FSINGL).body())
+    assert table['header'] == ['', 'X']
+    assert table['data'] == []
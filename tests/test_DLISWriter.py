@@ -0,0 +1,61 @@
+# Part of TotalDepth: Petrophysical data processing and presentation
+# Copyright (C) 1999-2012 Paul Ross
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Paul Ross: apaulross@gmail.com
+"""Tests of writing frame data with DLISWriter."""
+
+import numpy as np
+import pytest
+
+import Commitar.DLISWriter as DLISWriter
+import Commitar.RepCode as RepCode
+import Commitar.benchmarks.SyntheticDLIS as SyntheticDLIS
+
+
+@pytest.mark.parametrize('repCode', SyntheticDLIS.FRAME_REP_CODES, ids=RepCode.codeToName)
+def test_frames_decode_as_written(tmp_path, repCode):
+    path = str(tmp_path / 'frames.dlis')
+    SyntheticDLIS.writeFile(path, nChannels=5, nFrames=300, nParameters=0, repCode=repCode)
+    assert SyntheticDLIS.checkFile(path, 5, 300, repCode)
+
+
+def test_float_channels_same_as_raw(tmp_path):
+    """Floats with repCodes are written as the raw bits with dtype are."""
+    fshort, isingl = RepCode.nameToCode('FSHORT'), RepCode.nameToCode('ISINGL')
+    values = np.zeros(10, dtype=[('A', 'f8'), ('B', 'f8')])
+    values['A'] = np.arange(10) * 1.5
+    values['B'] = np.arange(10) * -3.25
+    raw = np.zeros(10, dtype=[('A', '>u2'), ('B', '>u4')])
+    raw['A'] = [RepCode.floatToFSHORT(v) for v in values['A']]
+    raw['B'] = [RepCode.floatToISINGL(v) for v in values['B']]
+    paths = [str(tmp_path / 'floats.dlis'), str(tmp_path / 'raw.dlis')]
+    with DLISWriter.DLISWriter(paths[0]) as w:
+        w.writeFrames(b'MAIN', values, repCodes=[fshort, isingl])
+    with DLISWriter.DLISWriter(paths[1]) as w:
+        w.writeFrames(b'MAIN', raw, dtype=raw.dtype)
+    with open(paths[0], 'rb') as f0, open(paths[1], 'rb') as f1:
+        assert f0.read() == f1.read()
+
+
+def test_rep_codes_must_match_channels(tmp_path):
+    values = np.zeros(2, dtype=[('A', 'f8'), ('B', 'f8')])
+    with DLISWriter.DLISWriter(str(tmp_path / 'bad.dlis')) as w:
+        with pytest.raises(DLISWriter.ExceptionDLISWriter):
+            w.writeFrames(b'MAIN', values, repCodes=[RepCode.nameToCode('FSHORT')])
+        with pytest.raises(RepCode.ExceptionRepCodeFloatRange):
+            w.writeFrames(b'MAIN', np.full(1, np.nan, dtype=values.dtype),
+                          repCodes=[RepCode.nameToCode('FSHORT')] * 2)
@@ -0,0 +1,45 @@
+# Part of TotalDepth: Petrophysical data processing and presentation
+# Copyright (C) 1999-2012 Paul Ross
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Paul Ross: apaulross@gmail.com
+"""Tests of decoding frame data with FrameData."""
+
+import numpy as np
+import pytest
+
+import Commitar.FrameData as FrameData
+import Commitar.RepCode as RepCode
+import Commitar.ScanV1EFLR as ScanV1EFLR
+import Commitar.benchmarks.SyntheticDLIS as SyntheticDLIS
+
+
+@pytest.mark.parametrize('repCode', SyntheticDLIS.FRAME_REP_CODES, ids=RepCode.codeToName)
+def test_decode_parallel_same_as_decode(tmp_path, repCode):
+    path = str(tmp_path / 'frames.dlis')
+    SyntheticDLIS.writeFile(path, nChannels=4, nFrames=2000, nParameters=0, repCode=repCode)
+    decoder = FrameData.fromScan(ScanV1EFLR.ScanV1EFLR(path))
+    expected = decoder.decode('MAIN')
+    got = decoder.decodeParallel('MAIN', jobs=2)
+    assert got.values.dtype == expected.values.dtype
+    np.testing.assert_array_equal(got.frameNumbers, expected.frameNumbers)
+    assert got.values.tobytes() == expected.values.tobytes()
+
+
+def test_decode_parallel_unknown_frame(syntheticPath):
+    decoder = FrameData.fromScan(ScanV1EFLR.ScanV1EFLR(syntheticPath))
+    with pytest.raises(FrameData.ExceptionFrameData):
+        decoder.decodeParallel('NONE', jobs=2)
@@ -0,0 +1,67 @@
+# Part of TotalDepth: Petrophysical data processing and presentation
+# Copyright (C) 1999-2012 Paul Ross
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Paul Ross: apaulross@gmail.com
+"""Tests of LogicalFile."""
+
+import os
+
+import numpy as np
+
+import Commitar.LogicalFile as LogicalFile
+import Commitar.ScanV1EFLR as ScanV1EFLR
+import Commitar.SidecarIndex as SidecarIndex
+
+
+def _countParseEFLRs(monkeypatch):
+    """Counts the calls of ScanV1EFLR.parseEFLRs(), returns the list of calls."""
+    calls = []
+    parseEFLRs = ScanV1EFLR.ScanV1EFLR.parseEFLRs
+
+    def counted(self):
+        calls.append(self)
+        return parseEFLRs(self)
+
+    monkeypatch.setattr(ScanV1EFLR.ScanV1EFLR, 'parseEFLRs', counted)
+    return calls
+
+
+def test_open_without_sidecar_parses(syntheticPath, monkeypatch):
+    calls = _countParseEFLRs(monkeypatch)
+    lfs = LogicalFile.openLogicalFiles(syntheticPath)
+    assert len(lfs) == 1
+    assert len(calls) == 1
+    assert 'CHANNEL' in lfs[0].objects
+    assert len(calls) == 1
+
+
+def test_open_with_sidecar_does_not_parse(syntheticPath, monkeypatch):
+    # The first open writes the sidecar
+    expected = LogicalFile.openLogicalFiles(syntheticPath, useSidecar=True)[0]
+    assert os.path.exists(SidecarIndex.sidecarPath(syntheticPath))
+    calls = _countParseEFLRs(monkeypatch)
+    lfs = LogicalFile.openLogicalFiles(syntheticPath, useSidecar=True)
+    assert len(lfs) == 1
+    lf = lfs[0]
+    assert lf.name == expected.name
+    assert lf.channelNames() == expected.channelNames()
+    name = lf.channelNames()[1]
+    np.testing.assert_array_equal(lf.channel(name).values, expected.channel(name).values)
+    assert calls == []
+    # The EFLRs are parsed when the objects are first used
+    assert dict(lf.objects['CHANNEL']) == dict(expected.objects['CHANNEL'])
+    assert len(calls) == 1
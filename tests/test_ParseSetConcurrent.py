@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# Part of TotalDepth: Petrophysical data processing and presentation
+# Copyright (C) 1999-2012 Paul Ross
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Paul Ross: apaulross@gmail.com
+"""Tests of parsing EFLR sets from several threads, a short run of
+benchmarks/StressParseSet.py."""
+
+import sys
+
+import pytest
+
+import Commitar.benchmarks.BenchDescriptor as BenchDescriptor
+import Commitar.benchmarks.StressParseSet as StressParseSet
+import Commitar.benchmarks.SyntheticDLIS as SyntheticDLIS
+
+
+@pytest.fixture(scope='module')
+def setBodies(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('stress') / 'stress.dlis')
+    # Small segments so that sets span several of them
+    SyntheticDLIS.writeFile(path, 20, 10, 200, 500)
+    return BenchDescriptor.setBodies(path)
+
+
+@pytest.fixture
+def shortSwitchInterval():
+    switchInterval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(switchInterval)
+
+
+def test_serial_tables(setBodies):
+    expected = StressParseSet.serial(setBodies)
+    assert len(expected) == len(setBodies)
+    # CHANNEL, FRAME and PARAMETER objects
+    assert sum(len(e[0]['data']) for e in expected) >= 20 + 1 + 200
+
+
+@pytest.mark.parametrize('sharedPool', [False, True])
+def test_parallel_same_as_serial(setBodies, shortSwitchInterval, sharedPool):
+    expected = StressParseSet.serial(setBodies)
+    differ, _t = StressParseSet.check(setBodies, expected, 4, 3, sharedPool)
+    assert differ == 0
@@ -0,0 +1,166 @@
+# Part of TotalDepth: Petrophysical data processing and presentation
+# Copyright (C) 1999-2012 Paul Ross
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Paul Ross: apaulross@gmail.com
+"""Tests of the RepCode float encoders."""
+"""Tests of RepCode, the float encoders, OBNAME decoding and reading arrays of values."""
+import io
+import math
+
+import pytest
+
+import Commitar.RepCode as RepCode
+
+ENCODERS = [
+    (RepCode.floatToFSHORT, RepCode.fshortToFloat),
+    (RepCode.floatToISINGL, RepCode.isinglToFloat),
+    (RepCode.floatToVSINGL, RepCode.vsinglToFloat),
+]
+
+
+@pytest.mark.parametrize('encode, decode', ENCODERS)
+@pytest.mark.parametrize('value', [float('inf'), float('-inf'), float('nan')])
+def test_not_finite_raises(encode, decode, value):
+    with pytest.raises(RepCode.ExceptionRepCodeFloatRange):
+        encode(value)
+
+
+@pytest.mark.parametrize('write', [RepCode.writeFSHORT, RepCode.writeISINGL, RepCode.writeVSINGL])
+def test_write_not_finite_raises(write):
+    with pytest.raises(RepCode.ExceptionRepCodeFloatRange):
+        write(float('nan'), io.BytesIO())
+
+
+@pytest.mark.parametrize('encode, decode', ENCODERS)
+@pytest.mark.parametrize('value', [0.0, 1.0, -1.0, 0.5, -0.5, 2.0, -2.0, 153.0, -153.0, 1024.0, -1024.0])
+def test_round_trip(encode, decode, value):
+    assert decode(encode(value)) == value
+
+
+@pytest.mark.parametrize('value', [-32768.0, 32752.0, 2.0 ** -11, -(2.0 ** -11)])
+def test_fshort_range_ends(value):
+    assert RepCode.fshortToFloat(RepCode.floatToFSHORT(value)) == value
+
+
+@pytest.mark.parametrize('value', [32768.0, -32800.0, 1e10])
+def test_fshort_out_of_range(value):
+    with pytest.raises(RepCode.ExceptionRepCodeFloatRange):
+        RepCode.floatToFSHORT(value)
+
+
+@pytest.mark.parametrize('encode, decode', ENCODERS[1:])
+def test_rounding(encode, decode):
+    assert math.isclose(decode(encode(math.pi)), math.pi, rel_tol=1e-6)
+
+
+def _obnames(*theNames, origin=1):
+    s = io.BytesIO()
+    for name in theNames:
+        RepCode.writeOBNAME(RepCode.OBNAMEInternal(None, origin, 0, RepCode.IDENTString(name), None), s)
+    return s.getvalue()
+
+
+@pytest.mark.parametrize('origin', [1, 127, 128, 20000])
+def test_pool_decodeOBNAME(origin):
+    data = _obnames(b'A', b'BC', b'A', origin=origin)
+    pool = RepCode.InternPool()
+    off = 0
+    values = []
+    for _i in range(3):
+        v, off = pool.decodeOBNAME(data, off)
+        values.append(v)
+    assert off == len(data)
+    expected, _off = RepCode.decodeOBNAMEArray(3, data, 0)
+    assert values == expected
+    assert values[0] is values[2]
+    # The identifier is shared with the bulk decoder of the same pool
+    bulk, _off = pool.decodeIndirectRepCodeArray(RepCode.nameToCode('OBNAME'), 3, data, 0)
+    assert bulk[1].identifier is values[1].identifier
+
+
+def test_pool_decodeOBNAME_truncated():
+    data = _obnames(b'ABCD')
+    with pytest.raises(RepCode.ExceptionRepCodeEndOfStream):
+        RepCode.InternPool().decodeOBNAME(data[:-1], 0)
+
+
+@pytest.fixture
+def strict():
+    RepCode.setValidation(RepCode.VALIDATE_STRICT)
+    yield
+    RepCode.setValidation(RepCode.VALIDATE_STRICT)
+
+
+def test_invalid_OBNAME_not_cached(strict):
+    # Origin 1, copy 0 and an IDENT with a control character
+    data = _obnames(b'GOOD') + bytes([1, 0, 4]) + b'BAD\x01'
+    pool = RepCode.InternPool()
+    for _i in range(2):
+        with pytest.raises(RepCode.ExceptionRepCode):
+            pool.decodeIndirectRepCodeArray(RepCode.nameToCode('OBNAME'), 2, data, 0)
+    assert len(pool) == 0
+    # Nor through the single value path
+    with pytest.raises(RepCode.ExceptionRepCode):
+        pool.decodeOBNAME(data, len(_obnames(b'GOOD')))
+    with pytest.raises(RepCode.ExceptionRepCode):
+        pool.decodeOBNAME(data, len(_obnames(b'GOOD')))
+
+
+def _dtimeBytes(theCount):
+    return b''.join(
+        RepCode.DTIMEBase.STRUCT_RC_DTIME.pack(i % 200, ((i % 3) << 4) | (1 + i % 12), 1 + i % 28, i % 24, i % 60, i % 60, i % 1000)
+        for i in range(theCount)
+    )
+
+
+def _fixedBytes(theCode, theCount):
+    if theCode == RepCode.nameToCode('DTIME'):
+        return _dtimeBytes(theCount)
+    # Bytes that are not NaN in any of the float codes
+    return bytes((0x41 + i % 0x3E) for i in range(theCount * RepCode.lenFixedCodeOrNone(theCode)))
+
+
+def _valueKey(theValue):
+    if isinstance(theValue, RepCode.ValueBase):
+        return theValue.CODE, theValue._key(), getattr(theValue, 'timeZone', None)
+    return theValue
+
+
+@pytest.mark.parametrize('code', sorted(set(RepCode.RC_BULK_CONVERT) | set(RepCode.RC_BULK_FIELDS)))
+def test_readIndirectRepCodeArray_fixed(code):
+    count = 37
+    data = _fixedBytes(code, count)
+    stream = io.BytesIO(data)
+    expected = [_valueKey(RepCode.readIndirectRepCode(code, stream)) for _i in range(count)]
+    stream = io.BytesIO(data)
+    assert [_valueKey(v) for v in RepCode.readIndirectRepCodeArray(code, count, stream)] == expected
+    assert stream.tell() == len(data)
+    values, offset = RepCode.decodeIndirectRepCodeArray(code, count, b'\x00' + data, 1)
+    assert [_valueKey(v) for v in values] == expected
+    assert offset == 1 + len(data)
+
+
+def test_every_fixed_code_is_bulk():
+    fixed = set(c for c in range(1, RepCode.LEN_RC_TABLE) if RepCode.lenFixedCodeOrNone(c) is not None)
+    assert fixed == set(RepCode.RC_BULK_ARRAY) | set(RepCode.RC_BULK_CONVERT) | set(RepCode.RC_BULK_FIELDS)
+
+
+@pytest.mark.parametrize('code', sorted(set(RepCode.RC_BULK_CONVERT) | set(RepCode.RC_BULK_FIELDS)))
+def test_readIndirectRepCodeArray_fixed_truncated(code):
+    data = _fixedBytes(code, 3)[:-1]
+    with pytest.raises(RepCode.ExceptionRepCodeEndOfStream):
+        RepCode.readIndirectRepCodeArray(code, 3, io.BytesIO(data))
@@ -0,0 +1,70 @@
+# Part of TotalDepth: Petrophysical data processing and presentation
+# Copyright (C) 1999-2012 Paul Ross
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Paul Ross: apaulross@gmail.com
+"""Tests of the RepCodeArray float encoders against the scalar ones in RepCode."""
+
+import numpy as np
+import pytest
+
+import Commitar.RepCode as RepCode
+import Commitar.RepCodeArray as RepCodeArray
+
+# (name, scalar encoder, array encoder, scalar decoder, array decoder)
+ENCODERS = [
+    ('FSHORT', RepCode.floatToFSHORT, RepCodeArray.floatToFSHORT, RepCode.fshortToFloat, RepCodeArray.fshortToFloat),
+    ('ISINGL', RepCode.floatToISINGL, RepCodeArray.floatToISINGL, RepCode.isinglToFloat, RepCodeArray.isinglToFloat),
+    ('VSINGL', RepCode.floatToVSINGL, RepCodeArray.floatToVSINGL, RepCode.vsinglToFloat, RepCodeArray.vsinglToFloat),
+]
+
+
+def _values():
+    rng = np.random.default_rng(0)
+    n = 5000
+    return np.concatenate([
+        rng.normal(0.0, 1.0, n) * 10.0 ** rng.integers(-12, 12, n),
+        [0.0, -0.0, 1.0, -1.0, 0.5, -0.5, 2.0 ** -11, -32768.0, 32752.0, 2048.0, -2048.0, 1e-80, -1e-80],
+    ])
+
+
+@pytest.mark.parametrize('name, scalar, array, scalarDecode, decode', ENCODERS)
+def test_same_bits_as_scalar(name, scalar, array, scalarDecode, decode):
+    values = _values()
+    expected = []
+    inRange = []
+    for v in values.tolist():
+        try:
+            expected.append(scalar(v))
+            inRange.append(True)
+        except RepCode.ExceptionRepCodeFloatRange:
+            inRange.append(False)
+    got = array(values[np.array(inRange)])
+    assert got.dtype == RepCodeArray.RC_DTYPE[RepCode.nameToCode(name)].newbyteorder('=')
+    np.testing.assert_array_equal(got, np.array(expected, dtype=got.dtype))
+    np.testing.assert_array_equal(decode(got), [scalarDecode(v) for v in got.tolist()])
+
+
+@pytest.mark.parametrize('name, scalar, array, scalarDecode, decode', ENCODERS)
+@pytest.mark.parametrize('value', [np.inf, -np.inf, np.nan, 1e300])
+def test_out_of_range_raises(name, scalar, array, scalarDecode, decode, value):
+    with pytest.raises(RepCode.ExceptionRepCodeFloatRange):
+        array(np.array([1.0, value]))
+
+
+def test_encode_other_codes_unchanged():
+    a = np.arange(4.0)
+    assert RepCodeArray.encode(RepCode.nameToCode('FSINGL'), a) is a
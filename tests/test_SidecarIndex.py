@@ -0,0 +1,85 @@
+# Part of TotalDepth: Petrophysical data processing and presentation
+# Copyright (C) 1999-2012 Paul Ross
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Paul Ross: apaulross@gmail.com
+"""Tests of the sidecar index and of opening a file from it."""
+
+import os
+
+import pytest
+
+import Commitar.MmapBuffer as MmapBuffer
+import Commitar.ScanV1EFLR as ScanV1EFLR
+import Commitar.SidecarIndex as SidecarIndex
+
+
+def _sidecar(thePath, theTemplates):
+    scan = ScanV1EFLR.ScanV1EFLR(thePath)
+    return SidecarIndex.SidecarIndex(
+        scan.index.entries, scan.logicalRecords, scan.setTypes, theTemplates, scan.index.storageUnitLabel)
+
+
+def test_save_and_load(syntheticPath):
+    with MmapBuffer.MmapBuffer(syntheticPath) as fb:
+        assert SidecarIndex.save(syntheticPath, fb, _sidecar(syntheticPath, {'A': {}}))
+        loaded = SidecarIndex.load(syntheticPath, fb)
+    assert loaded is not None
+    assert loaded.templates == {'A': {}}
+    assert not os.path.exists(SidecarIndex.sidecarPath(syntheticPath) + '.tmp')
+
+
+@pytest.mark.parametrize('kind', ['TypeError', 'ValueError'])
+def test_save_unserialisable_leaves_nothing(syntheticPath, kind):
+    if kind == 'TypeError':
+        templates = {'A': object()}
+    else:
+        # A circular reference
+        templates = {}
+        templates['A'] = templates
+    with MmapBuffer.MmapBuffer(syntheticPath) as fb:
+        assert not SidecarIndex.save(syntheticPath, fb, _sidecar(syntheticPath, templates))
+    scPath = SidecarIndex.sidecarPath(syntheticPath)
+    assert not os.path.exists(scPath + '.tmp')
+    assert not os.path.exists(scPath)
+
+
+def test_stale_sidecar_ignored(syntheticPath):
+    with MmapBuffer.MmapBuffer(syntheticPath) as fb:
+        assert SidecarIndex.save(syntheticPath, fb, _sidecar(syntheticPath, {}))
+    with open(syntheticPath, 'ab') as f:
+        f.write(b'\0' * 4)
+    with MmapBuffer.MmapBuffer(syntheticPath) as fb:
+        assert SidecarIndex.load(syntheticPath, fb) is None
+
+
+def test_scan_from_sidecar_does_not_parse(syntheticPath, monkeypatch):
+    first = ScanV1EFLR.ScanV1EFLR(syntheticPath, useSidecar=True)
+    calls = []
+    parseEFLRs = ScanV1EFLR.ScanV1EFLR.parseEFLRs
+
+    def counted(self):
+        calls.append(self)
+        return parseEFLRs(self)
+
+    monkeypatch.setattr(ScanV1EFLR.ScanV1EFLR, 'parseEFLRs', counted)
+    scan = ScanV1EFLR.ScanV1EFLR(syntheticPath, useSidecar=True)
+    assert scan.logicalRecords == first.logicalRecords
+    assert list(scan.templates) == list(first.templates)
+    assert calls == []
+    # objects parses the EFLRs on first use
+    assert list(scan.objects) == list(first.objects)
+    assert len(calls) == 1